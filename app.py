@@ -853,9 +853,8 @@ def submit_registration():
         data = request.form.to_dict()
         
         # Generate unique application ID
-        from datetime import datetime
-        import uuid
-        application_id = f"FRA{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+        from registration_ids import new_application_id
+        application_id = new_application_id()
         
         # Here you would typically save to database
         # For now, we'll just return success response
@@ -8,9 +8,9 @@ from datetime import datetime
 import logging
 import os
 import json
-import uuid
 import numpy as np
 from sklearn.linear_model import LogisticRegression
+from registration_ids import new_application_id
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -507,7 +507,7 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def generate_application_id():
-    return f"FRA{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+    return new_application_id()
 
 # ============================================================================
 # MAIN DASHBOARD ROUTE
@@ -11,6 +11,9 @@ import logging
 from datetime import datetime
 from advanced_voice_processor import TribalVoiceProcessor
 from werkzeug.utils import secure_filename
+from registration_api import registration_api
+from registration_uploads import StreamingUploadRequest, UploadPolicy, streaming_uploads, save_upload
+from werkzeug.exceptions import RequestEntityTooLarge
 import random
 
 # Configure logging
@@ -25,6 +28,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Stream file uploads to disk as they arrive instead of buffering them in the worker
+app.request_class = StreamingUploadRequest
+# Land claim registration, listing, import, atlas and workflow endpoints
+app.register_blueprint(registration_api)
 
 # Production Configuration
 app.config.update(
@@ -310,6 +317,11 @@ def create_navigation_fallback():
     </html>
     '''
 
+@app.route('/map')
+def smart_atlas():
+    """Serve the FRA Smart Atlas map of claims"""
+    return send_from_directory(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map'), 'index.html')
+
 @app.route('/health')
 def health_check():
     """System health check endpoint"""
@@ -429,6 +441,7 @@ def get_recommendation(probability):
         return "Challenging case. May need additional evidence and expert consultation."
 
 @app.route('/api/process-voice', methods=['POST'])
+@streaming_uploads(UploadPolicy(allowed_file, app.config['MAX_CONTENT_LENGTH'], lambda: app.config['UPLOAD_FOLDER']))
 def api_process_voice():
     """API endpoint for processing voice files"""
     try:
@@ -448,7 +461,7 @@ def api_process_voice():
         safe_filename = f"{timestamp}_{filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], safe_filename)
         
-        file.save(filepath)
+        save_upload(file, filepath)
         logger.info(f"File uploaded: {safe_filename}")
         
         # Process the audio if processor is available
@@ -488,6 +501,8 @@ def api_process_voice():
             # Fallback demo data if processor not available
             return jsonify(get_demo_voice_result(filename))
             
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         logger.error(f"Error processing voice: {str(e)}")
         return jsonify({'error': f'Processing error: {str(e)}'}), 500
@@ -790,406 +805,6 @@ def registration_page():
     </script>
 </body>
 </html>'''
-            .form-row {
-                display: flex;
-                gap: 20px;
-                margin-bottom: 20px;
-                flex-wrap: wrap;
-            }
-            .form-group {
-                flex: 1;
-                min-width: 250px;
-            }
-            .form-group label {
-                display: block;
-                margin-bottom: 8px;
-                font-weight: bold;
-                color: #2d5016;
-            }
-            .form-group input,
-            .form-group select,
-            .form-group textarea {
-                width: 100%;
-                padding: 12px;
-                border: 2px solid #4a7c59;
-                border-radius: 8px;
-                font-size: 16px;
-                transition: all 0.3s ease;
-            }
-            .form-group input:focus,
-            .form-group select:focus,
-            .form-group textarea:focus {
-                outline: none;
-                border-color: #6ab04c;
-                box-shadow: 0 0 10px rgba(106, 176, 76, 0.3);
-            }
-            .btn {
-                padding: 15px 30px;
-                border: none;
-                border-radius: 8px;
-                font-size: 16px;
-                font-weight: bold;
-                cursor: pointer;
-                transition: all 0.3s ease;
-                margin: 10px;
-            }
-            .btn-primary {
-                background: linear-gradient(45deg, #6ab04c, #4a7c59);
-                color: white;
-            }
-            .btn-primary:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 5px 15px rgba(106, 176, 76, 0.4);
-            }
-            .form-actions {
-                text-align: center;
-                margin-top: 30px;
-                padding-top: 20px;
-                border-top: 2px solid #6ab04c;
-            }
-            .required {
-                color: #ff6b6b;
-            }
-            .help-text {
-                font-size: 0.9em;
-                color: #666;
-                margin-top: 5px;
-            }
-            .success-message {
-                background: #d4edda;
-                color: #155724;
-                padding: 15px;
-                border-radius: 8px;
-                margin: 20px 0;
-                border: 1px solid #c3e6cb;
-                display: none;
-            }
-            @media (max-width: 768px) {
-                .form-row {
-                    flex-direction: column;
-                }
-                .container {
-                    margin: 10px;
-                    padding: 20px;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🌿 Forest Rights Act - Land Claim Registration</h1>
-                <p>Register your claim for forest land rights under the Forest Rights Act, 2006</p>
-            </div>
-
-            <div id="successMessage" class="success-message">
-                <!-- Success message will be shown here -->
-            </div>
-
-            <form id="landClaimForm">
-                <!-- Personal Details Section -->
-                <div class="form-section">
-                    <h3>📋 Personal & Family Details</h3>
-                    
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="applicantName">Full Name of Applicant <span class="required">*</span></label>
-                            <input type="text" id="applicantName" name="applicantName" required>
-                            <div class="help-text">As per government identification documents</div>
-                        </div>
-                        <div class="form-group">
-                            <label for="fatherName">Father's/Husband's Name <span class="required">*</span></label>
-                            <input type="text" id="fatherName" name="fatherName" required>
-                        </div>
-                    </div>
-
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="aadhaar">Aadhaar Number <span class="required">*</span></label>
-                            <input type="text" id="aadhaar" name="aadhaar" pattern="[0-9]{12}" maxlength="12" required>
-                            <div class="help-text">12-digit Aadhaar number</div>
-                        </div>
-                        <div class="form-group">
-                            <label for="phone">Mobile Number <span class="required">*</span></label>
-                            <input type="tel" id="phone" name="phone" pattern="[0-9]{10}" maxlength="10" required>
-                        </div>
-                    </div>
-
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="tribe">Scheduled Tribe <span class="required">*</span></label>
-                            <select id="tribe" name="tribe" required>
-                                <option value="">Select your tribe</option>
-                                <option value="Gond">Gond</option>
-                                <option value="Santhal">Santhal</option>
-                                <option value="Oraon">Oraon</option>
-                                <option value="Munda">Munda</option>
-                                <option value="Bhil">Bhil</option>
-                                <option value="Kol">Kol</option>
-                                <option value="Baiga">Baiga</option>
-                                <option value="Korku">Korku</option>
-                                <option value="Other">Other (specify in remarks)</option>
-                            </select>
-                        </div>
-                        <div class="form-group">
-                            <label for="familyMembers">Number of Family Members <span class="required">*</span></label>
-                            <input type="number" id="familyMembers" name="familyMembers" min="1" max="50" required>
-                        </div>
-                    </div>
-
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="village">Village <span class="required">*</span></label>
-                            <input type="text" id="village" name="village" required>
-                        </div>
-                        <div class="form-group">
-                            <label for="district">District <span class="required">*</span></label>
-                            <input type="text" id="district" name="district" required>
-                        </div>
-                    </div>
-                </div>
-
-                <!-- Land Information Section -->
-                <div class="form-section">
-                    <h3>🗺️ Land & Forest Details</h3>
-                    
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="claimType">Type of Claim <span class="required">*</span></label>
-                            <select id="claimType" name="claimType" required>
-                                <option value="">Select claim type</option>
-                                <option value="Individual Forest Rights">Individual Forest Rights (IFR)</option>
-                                <option value="Community Forest Rights">Community Forest Rights (CFR)</option>
-                                <option value="Community Forest Resource Rights">Community Forest Resource Rights</option>
-                                <option value="Habitat Rights">Habitat Rights (for PVTGs)</option>
-                            </select>
-                        </div>
-                        <div class="form-group">
-                            <label for="landArea">Land Area (in Hectares) <span class="required">*</span></label>
-                            <input type="number" id="landArea" name="landArea" step="0.01" min="0.01" max="4" required>
-                            <div class="help-text">Maximum 4 hectares for individual claims</div>
-                        </div>
-                    </div>
-
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="occupationSince">Occupation Since (Year) <span class="required">*</span></label>
-                            <input type="number" id="occupationSince" name="occupationSince" min="1900" max="2005" required>
-                            <div class="help-text">Must be before 13th December 2005</div>
-                        </div>
-                        <div class="form-group">
-                            <label for="forestType">Type of Forest <span class="required">*</span></label>
-                            <select id="forestType" name="forestType" required>
-                                <option value="">Select forest type</option>
-                                <option value="Reserved Forest">Reserved Forest</option>
-                                <option value="Protected Forest">Protected Forest</option>
-                                <option value="Government Forest Land">Government Forest Land</option>
-                                <option value="Deemed Forest">Deemed Forest</option>
-                            </select>
-                        </div>
-                    </div>
-
-                    <div class="form-row">
-                        <div class="form-group">
-                            <label for="remarks">Additional Remarks/Comments</label>
-                            <textarea id="remarks" name="remarks" rows="4" placeholder="Any additional information you would like to provide..."></textarea>
-                        </div>
-                    </div>
-                </div>
-
-                <div class="form-actions">
-                    <button type="submit" class="btn btn-primary">🚀 Submit Land Claim Registration</button>
-                    <button type="button" class="btn" onclick="window.location.href='/'">← Back to Homepage</button>
-                </div>
-            </form>
-        </div>
-
-        <script>
-            // Form validation and submission
-            document.getElementById('landClaimForm').addEventListener('submit', function(e) {
-                e.preventDefault();
-                
-                // Basic validation
-                const aadhaar = document.getElementById('aadhaar').value;
-                if (aadhaar.length !== 12 || !/^\\d{12}$/.test(aadhaar)) {
-                    alert('Please enter a valid 12-digit Aadhaar number.');
-                    return;
-                }
-                
-                const phone = document.getElementById('phone').value;
-                if (phone.length !== 10 || !/^\\d{10}$/.test(phone)) {
-                    alert('Please enter a valid 10-digit mobile number.');
-                    return;
-                }
-                
-                const landArea = parseFloat(document.getElementById('landArea').value);
-                const claimType = document.getElementById('claimType').value;
-                
-                if (claimType === 'Individual Forest Rights' && landArea > 4) {
-                    alert('Individual claims cannot exceed 4 hectares.');
-                    return;
-                }
-                
-                const occupationSince = parseInt(document.getElementById('occupationSince').value);
-                if (occupationSince > 2005) {
-                    alert('Occupation must be before 13th December 2005.');
-                    return;
-                }
-                
-                // Generate application ID
-                const applicationId = 'FRA' + new Date().toISOString().slice(0,10).replace(/-/g,'') + Math.random().toString(36).substr(2, 8).toUpperCase();
-                
-                // Calculate simple approval probability
-                let probability = 0.5;
-                if (landArea <= 2.0) probability += 0.2;
-                else if (landArea <= 4.0) probability += 0.1;
-                
-                const familyMembers = parseInt(document.getElementById('familyMembers').value);
-                if (familyMembers >= 3) probability += 0.1;
-                
-                const occupationYears = 2005 - occupationSince;
-                if (occupationYears >= 20) probability += 0.2;
-                else if (occupationYears >= 10) probability += 0.1;
-                
-                probability = Math.max(0.2, Math.min(0.9, probability));
-                const percentage = (probability * 100).toFixed(1);
-                
-                // Show success message
-                const successMessage = document.getElementById('successMessage');
-                successMessage.innerHTML = `
-                    <h3>✅ Registration Submitted Successfully!</h3>
-                    <p><strong>Application ID:</strong> \${applicationId}</p>
-                    <p><strong>AI Approval Prediction:</strong> \${percentage}% (\${probability >= 0.7 ? 'High' : probability >= 0.5 ? 'Medium' : 'Low'} chance)</p>
-                    <p><strong>Next Steps:</strong></p>
-                    <ul>
-                        <li>Visit Gram Sabha for community verification</li>
-                        <li>Submit application to Sub-Divisional Level Committee (SDLC)</li>
-                        <li>Await field verification by forest officials</li>
-                        <li>Track application status online</li>
-                    </ul>
-                    <p><strong>Note:</strong> You will receive an SMS confirmation shortly on your registered mobile number.</p>
-                `;
-                successMessage.style.display = 'block';
-                
-                // Scroll to success message
-                successMessage.scrollIntoView({ behavior: 'smooth' });
-                
-                // Reset form
-                this.reset();
-            });
-            
-            // Auto-format Aadhaar number
-            document.getElementById('aadhaar').addEventListener('input', function(e) {
-                this.value = this.value.replace(/\\D/g, '');
-            });
-            
-            // Auto-format phone number
-            document.getElementById('phone').addEventListener('input', function(e) {
-                this.value = this.value.replace(/\\D/g, '');
-            });
-        </script>
-    </body>
-    </html>
-    '''
-    """Create a fallback registration page"""
-    return '''
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Land Claim Registration - VanMitra</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #2d5016 0%, #4a7c59 100%);
-                min-height: 100vh; padding: 20px; color: white;
-            }
-            .container { max-width: 800px; margin: 0 auto; background: rgba(255,255,255,0.95); 
-                        border-radius: 15px; padding: 40px; color: #333; }
-            .header { text-align: center; margin-bottom: 30px; }
-            .header h1 { color: #2d5016; font-size: 2.5em; margin-bottom: 10px; }
-            .form-group { margin-bottom: 20px; }
-            .form-group label { display: block; margin-bottom: 8px; font-weight: bold; color: #2d5016; }
-            .form-group input, .form-group select { width: 100%; padding: 12px; border: 2px solid #4a7c59; 
-                                                   border-radius: 8px; font-size: 16px; }
-            .btn { padding: 15px 30px; background: linear-gradient(45deg, #6ab04c, #4a7c59); 
-                  color: white; border: none; border-radius: 8px; font-size: 16px; cursor: pointer; }
-            .btn:hover { transform: translateY(-2px); }
-            .error-notice { background: #fff3cd; color: #856404; padding: 15px; border-radius: 8px; 
-                           margin-bottom: 20px; border: 1px solid #ffeaa7; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🌿 Forest Rights Act - Land Claim Registration</h1>
-                <p>Complete registration form is temporarily unavailable</p>
-            </div>
-            
-            <div class="error-notice">
-                ⚠️ <strong>Notice:</strong> The full registration form is currently being loaded. 
-                Please use the simplified form below or try refreshing the page.
-            </div>
-            
-            <form id="simpleRegistrationForm">
-                <div class="form-group">
-                    <label for="applicantName">Full Name of Applicant *</label>
-                    <input type="text" id="applicantName" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="aadhaar">Aadhaar Number *</label>
-                    <input type="text" id="aadhaar" pattern="[0-9]{12}" maxlength="12" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="phone">Mobile Number *</label>
-                    <input type="tel" id="phone" pattern="[0-9]{10}" maxlength="10" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="tribe">Scheduled Tribe *</label>
-                    <select id="tribe" required>
-                        <option value="">Select your tribe</option>
-                        <option value="Gond">Gond</option>
-                        <option value="Santhal">Santhal</option>
-                        <option value="Oraon">Oraon</option>
-                        <option value="Munda">Munda</option>
-                        <option value="Bhil">Bhil</option>
-                        <option value="Other">Other</option>
-                    </select>
-                </div>
-                
-                <div class="form-group">
-                    <label for="village">Village *</label>
-                    <input type="text" id="village" required>
-                </div>
-                
-                <div class="form-group">
-                    <label for="landArea">Land Area (in Hectares) *</label>
-                    <input type="number" id="landArea" step="0.01" min="0.01" max="4" required>
-                </div>
-                
-                <button type="submit" class="btn">🚀 Submit Basic Registration</button>
-            </form>
-            
-            <div style="margin-top: 30px; text-align: center;">
-                <p><a href="/" style="color: #6ab04c;">← Back to Homepage</a></p>
-                <p><small>For technical support, please contact the administrator</small></p>
-            </div>
-        </div>
-        
-        <script>
-            document.getElementById('simpleRegistrationForm').addEventListener('submit', function(e) {
-                e.preventDefault();
-                alert('Basic registration submitted! Application ID: FRA' + Date.now().toString().slice(-8));
-            });
-        </script>
-    </body>
-    </html>
-    '''
 
 @app.route('/registration/status')
 def registration_status():
@@ -1429,310 +1044,8 @@ def registration_admin():
     </body>
     </html>
     '''
-    """Create a fallback status page"""
-    return '''
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Application Status - VanMitra</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { 
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #2d5016 0%, #4a7c59 100%);
-                min-height: 100vh; padding: 20px; color: white;
-            }
-            .container { max-width: 600px; margin: 0 auto; background: rgba(255,255,255,0.95); 
-                        border-radius: 15px; padding: 40px; color: #333; text-align: center; }
-            .header h1 { color: #2d5016; font-size: 2.5em; margin-bottom: 20px; }
-            .search-form { margin: 30px 0; }
-            .search-input { width: 100%; padding: 15px; border: 2px solid #4a7c59; 
-                           border-radius: 8px; font-size: 16px; margin-bottom: 15px; }
-            .btn { padding: 15px 30px; background: linear-gradient(45deg, #6ab04c, #4a7c59); 
-                  color: white; border: none; border-radius: 8px; font-size: 16px; cursor: pointer; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🔍 Application Status Check</h1>
-                <p>Track your Forest Rights Act land claim application</p>
-            </div>
-            
-            <div class="search-form">
-                <input type="text" class="search-input" placeholder="Enter Application ID (e.g., FRA20241001ABC123)">
-                <button class="btn" onclick="checkStatus()">🔍 Check Status</button>
-            </div>
-            
-            <div style="background: #e8f5e9; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                <h3>📋 Sample Status</h3>
-                <p><strong>Application ID:</strong> FRA20241001ABC123</p>
-                <p><strong>Status:</strong> Under Review</p>
-                <p><strong>Submitted:</strong> October 1, 2025</p>
-                <p><strong>Progress:</strong> Gram Sabha verification in progress</p>
-            </div>
-            
-            <p><a href="/" style="color: #6ab04c;">← Back to Homepage</a></p>
-        </div>
-        
-        <script>
-            function checkStatus() {
-                alert('Status check feature will be fully available soon. Please check back later.');
-            }
-        </script>
-    </body>
-    </html>
-    '''
-
-
-
-@app.route('/api/register-claim', methods=['POST'])
-def register_land_claim():
-    """Handle land claim registration submission"""
-    try:
-        import uuid
-        
-        # Generate unique application ID
-        application_id = f"FRA{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
-        
-        # Extract form data
-        registration_data = {
-            'application_id': application_id,
-            'submission_date': datetime.now().isoformat(),
-            'status': 'submitted',
-            'personal_details': {
-                'applicant_name': request.form.get('applicantName'),
-                'father_name': request.form.get('fatherName'),
-                'aadhaar': request.form.get('aadhaar'),
-                'phone': request.form.get('phone'),
-                'tribe': request.form.get('tribe'),
-                'family_members': int(request.form.get('familyMembers', 0)),
-                'address': {
-                    'village': request.form.get('village'),
-                    'tehsil': request.form.get('tehsil'),
-                    'district': request.form.get('district'),
-                    'state': request.form.get('state')
-                }
-            },
-            'land_details': {
-                'claim_type': request.form.get('claimType'),
-                'land_area': float(request.form.get('landArea', 0)),
-                'occupation_since': int(request.form.get('occupationSince', 0)),
-                'forest_type': request.form.get('forestType'),
-                'survey_number': request.form.get('surveyNumber'),
-                'boundaries': request.form.get('boundaries'),
-                'land_use': request.form.getlist('landUse')
-            },
-            'remarks': request.form.get('remarks'),
-            'documents': {}
-        }
-        
-        # Handle file uploads
-        uploaded_files = {}
-        for field_name in ['aadhaarDoc', 'tribalCert', 'occupationProof', 'photograph', 'additionalDocs']:
-            if field_name in request.files:
-                files = request.files.getlist(field_name)
-                file_paths = []
-                
-                for file in files:
-                    if file and file.filename and allowed_file(file.filename):
-                        # Create unique filename
-                        filename = f"{application_id}_{field_name}_{uuid.uuid4().hex[:8]}.{file.filename.rsplit('.', 1)[1].lower()}"
-                        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(file_path)
-                        file_paths.append(filename)
-                
-                if file_paths:
-                    uploaded_files[field_name] = file_paths if len(file_paths) > 1 else file_paths[0]
-        
-        registration_data['documents'] = uploaded_files
-        
-        # Calculate approval probability
-        approval_data = calculate_fra_approval_probability(registration_data)
-        registration_data['prediction'] = approval_data
-        
-        # Save registration (in production, this would go to a database)
-        registrations_file = os.path.join('data', 'registrations.json')
-        os.makedirs('data', exist_ok=True)
-        
-        try:
-            with open(registrations_file, 'r') as f:
-                registrations = json.load(f)
-        except FileNotFoundError:
-            registrations = []
-        
-        registrations.append(registration_data)
-        
-        with open(registrations_file, 'w') as f:
-            json.dump(registrations, f, indent=2)
-        
-        logger.info(f"New land claim registration: {application_id}")
-        
-        return jsonify({
-            'success': True,
-            'application_id': application_id,
-            'message': 'Registration submitted successfully!',
-            'approval_probability': approval_data,
-            'next_steps': [
-                'Visit Gram Sabha for community verification',
-                'Submit application to Sub-Divisional Level Committee (SDLC)',
-                'Await field verification by forest officials',
-                'Track application status online'
-            ]
-        })
-        
-    except Exception as e:
-        logger.error(f"Error in land claim registration: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'message': 'Registration failed. Please try again.'
-        }), 500
-
-@app.route('/api/check-status/<application_id>')
-def check_registration_status(application_id):
-    """Check the status of a land claim application"""
-    try:
-        registrations_file = os.path.join('data', 'registrations.json')
-        
-        try:
-            with open(registrations_file, 'r') as f:
-                registrations = json.load(f)
-        except FileNotFoundError:
-            registrations = []
-        
-        for registration in registrations:
-            if registration['application_id'] == application_id:
-                return jsonify({
-                    'success': True,
-                    'application': registration
-                })
-        
-        return jsonify({
-            'success': False,
-            'message': 'Application not found'
-        }), 404
-        
-    except Exception as e:
-        logger.error(f"Error checking application status: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Failed to check status'
-        }), 500
 
-@app.route('/api/registrations')
-def get_all_registrations():
-    """Get all registrations for admin dashboard"""
-    try:
-        registrations_file = os.path.join('data', 'registrations.json')
-        
-        try:
-            with open(registrations_file, 'r') as f:
-                registrations = json.load(f)
-        except FileNotFoundError:
-            registrations = []
-        
-        # Calculate statistics
-        stats = {
-            'total_applications': len(registrations),
-            'submitted': len([r for r in registrations if r.get('status') == 'submitted']),
-            'under_review': len([r for r in registrations if r.get('status') == 'under_review']),
-            'approved': len([r for r in registrations if r.get('status') == 'approved']),
-            'rejected': len([r for r in registrations if r.get('status') == 'rejected']),
-            'total_land_area': sum([r['land_details']['land_area'] for r in registrations]),
-            'total_families': sum([r['personal_details']['family_members'] for r in registrations])
-        }
-        
-        return jsonify({
-            'success': True,
-            'registrations': registrations,
-            'statistics': stats
-        })
-        
-    except Exception as e:
-        logger.error(f"Error getting registrations: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Failed to retrieve registrations'
-        }), 500
 
-def calculate_fra_approval_probability(registration_data):
-    """Calculate FRA approval probability based on registration data"""
-    try:
-        land_details = registration_data['land_details']
-        personal_details = registration_data['personal_details']
-        
-        # Extract key factors
-        land_area = land_details.get('land_area', 0)
-        family_members = personal_details.get('family_members', 1)
-        occupation_since = land_details.get('occupation_since', 2000)
-        claim_type = land_details.get('claim_type', '')
-        
-        # Basic scoring algorithm
-        score = 0.5  # Base score
-        
-        # Land area factor (smaller areas have higher approval rates)
-        if land_area <= 2.0:
-            score += 0.2
-        elif land_area <= 4.0:
-            score += 0.1
-        else:
-            score -= 0.1
-        
-        # Family size factor
-        if family_members >= 3:
-            score += 0.1
-        
-        # Occupation period factor (longer occupation = higher approval)
-        occupation_years = 2005 - occupation_since
-        if occupation_years >= 20:
-            score += 0.2
-        elif occupation_years >= 10:
-            score += 0.1
-        
-        # Claim type factor
-        if 'Individual' in claim_type:
-            score += 0.1
-        elif 'Community' in claim_type:
-            score += 0.05
-        
-        # Ensure score is between 0 and 1
-        score = max(0.1, min(0.95, score))
-        
-        # Determine assessment level
-        if score >= 0.7:
-            assessment = "High"
-            recommendation = "Strong case with good approval chances. Ensure all documents are complete."
-        elif score >= 0.5:
-            assessment = "Medium"
-            recommendation = "Moderate approval chances. Strengthen documentation and community support."
-        else:
-            assessment = "Low"
-            recommendation = "Consider improving documentation and seeking legal assistance."
-        
-        return {
-            'probability': round(score, 3),
-            'percentage': f"{score * 100:.1f}%",
-            'assessment': assessment,
-            'recommendation': recommendation,
-            'factors': {
-                'land_area': land_area,
-                'family_size': family_members,
-                'occupation_years': occupation_years,
-                'claim_type': claim_type
-            }
-        }
-        
-    except Exception as e:
-        return {
-            'probability': 0.5,
-            'percentage': "50.0%",
-            'assessment': "Unknown",
-            'recommendation': "Unable to calculate. Please ensure all data is provided correctly.",
-            'error': str(e)
-        }
 
 @app.route('/favicon.ico')
 def favicon():
@@ -1776,7 +1089,17 @@ if __name__ == '__main__':
     print("   → /api/demo        - Voice processing demo")
     print("   → /api/register-claim - Submit land claim")
     print("   → /api/check-status - Check application status")
-    print("   → /api/registrations - Admin: Get all registrations")
+    print("   → /api/registrations - Admin: Paginated, filtered registrations")
+    print("   → /api/registrations?format=csv - Admin: Streaming export (csv/ndjson/json)")
+    print("   → /api/registrations/search?q= - Admin: Ranked full-text search")
+    print("   → /api/registrations/facets - Admin: Counts per status, district, tribe, ...")
+    print("   → /api/registrations/aggregate - Admin: Group-by sums/means over land area, family size, ...")
+    print("   → /api/registrations/import - Admin: Bulk import claims from CSV/NDJSON")
+    print("   → /api/map/claims - FRA Smart Atlas: Clustered claims in a bounding box")
+    print("   → /api/anomalies/villages - FRA Smart Atlas: Villages with unusually delayed claims")
+    print("   → /api/registrations/stream - Admin: Live changes (Server-Sent Events)")
+    print("   → /api/registrations/<id>/status - Admin: Move a claim along Gram Sabha → SDLC → DLC")
+    print("   → /api/registrations/status - Admin: Bulk status changes")
     print("   → /api/stats       - Platform statistics")
     print("🌿" + "="*60)
     
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Village Processing-Delay Anomalies
+Per-village counts of filed, approved, pending and rejected claims, and the
+villages whose share of pending claims stands out: either past a fixed
+threshold, or far above the other villages of the same district by a robust
+(median / MAD) z-score. Stores keep the counts up to date on every change;
+the flags themselves are recomputed from the count table with vectorized
+NumPy group-bys, which costs time in the number of villages, not claims.
+Run as a script for a one-off report.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from registration_index import normalize_value
+from registration_map import status_group, claim_location, STATUS_GROUPS, APPROVED, PENDING, REJECTED
+
+logger = logging.getLogger(__name__)
+
+# Anomaly configuration (overridable through the environment)
+# Flag villages with at least MIN_VILLAGE_CLAIMS claims when more than this share is pending
+PENDING_RATIO_THRESHOLD = float(os.environ.get('VANMITRA_DELAY_PENDING_RATIO', 0.7))
+MIN_VILLAGE_CLAIMS = int(os.environ.get('VANMITRA_DELAY_MIN_CLAIMS', 10))
+# ... or when their pending share has a robust z-score this high against their district
+ROBUST_Z_THRESHOLD = float(os.environ.get('VANMITRA_ANOMALY_Z', 3.5))
+# Districts with fewer eligible villages than this are too small to compare against
+MIN_DISTRICT_PEERS = int(os.environ.get('VANMITRA_ANOMALY_MIN_PEERS', 5))
+# Stores without maintained counts (SQLite) are recounted at most this often
+REFRESH_SECONDS = float(os.environ.get('VANMITRA_ANOMALY_REFRESH_SECONDS', 60))
+# Reports kept per count table, one per distinct set of filters and thresholds
+MAX_CACHED_REPORTS = 64
+
+PENDING_RATIO = 'pending_ratio'
+DISTRICT_PEERS = 'district_peers'
+
+# Scales the MAD to the standard deviation of normally distributed data (Iglewicz and Hoaglin)
+MAD_SCALE = 0.6745
+# Used instead when more than half the peers share one value and the MAD is 0
+MEAN_DEVIATION_SCALE = 1.253314
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def village_of(record):
+    """
+    The village a claim was filed in
+    Returns: tuple or None: ((state, district, village) lookup key, display labels),
+        or None when the claim has no village
+    """
+    address = (record.get('personal_details') or {}).get('address') or {}
+    labels = tuple(_WHITESPACE.sub(' ', str(address.get(field) or '').strip()) for field in ('state', 'district', 'village'))
+    if not labels[2]:
+        return None
+    return tuple(normalize_value(label) or '' for label in labels), labels
+
+
+def village_table(labels, counts, located, latitude_sums, longitude_sums):
+    """
+    Bundle per-village columns, one row per village
+    Args:
+        labels (list): (state, district, village) display labels
+        counts: (n, 3) approved, pending and rejected counts
+        located: Claims with coordinates per village
+        latitude_sums, longitude_sums: Coordinate sums of those claims
+    Returns: dict: The columns as NumPy arrays, keyed by the argument names
+    """
+    return {
+        'labels': list(labels),
+        'counts': np.asarray(counts, dtype=np.int64).reshape(-1, 3),
+        'located': np.asarray(located, dtype=np.int64),
+        'latitude_sums': np.asarray(latitude_sums, dtype=float),
+        'longitude_sums': np.asarray(longitude_sums, dtype=float),
+    }
+
+
+def merge_village_tables(tables):
+    """
+    Add up the village counts of several stores (shards)
+    Args: tables (list): Tables from count_villages or VillageCounts.table
+    Returns: dict: See village_table, with villages matched case-insensitively
+    """
+    rows = {}
+    labels = []
+    for table in tables:
+        for label in table['labels']:
+            key = tuple(normalize_value(part) or '' for part in label)
+            if key not in rows:
+                rows[key] = len(labels)
+                labels.append(label)
+    size = len(labels)
+    merged = village_table(labels, np.zeros((size, 3)), np.zeros(size), np.zeros(size), np.zeros(size))
+    for table in tables:
+        index = np.array([rows[tuple(normalize_value(part) or '' for part in label)] for label in table['labels']],
+                         dtype=np.int64)
+        if not len(index):
+            continue
+        # Each village appears once per table, so plain fancy-index addition is safe
+        for column in ('counts', 'located', 'latitude_sums', 'longitude_sums'):
+            merged[column][index] += table[column]
+    return merged
+
+
+def count_villages(records):
+    """
+    Batch count of claims per village and status group
+    Args: records (iterable): Registrations
+    Returns: dict: See village_table
+    """
+    codes = {}
+    labels = []
+    rows, groups, latitudes, longitudes = [], [], [], []
+    for record in records:
+        village = village_of(record)
+        if village is None:
+            continue
+        key, label = village
+        row = codes.get(key)
+        if row is None:
+            row = codes[key] = len(labels)
+            labels.append(label)
+        rows.append(row)
+        groups.append(status_group(record.get('status')))
+        location = claim_location(record)
+        latitudes.append(location[0] if location else np.nan)
+        longitudes.append(location[1] if location else np.nan)
+    size = len(labels)
+    rows = np.array(rows, dtype=np.int64)
+    groups = np.array(groups, dtype=np.int64)
+    latitudes, longitudes = np.array(latitudes), np.array(longitudes)
+    present = ~np.isnan(latitudes)
+    return village_table(
+        labels,
+        np.bincount(rows * 3 + groups, minlength=size * 3).reshape(size, 3),
+        np.bincount(rows[present], minlength=size),
+        np.bincount(rows[present], weights=latitudes[present], minlength=size),
+        np.bincount(rows[present], weights=longitudes[present], minlength=size),
+    )
+
+
+class VillageCounts:
+    """
+    Claims per village and status group, kept current as registrations change
+
+    Attach to a store with RegistrationStore.subscribe. A change moves one
+    claim between a village's approved, pending and rejected counts (or
+    between villages), so keeping the table current costs a couple of
+    dictionary updates. There is one row per village, so the table saved
+    with a snapshot (see pack) is small enough to load as it is.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all counts before a full rebuild"""
+        # Village key -> [approved, pending, rejected, located, latitude sum, longitude sum]
+        self.villages = {}
+        self.labels = {}
+
+    def attach(self, saved):
+        """
+        Start from the counts saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        for key, label, counts in saved.meta['villages']:
+            self.villages[tuple(key)] = counts
+            self.labels[tuple(key)] = tuple(label)
+
+    def pack(self, rows):
+        """
+        Save the counts for a snapshot
+        Returns: tuple: (JSON details, no arrays)
+        """
+        return {'villages': [[key, self.labels[key], counts] for key, counts in self.villages.items()]}, {}
+
+    def apply(self, old, new):
+        """
+        Move a claim between counts when it is added, changes status or village, or is removed
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        if old is not None:
+            self._update(old, -1)
+        if new is not None:
+            self._update(new, 1)
+
+    def _update(self, record, sign):
+        village = village_of(record)
+        if village is None:
+            return
+        key, label = village
+        counts = self.villages.get(key)
+        if counts is None:
+            if sign < 0:
+                return
+            counts = self.villages[key] = [0, 0, 0, 0, 0.0, 0.0]
+            self.labels[key] = label
+        counts[status_group(record.get('status'))] += sign
+        location = claim_location(record)
+        if location is not None:
+            counts[3] += sign
+            counts[4] += sign * location[0]
+            counts[5] += sign * location[1]
+        if not (counts[APPROVED] or counts[PENDING] or counts[REJECTED]):
+            del self.villages[key]
+            del self.labels[key]
+
+    def table(self):
+        """Current counts as columns (see village_table)"""
+        rows = np.array(list(self.villages.values()), dtype=float).reshape(-1, 6)
+        return village_table([self.labels[key] for key in self.villages], rows[:, :3], rows[:, 3], rows[:, 4], rows[:, 5])
+
+
+def parse_anomaly_query(args):
+    """
+    Validate /api/anomalies/villages query parameters
+    Args: args (dict): Optional state and district filters, and pending_ratio,
+        min_claims and z to override the configured thresholds
+    Returns: dict: Keyword arguments for flag_villages
+    Raises: ValueError: A threshold is not a number or out of range
+    """
+    thresholds = {}
+    for name, kind, minimum, maximum in (('pending_ratio', float, 0, 1), ('min_claims', int, 1, None),
+                                         ('z', float, 0, None)):
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            value = kind(value)
+        except ValueError:
+            raise ValueError(f"'{name}' must be a {'whole ' if kind is int else ''}number")
+        if not np.isfinite(value) or value < minimum or (maximum is not None and value > maximum):
+            raise ValueError(f"'{name}' must be at least {minimum}" + (f" and at most {maximum}" if maximum is not None else ''))
+        thresholds[name] = value
+    for name in ('state', 'district'):
+        if args.get(name):
+            thresholds[name] = args.get(name)
+    return thresholds
+
+
+def _group_medians(groups, values):
+    """Median of values per group code, for group codes 0..max (vectorized with one sort)"""
+    order = np.lexsort((values, groups))
+    sorted_groups, sorted_values = groups[order], values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(sorted_values)])
+    medians = np.full(int(groups.max()) + 1, np.nan)
+    medians[sorted_groups[starts]] = (sorted_values[starts + (sizes - 1) // 2] + sorted_values[starts + sizes // 2]) / 2
+    return medians
+
+
+def robust_z_scores(groups, values, min_peers=MIN_DISTRICT_PEERS):
+    """
+    Robust z-score of each value against the other values of its group
+    Args:
+        groups (np.ndarray): Group code per value (e.g. district)
+        values (np.ndarray): Values to score (e.g. pending shares)
+        min_peers (int): Smallest group that is scored
+    Returns: tuple: (z-scores, NaN in smaller groups; group median per value)
+    """
+    if not len(values):
+        return np.empty(0), np.empty(0)
+    sizes = np.bincount(groups)
+    medians = _group_medians(groups, values)[groups]
+    deviations = np.abs(values - medians)
+    mad = _group_medians(groups, deviations)[groups]
+    mean_deviation = (np.bincount(groups, weights=deviations) / np.maximum(sizes, 1))[groups]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(mad > 0, MAD_SCALE * (values - medians) / mad,
+                     np.where(mean_deviation > 0, (values - medians) / (MEAN_DEVIATION_SCALE * mean_deviation), 0.0))
+    z[sizes[groups] < min_peers] = np.nan
+    return z, medians
+
+
+def flag_villages(table, pending_ratio=None, min_claims=None, z=None, min_peers=None, state=None, district=None):
+    """
+    Find villages whose claims are unusually stuck in processing
+    A village with at least min_claims claims is flagged when more than
+    pending_ratio of them are pending, or when its pending share has a
+    robust z-score of at least z against the eligible villages of its
+    district (only for districts with at least min_peers of them).
+    Args:
+        table (dict): Counts from count_villages or VillageCounts.table
+        pending_ratio, min_claims, z, min_peers: Thresholds (default: the configured ones)
+        state, district (str): Only report villages in this state or district
+    Returns: dict: flagged villages, most pending first, and the thresholds used
+    """
+    pending_ratio = PENDING_RATIO_THRESHOLD if pending_ratio is None else pending_ratio
+    min_claims = MIN_VILLAGE_CLAIMS if min_claims is None else min_claims
+    z = ROBUST_Z_THRESHOLD if z is None else z
+    min_peers = MIN_DISTRICT_PEERS if min_peers is None else min_peers
+
+    counts = table['counts']
+    filed = counts.sum(axis=1)
+    eligible = np.flatnonzero(filed >= max(min_claims, 1))
+    ratios = counts[eligible, PENDING] / filed[eligible]
+    # One group code per (state, district), factorized from the normalized labels
+    districts = [tuple(normalize_value(part) for part in table['labels'][row][:2]) for row in eligible]
+    codes = {}
+    groups = np.array([codes.setdefault(key, len(codes)) for key in districts], dtype=np.int64)
+    scores, medians = robust_z_scores(groups, ratios, min_peers)
+
+    by_ratio = ratios > pending_ratio
+    by_peers = ~np.isnan(scores) & (np.nan_to_num(scores, nan=-np.inf) >= z)
+    wanted = {name: normalize_value(value) for name, value in (('state', state), ('district', district)) if value}
+    villages = []
+    for position in np.flatnonzero(by_ratio | by_peers):
+        row = eligible[position]
+        state_label, district_label, village_label = table['labels'][row]
+        if any(normalize_value(label) != wanted[name]
+               for name, label in (('state', state_label), ('district', district_label)) if name in wanted):
+            continue
+        entry = {
+            'state': state_label or None,
+            'district': district_label or None,
+            'village': village_label,
+            'filed': int(filed[row]),
+            'pending_ratio': round(float(ratios[position]), 4),
+            'district_median': None if np.isnan(scores[position]) else round(float(medians[position]), 4),
+            'robust_z': None if np.isnan(scores[position]) else round(float(scores[position]), 2),
+            'reasons': [reason for reason, hit in ((PENDING_RATIO, by_ratio[position]), (DISTRICT_PEERS, by_peers[position])) if hit],
+            'latitude': None,
+            'longitude': None,
+        }
+        for group, name in enumerate(STATUS_GROUPS):
+            entry[name] = int(counts[row, group])
+        located = table['located'][row]
+        if located:
+            entry['latitude'] = round(float(table['latitude_sums'][row] / located), 6)
+            entry['longitude'] = round(float(table['longitude_sums'][row] / located), 6)
+        villages.append(entry)
+    villages.sort(key=lambda entry: (-entry['pending_ratio'], -entry['filed']))
+    return {
+        'villages': villages,
+        'villages_checked': int(len(eligible)),
+        'thresholds': {'pending_ratio': pending_ratio, 'min_claims': min_claims, 'z': z, 'min_peers': min_peers},
+    }
+
+
+class VillageAnomalies:
+    """
+    Village counts and flag reports of one worker's store, cached per store version
+
+    Stores that keep VillageCounts current hand over a fresh table whenever
+    the version moves, which costs time in the number of villages. Stores
+    without maintained counts (SQLite) are recounted by a full scan, at most
+    once every refresh interval; in between the last table is served, with
+    the version it was counted at.
+    """
+
+    def __init__(self, store, refresh_seconds=REFRESH_SECONDS):
+        """
+        Args:
+            store (RegistrationStore): Store to count
+            refresh_seconds (float): Least time between full recounts of stores without maintained counts
+        """
+        self.store = store
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._version = None
+        self._table = None
+        self._counted_at = 0.0
+        # Flag reports for the current table, by thresholds
+        self._reports = {}
+
+    def table(self):
+        """
+        Current village counts
+        Returns: tuple: (store version the table reflects, table dict from village_table)
+        """
+        with self._lock:
+            incremental = self.store._villages is not None
+            if self._table is not None and not incremental and time.monotonic() - self._counted_at < self.refresh_seconds:
+                return self._version, self._table
+            # Read before counting: a write in between makes the next call count again
+            version = self.store.version()
+            if version != self._version or self._table is None:
+                started = time.monotonic()
+                self._table = self.store.village_counts()
+                self._version = version
+                self._reports = {}
+                if not incremental:
+                    logger.info(f"Counted {len(self._table['labels'])} villages in {time.monotonic() - started:.2f}s")
+            self._counted_at = time.monotonic()
+            return self._version, self._table
+
+    def report(self, **thresholds):
+        """
+        Flagged villages for the current counts, reusing the last report for the same thresholds
+        Args: thresholds: Keyword arguments for flag_villages
+        Returns: tuple: (store version the report reflects, report dict)
+        """
+        version, table = self.table()
+        key = tuple(sorted(thresholds.items()))
+        with self._lock:
+            if version == self._version:
+                cached = self._reports.get(key)
+                if cached is not None:
+                    return version, cached
+        report = flag_villages(table, **thresholds)
+        with self._lock:
+            if version == self._version and len(self._reports) < MAX_CACHED_REPORTS:
+                self._reports[key] = report
+        return version, report
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_village_anomalies(store):
+    """Return this worker process's village count cache for a store"""
+    key = (id(store), os.getpid())
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = VillageAnomalies(store)
+        return cache
+
+
+def main(argv=None):
+    from registration_store import get_registration_store
+
+    parser = argparse.ArgumentParser(description='Report villages where FRA claims are unusually delayed')
+    parser.add_argument('--state', help='Only report villages in this state')
+    parser.add_argument('--district', help='Only report villages in this district')
+    parser.add_argument('--pending-ratio', type=float, default=PENDING_RATIO_THRESHOLD,
+                        help='Flag villages with more than this share of claims pending')
+    parser.add_argument('--min-claims', type=int, default=MIN_VILLAGE_CLAIMS, help='Smallest village considered')
+    parser.add_argument('--z', type=float, default=ROBUST_Z_THRESHOLD,
+                        help='Flag villages this many robust deviations above their district')
+    args = parser.parse_args(argv)
+
+    store = get_registration_store()
+    report = flag_villages(count_villages(store.iter_records()), pending_ratio=args.pending_ratio,
+                           min_claims=args.min_claims, z=args.z, state=args.state, district=args.district)
+    json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
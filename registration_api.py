@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+VanMitra registration API
+Land claim registration, status, listing, search, import, atlas, change
+feed and workflow endpoints, shared by production_server.py and the
+standalone registration server. Register the blueprint on an app whose
+request_class is StreamingUploadRequest so claim documents stream to disk.
+"""
+
+import logging
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from registration_store import get_registration_store
+from registration_writer import get_registration_writer
+from registration_query import RegistrationQuery
+from registration_index import INDEXED_FIELDS
+from registration_columns import parse_group_by, parse_metrics
+from registration_etag import record_etag, registry_etag, conditional_response
+from registration_export import stream_export
+from registration_scoring import calculate_fra_approval_probability
+from registration_ids import new_application_id
+from registration_import import IMPORT_FORMATS, detect_format, iter_rows, import_registrations, parse_phone
+from registration_documents import get_document_store, store_uploaded_documents, document_upload_policy
+from registration_uploads import streaming_uploads
+from registration_feed import get_change_feed
+from registration_duplicates import describe_fields, DuplicateClaimError
+from registration_map import parse_location, parse_map_query
+from registration_parcels import parse_parcel
+from registration_anomalies import get_village_anomalies, parse_anomaly_query
+from registration_workflow import (
+    STATUS_LABELS, allowed_transitions, parse_transition, parse_bulk_transitions, transition_registrations
+)
+
+logger = logging.getLogger(__name__)
+
+registration_api = Blueprint('registration_api', __name__)
+
+
+@registration_api.route('/api/register-claim', methods=['POST'])
+@streaming_uploads(document_upload_policy())
+def register_land_claim():
+    """Handle land claim registration submission"""
+    try:
+        # Generate a time-sortable application ID
+        application_id = new_application_id()
+        
+        # Extract form data
+        registration_data = {
+            'application_id': application_id,
+            'submission_date': datetime.now().isoformat(),
+            'status': 'submitted',
+            'personal_details': {
+                'applicant_name': request.form.get('applicantName'),
+                'father_name': request.form.get('fatherName'),
+                'aadhaar': request.form.get('aadhaar'),
+                'phone': parse_phone(request.form.get('phone')),
+                'tribe': request.form.get('tribe'),
+                'family_members': int(request.form.get('familyMembers', 0)),
+                'address': {
+                    'village': request.form.get('village'),
+                    'tehsil': request.form.get('tehsil'),
+                    'district': request.form.get('district'),
+                    'state': request.form.get('state')
+                }
+            },
+            'land_details': {
+                'claim_type': request.form.get('claimType'),
+                'land_area': float(request.form.get('landArea', 0)),
+                'occupation_since': int(request.form.get('occupationSince', 0)),
+                'forest_type': request.form.get('forestType'),
+                'survey_number': request.form.get('surveyNumber'),
+                'boundaries': request.form.get('boundaries'),
+                'location': parse_location(request.form.get('latitude'), request.form.get('longitude')),
+                'parcel': parse_parcel(request.form.get('parcelGeojson')),
+                'land_use': request.form.getlist('landUse')
+            },
+            'remarks': request.form.get('remarks'),
+            'documents': {}
+        }
+        
+        # Store uploaded documents by content hash; identical scans are kept once
+        registration_data['documents'] = store_uploaded_documents(get_document_store(), request.files)
+        
+        # Calculate approval probability
+        approval_data = calculate_fra_approval_probability(registration_data)
+        registration_data['prediction'] = approval_data
+        
+        # Save registration; returns once its group commit is durable. The commit first
+        # flags a second claim on the same Aadhaar number or land parcel for reviewers
+        # (or refuses it under the reject policy) and records overlapping boundaries
+        get_registration_writer().submit(registration_data)
+        duplicates = registration_data.get('duplicate_of') or {}
+        overlaps = registration_data.get('parcel_overlaps') or []
+        
+        logger.info(f"New land claim registration: {application_id}")
+        if duplicates:
+            logger.warning(f"Registration {application_id} matches existing claims on {', '.join(duplicates)}")
+        if overlaps:
+            logger.warning(f"Registration {application_id} overlaps {len(overlaps)} existing claims")
+        
+        response = {
+            'success': True,
+            'application_id': application_id,
+            'message': 'Registration submitted successfully!',
+            'approval_probability': approval_data,
+            'next_steps': [
+                'Visit Gram Sabha for community verification',
+                'Submit application to Sub-Divisional Level Committee (SDLC)',
+                'Await field verification by forest officials',
+                'Track application status online'
+            ]
+        }
+        if overlaps:
+            response['parcel_overlap'] = True
+            response['overlapping_claims'] = len(overlaps)
+            response['parcel_area'] = registration_data['land_details']['parcel_area']
+            response['message'] = (f"Registration submitted, but its boundary overlaps {len(overlaps)} existing "
+                                   f"claim{'s' if len(overlaps) > 1 else ''}. It will be reviewed before verification.")
+        if duplicates:
+            # The applicant learns which details matched, never the other claims
+            response['possible_duplicate'] = True
+            response['duplicate_fields'] = list(duplicates)
+            response['message'] = ('Registration submitted, but a claim with the same '
+                                   f"{' and '.join(describe_fields(duplicates))} is already registered. "
+                                   'It will be reviewed before verification.')
+        return jsonify(response)
+        
+    except DuplicateClaimError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'duplicate_fields': list(e.matches),
+            'message': 'Registration refused. Check the status of your existing application instead.'
+        }), 409
+    except RequestEntityTooLarge as e:
+        return jsonify({
+            'success': False,
+            'error': e.description,
+            'message': 'Registration failed. Please upload smaller documents.'
+        }), 413
+    except Exception as e:
+        logger.error(f"Error in land claim registration: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Registration failed. Please try again.'
+        }), 500
+
+@registration_api.route('/api/check-status/<application_id>')
+def check_registration_status(application_id):
+    """Check the status of a land claim application (supports If-None-Match)"""
+    try:
+        registration = get_registration_store().get(application_id)
+        
+        if registration is not None:
+            return conditional_response(record_etag(registration), lambda: jsonify({
+                'success': True,
+                # Links to other applicants' claims are for reviewers only
+                'application': {key: value for key, value in registration.items()
+                                if key not in ('duplicate_of', 'parcel_overlaps')}
+            }))
+        
+        return jsonify({
+            'success': False,
+            'message': 'Application not found'
+        }), 404
+        
+    except Exception as e:
+        logger.error(f"Error checking application status: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to check status'
+        }), 500
+
+@registration_api.route('/api/registrations')
+def get_all_registrations():
+    """
+    Get a page of registrations for admin dashboard
+    Query params: status, district, state, tribe, claim_type, forest_type
+    (comma-separated for any of several), from, to (YYYY-MM-DD), q (free text),
+    sort (e.g. -submission_date), limit and cursor (from the previous page)
+    With format=ndjson|csv|json every matching registration is streamed instead
+    Responses carry an ETag; If-None-Match gets a 304 while nothing has changed
+    """
+    try:
+        try:
+            query = RegistrationQuery.from_args(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        store = get_registration_store()
+        # Read the version first so the ETag never claims a newer state than the body
+        etag = registry_etag(store.version(), request.args)
+        
+        export_format = request.args.get('format')
+        if export_format:
+            try:
+                chunks, mimetype = stream_export(store.iter_matching(query), export_format)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            return conditional_response(etag, lambda: Response(
+                stream_with_context(chunks),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename=fra_registrations.{export_format}'}
+            ))
+        
+        def build_page():
+            page = store.query(query)
+            
+            # Statistics are maintained incrementally by the store
+            stats = store.statistics()
+            
+            return jsonify({
+                'success': True,
+                'registrations': page['registrations'],
+                'pagination': page['pagination'],
+                'statistics': stats
+            })
+        
+        return conditional_response(etag, build_page)
+        
+    except Exception as e:
+        logger.error(f"Error getting registrations: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to retrieve registrations'
+        }), 500
+
+@registration_api.route('/api/registrations/search')
+def search_registrations():
+    """
+    Full-text search over registrations, best matches first
+    Query params: q (each word matches the start of a word in the applicant,
+    father, village, tehsil, survey number, boundary or remarks fields), limit,
+    plus any of the /api/registrations filters
+    """
+    try:
+        try:
+            query = RegistrationQuery.from_args(request.args)
+            if not query.terms:
+                raise ValueError("A search needs some text in 'q'")
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        store = get_registration_store()
+        return conditional_response(registry_etag(store.version(), request.args), lambda: jsonify({
+            'success': True,
+            'results': [
+                {'registration': registration, 'score': round(score, 4)}
+                for registration, score in store.search(query)
+            ]
+        }))
+        
+    except Exception as e:
+        logger.error(f"Error searching registrations: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to search registrations'
+        }), 500
+
+@registration_api.route('/api/registrations/facets')
+def get_registration_facets():
+    """
+    Count matching registrations per value of each filterable field
+    Query params: the /api/registrations filters, plus fields (comma-separated,
+    defaults to every indexed field)
+    """
+    try:
+        try:
+            query = RegistrationQuery.from_args(request.args)
+            fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+            unknown = [field for field in fields if field not in INDEXED_FIELDS]
+            if unknown:
+                raise ValueError(f"Cannot facet on '{unknown[0]}'. Choose from: {', '.join(INDEXED_FIELDS)}")
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def build_facets():
+            facets, total_matching = store.facets(query, fields or list(INDEXED_FIELDS))
+            return jsonify({
+                'success': True,
+                'facets': facets,
+                'total_matching': total_matching
+            })
+        
+        store = get_registration_store()
+        return conditional_response(registry_etag(store.version(), request.args), build_facets)
+        
+    except Exception as e:
+        logger.error(f"Error counting registration facets: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to count registrations'
+        }), 500
+
+@registration_api.route('/api/registrations/aggregate')
+def get_registration_aggregates():
+    """
+    Group matching registrations and aggregate numeric fields per group
+    Query params: the /api/registrations filters, plus group_by (comma-separated
+    fields; numeric ones take a bucket width, e.g. occupation_since:10) and
+    metrics (count or sum/mean/min/max:field, default count)
+    """
+    try:
+        try:
+            query = RegistrationQuery.from_args(request.args)
+            group_by = parse_group_by([f.strip() for f in request.args.get('group_by', '').split(',') if f.strip()])
+            metrics = parse_metrics([m.strip() for m in request.args.get('metrics', 'count').split(',') if m.strip()])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def build_aggregates():
+            groups, total_matching = store.aggregate(query, group_by, metrics)
+            return jsonify({
+                'success': True,
+                'groups': groups,
+                'total_matching': total_matching
+            })
+        
+        store = get_registration_store()
+        return conditional_response(registry_etag(store.version(), request.args), build_aggregates)
+        
+    except Exception as e:
+        logger.error(f"Error aggregating registrations: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to aggregate registrations'
+        }), 500
+
+@registration_api.route('/api/registrations/import', methods=['POST'])
+def import_registration_file():
+    """
+    Bulk import land claims from a CSV or NDJSON file
+    Accepts a multipart upload in 'file' or the raw request body. Params: format
+    (csv or ndjson, defaults to the file extension or content type), dry_run
+    (validate and score without saving). Valid rows are committed in one batch;
+    invalid rows are reported by line number.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            stream, import_format = upload.stream, detect_format(upload.filename, upload.mimetype)
+        else:
+            stream, import_format = request.stream, detect_format(None, request.mimetype)
+        import_format = request.values.get('format') or import_format
+        dry_run = request.values.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        if import_format not in IMPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Upload a .csv or .ndjson file, or pass format ({', '.join(IMPORT_FORMATS)})"
+            }), 400
+        try:
+            report = import_registrations(get_registration_store(), iter_rows(stream, import_format),
+                                          dry_run=dry_run)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        logger.info(f"Bulk import: {report['imported']} saved, {report['failed']} rejected of {report['total_rows']} rows")
+        return jsonify({'success': True, **report})
+        
+    except Exception as e:
+        logger.error(f"Error importing registrations: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to import registrations'
+        }), 500
+
+@registration_api.route('/api/map/claims')
+def get_map_claims():
+    """
+    Claims inside the visible map area for the FRA Smart Atlas
+    Query params: bbox (west,south,east,north in degrees) and zoom; claims are
+    clustered into cells with approved / pending / rejected counts, and sent
+    individually only past the deepest cluster zoom
+    Responses carry an ETag; If-None-Match gets a 304 while nothing has changed
+    """
+    try:
+        try:
+            bbox, zoom = parse_map_query(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        store = get_registration_store()
+        return conditional_response(registry_etag(store.version(), request.args), lambda: jsonify(
+            dict(store.map_clusters(bbox, zoom), success=True)
+        ))
+        
+    except Exception as e:
+        logger.error(f"Error getting map claims: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to load map claims'
+        }), 500
+
+@registration_api.route('/api/anomalies/villages')
+def get_village_anomalies_report():
+    """
+    Villages where claims are unusually stuck in processing, for the atlas overlay
+    Query params: optional state and district filters, and pending_ratio,
+    min_claims and z to override the configured thresholds
+    Counts are cached per store version; responses carry an ETag and
+    If-None-Match gets a 304 while they are unchanged
+    """
+    try:
+        try:
+            thresholds = parse_anomaly_query(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        version, report = get_village_anomalies(get_registration_store()).report(**thresholds)
+        return conditional_response(registry_etag(version, request.args), lambda: jsonify(dict(report, success=True)))
+        
+    except Exception as e:
+        logger.error(f"Error getting village anomalies: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to load village anomalies'
+        }), 500
+
+@registration_api.route('/api/registrations/stream')
+def stream_registration_changes():
+    """
+    Server-Sent Events feed of registration inserts and status changes
+    Browsers resume from their Last-Event-ID after reconnecting (or pass
+    last_event_id); changes older than the server's buffer arrive as one
+    'reset' event telling the dashboard to reload.
+    """
+    try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        # Each stream holds a request thread; past the worker's limit the rest are turned away
+        messages = get_change_feed(get_registration_store()).stream(last_event_id)
+        if messages is None:
+            return jsonify({
+                'success': False,
+                'error': 'Too many live dashboards; retry shortly'
+            }), 503, {'Retry-After': '30'}
+        
+        return Response(messages, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Keep nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        })
+        
+    except Exception as e:
+        logger.error(f"Error opening change stream: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to open change stream'
+        }), 500
+
+@registration_api.route('/api/registrations/<application_id>/status', methods=['POST'])
+def change_registration_status(application_id):
+    """
+    Move one application along the FRA workflow
+    JSON body: status, plus optional actor and remarks. The transition must be
+    allowed from the current status (Gram Sabha -> SDLC -> DLC -> decision) and
+    is appended to the application's status_history.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        try:
+            change = parse_transition(dict(payload if isinstance(payload, dict) else {}, application_id=application_id))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        report = transition_registrations(get_registration_store(), [change])
+        if report['errors']:
+            error = report['errors'][0]
+            return jsonify({'success': False, 'error': error['error']}), 404 if error['not_found'] else 409
+        
+        registration = report['registrations'][0]
+        logger.info(f"Application {application_id} moved to {registration['status']}")
+        return jsonify({
+            'success': True,
+            **registration,
+            'status_label': STATUS_LABELS[registration['status']],
+            'allowed_transitions': list(allowed_transitions(registration['status']))
+        })
+        
+    except Exception as e:
+        logger.error(f"Error changing application status: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to change status'
+        }), 500
+
+@registration_api.route('/api/registrations/status', methods=['POST'])
+def change_registration_statuses():
+    """
+    Apply several status changes in one commit
+    JSON body: 'transitions', a list of {application_id, status, actor, remarks},
+    or 'application_ids' with one shared 'status'. Changes the workflow does not
+    allow are reported per application without holding back the others.
+    """
+    try:
+        try:
+            changes = parse_bulk_transitions(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        report = transition_registrations(get_registration_store(), changes)
+        logger.info(f"Bulk status change: {report['updated']} updated, {report['failed']} refused")
+        return jsonify({'success': True, **report})
+        
+    except Exception as e:
+        logger.error(f"Error changing application statuses: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to change statuses'
+        }), 500
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Cold Archive for Decided Registrations
+Approved and rejected claims are final, and once a decision is old they are
+rarely looked at again. The tiering job moves them out of the active store
+into compressed, read-only partitions, one per submission month, so scans,
+indexes and in-memory views only carry the claims still being worked on.
+
+Each partition file is a run of independent gzip members of BLOCK_RECORDS
+registrations sorted by application_id, so the whole file still reads with
+zcat. A small sidecar index holds the first ID and byte range of each
+block; a status lookup bisects it and decompresses a single block. A second
+sidecar keeps just the fields behind duplicate detection, parcel overlaps,
+the atlas and the delayed-village flags, so every worker can fold the
+archived claims into those views without decompressing the archive. The
+manifest lists the current generation of every partition with its ID range
+and carries the archive's statistics, and is replaced atomically, so readers
+always see a complete set of files. Run as a script to archive decided claims.
+"""
+
+import os
+import sys
+import json
+import gzip
+import bisect
+import secrets
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+from registration_stats import RegistrationStatistics, record_version
+from registration_store import FileLock, _fsync_directory
+from registration_workflow import APPROVED, REJECTED
+from registration_duplicates import DuplicateIndex, KEY_BYTES
+from registration_parcels import ParcelIndex
+from registration_map import ClaimMap
+from registration_anomalies import VillageCounts
+
+logger = logging.getLogger(__name__)
+
+# Tiering configuration (overridable through the environment)
+# Decided claims move to the archive this many days after their decision
+ARCHIVE_AFTER_DAYS = int(os.environ.get('VANMITRA_ARCHIVE_AFTER_DAYS', 365))
+
+ARCHIVE_DIRNAME = 'archive'
+MANIFEST_FILENAME = 'manifest.json'
+PARTITION_PREFIX = 'claims-'
+DATA_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx.json'
+VIEWS_SUFFIX = '.views.jsonl.gz'
+PARTITION_SUFFIXES = (DATA_SUFFIX, INDEX_SUFFIX, VIEWS_SUFFIX)
+# Bumped whenever the manifest or partition files change shape
+ARCHIVE_FORMAT = 1
+# Registrations per gzip member; a lookup decompresses one member
+BLOCK_RECORDS = 128
+# Partition for claims without a usable submission date
+UNDATED = 'undated'
+
+DECIDED_STATUSES = (APPROVED, REJECTED)
+
+
+def partition_of(record):
+    """
+    Archive partition a registration belongs to
+    Returns: str: Submission month as YYYY-MM, or UNDATED
+    """
+    month = str(record.get('submission_date') or '')[:7]
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return UNDATED
+    return month
+
+
+def decided_at(record):
+    """
+    When a claim was approved or rejected
+    Returns: datetime or None: Time of the last status change (the submission
+        date for claims decided before status history was kept), or None for
+        claims that are not decided or carry no usable date
+    """
+    if record.get('status') not in DECIDED_STATUSES:
+        return None
+    history = record.get('status_history') or []
+    value = (history[-1] or {}).get('at') if history else record.get('submission_date')
+    try:
+        decided = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    # Compare naive local times, as recorded by change_status
+    return decided.replace(tzinfo=None)
+
+
+def view_fields(record):
+    """
+    The parts of an archived claim its duplicate, parcel, map and village views read
+    Returns: dict: A registration reduced to its ID, status, Aadhaar number,
+        address, survey number, location and parcel
+    """
+    personal = record.get('personal_details') or {}
+    land = record.get('land_details') or {}
+    return {
+        'application_id': record['application_id'],
+        'status': record.get('status'),
+        'personal_details': {'aadhaar': personal.get('aadhaar'), 'address': personal.get('address') or {}},
+        'land_details': {field: land.get(field) for field in ('survey_number', 'location', 'parcel')},
+    }
+
+
+def _encode(record):
+    data = json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+    return f"{record['application_id']}\t{data}\n"
+
+
+class ColdArchive:
+    """
+    Month-partitioned, compressed archive of decided registrations
+
+    Readers never take a lock: the manifest names the files of each
+    partition's current generation, writers publish a new generation before
+    swapping the manifest, and a reader whose files were replaced underneath
+    it reloads the manifest and tries again.
+    """
+
+    def __init__(self, directory):
+        """
+        Args: directory (str): Folder holding the manifest and partition files
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = FileLock(os.path.join(directory, '.lock'))
+        self._manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        self._mutex = threading.Lock()
+        self._signature = None
+        self._manifest = None
+        # (partition, generation) -> (first IDs, [offset, length] of each block)
+        self._indexes = {}
+        self._views_mutex = threading.Lock()
+        # partition -> (generation, {application_id: view fields}) folded into the views
+        self._view_parts = {}
+        self._duplicates = DuplicateIndex(secrets.token_bytes(KEY_BYTES))
+        self._parcels = ParcelIndex()
+        self._map = ClaimMap()
+        self._villages = VillageCounts()
+
+    # ------------------------------------------------------------------
+    # Manifest
+    # ------------------------------------------------------------------
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self._manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def manifest(self):
+        """
+        The current manifest, re-read only when another process replaced it
+        Returns: dict: format, version, statistics state and partitions
+            (partition -> generation, count, first_id, last_id)
+        """
+        signature = self._file_signature()
+        with self._mutex:
+            if self._manifest is None or signature != self._signature:
+                manifest = {'format': ARCHIVE_FORMAT, 'version': 0, 'statistics': {}, 'partitions': {}}
+                if signature is not None:
+                    with open(self._manifest_path, 'r') as f:
+                        manifest = json.load(f)
+                    if manifest.get('format') != ARCHIVE_FORMAT:
+                        raise ValueError(f"Unsupported archive format in {self._manifest_path}")
+                self._manifest = manifest
+                self._signature = signature
+                current = {(name, entry['generation']) for name, entry in manifest['partitions'].items()}
+                self._indexes = {key: value for key, value in self._indexes.items() if key in current}
+            return self._manifest
+
+    def _write_manifest(self, manifest):
+        temp_path = self._manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._manifest_path)
+        _fsync_directory(self.directory)
+
+    def version(self):
+        """
+        Returns: int: Sum of the versions of every copy ever archived; it only grows,
+            so the store-wide version stays monotonic as claims move here
+        """
+        return int(self.manifest()['version'])
+
+    def totals(self):
+        """Return the dashboard aggregates over the archived claims (see RegistrationStatistics)"""
+        return dict(self.manifest()['statistics'])
+
+    def count(self):
+        """Return the number of archived registrations"""
+        return sum(entry['count'] for entry in self.manifest()['partitions'].values())
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _path(self, partition, generation, suffix):
+        return os.path.join(self.directory, f"{PARTITION_PREFIX}{partition}.g{generation}{suffix}")
+
+    def _block_index(self, partition, generation):
+        key = (partition, generation)
+        index = self._indexes.get(key)
+        if index is None:
+            with open(self._path(partition, generation, INDEX_SUFFIX), 'r') as f:
+                blocks = json.load(f)
+            index = self._indexes[key] = ([first for first, _, _ in blocks], [block[1:] for block in blocks])
+        return index
+
+    def _lookup(self, partition, generation, application_id):
+        first_ids, ranges = self._block_index(partition, generation)
+        block = bisect.bisect_right(first_ids, application_id) - 1
+        if block < 0:
+            return None
+        offset, length = ranges[block]
+        with open(self._path(partition, generation, DATA_SUFFIX), 'rb') as f:
+            f.seek(offset)
+            data = gzip.decompress(f.read(length)).decode('utf-8')
+        prefix = application_id + '\t'
+        for line in data.splitlines():
+            if line.startswith(prefix):
+                return json.loads(line[len(prefix):])
+        return None
+
+    def get(self, application_id):
+        """
+        Look up an archived registration
+        Returns: dict or None: The archived copy, or None if it was never archived
+        """
+        for attempt in range(2):
+            try:
+                for partition, entry in self.manifest()['partitions'].items():
+                    # IDs start with their submission time, so ranges barely overlap
+                    if entry['first_id'] <= application_id <= entry['last_id']:
+                        record = self._lookup(partition, entry['generation'], application_id)
+                        if record is not None:
+                            return record
+                return None
+            except FileNotFoundError:
+                # A tiering run replaced the partition; pick up the new manifest
+                with self._mutex:
+                    self._signature = None
+        return None
+
+    def _read_partition(self, partition, generation):
+        with gzip.open(self._path(partition, generation, DATA_SUFFIX), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line.split('\t', 1)[1])
+
+    def iter_records(self, partition=None):
+        """
+        Yield archived registrations, partition by partition in month order
+        Args: partition (str): Only this partition (default: all)
+        """
+        partitions = self.manifest()['partitions']
+        for name in sorted(partitions):
+            if partition is None or name == partition:
+                yield from self._read_partition(name, partitions[name]['generation'])
+
+    # ------------------------------------------------------------------
+    # Views: duplicate digests, parcels, map cells and village counts
+    # ------------------------------------------------------------------
+
+    def _read_view_fields(self, partition, generation):
+        path = self._path(partition, generation, VIEWS_SUFFIX)
+        if not os.path.exists(path):
+            # Partition written before the sidecar existed: reduce the full records
+            return [view_fields(record) for record in self._read_partition(partition, generation)]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def _refresh_views(self):
+        """Fold partitions added, rewritten or dropped since the last call into the views"""
+        partitions = self.manifest()['partitions']
+        for name in [name for name in self._view_parts if name not in partitions]:
+            for fields in self._view_parts.pop(name)[1].values():
+                self._apply_views(fields, None)
+        for name, entry in partitions.items():
+            known = self._view_parts.get(name)
+            if known is not None and known[0] == entry['generation']:
+                continue
+            current = {fields['application_id']: fields
+                       for fields in self._read_view_fields(name, entry['generation'])}
+            previous = known[1] if known is not None else {}
+            for application_id in previous.keys() | current.keys():
+                old, new = previous.get(application_id), current.get(application_id)
+                if old != new:
+                    self._apply_views(old, new)
+            self._view_parts[name] = (entry['generation'], current)
+
+    def _apply_views(self, old, new):
+        for view in (self._duplicates, self._parcels, self._map, self._villages):
+            view.apply(old, new)
+
+    def _with_views(self, read):
+        """Run read() against up-to-date views, retrying if a tiering run replaced a partition"""
+        with self._views_mutex:
+            for attempt in range(2):
+                try:
+                    self._refresh_views()
+                    break
+                except FileNotFoundError:
+                    with self._mutex:
+                        self._signature = None
+            return read()
+
+    def duplicates(self, record):
+        """Archived claims with the same Aadhaar number or land parcel (see DuplicateIndex.find)"""
+        return self._with_views(lambda: self._duplicates.find(record))
+
+    def overlapping_claims(self, record):
+        """Archived claims whose parcels overlap a registration's (see ParcelIndex.overlaps)"""
+        return self._with_views(lambda: self._parcels.overlaps(record))
+
+    def map_cells(self, bbox, zoom):
+        """Map cells and claims of the archived claims (see ClaimMap.cells)"""
+        return self._with_views(lambda: self._map.cells(bbox, zoom))
+
+    def village_counts(self):
+        """Archived claims per village and status group (see VillageCounts.table)"""
+        return self._with_views(self._villages.table)
+
+    # ------------------------------------------------------------------
+    # Writes (callers hold self.lock)
+    # ------------------------------------------------------------------
+
+    def _write_partition(self, partition, generation, records):
+        """Write a partition generation; records must be sorted by application_id"""
+        data_path = self._path(partition, generation, DATA_SUFFIX)
+        blocks = []
+        with open(data_path + '.tmp', 'wb') as f:
+            for start in range(0, len(records), BLOCK_RECORDS):
+                block = records[start:start + BLOCK_RECORDS]
+                data = gzip.compress(''.join(_encode(record) for record in block).encode('utf-8'))
+                blocks.append([block[0]['application_id'], f.tell(), len(data)])
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(data_path + '.tmp', data_path)
+        index_path = self._path(partition, generation, INDEX_SUFFIX)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(blocks, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_path + '.tmp', index_path)
+        views_path = self._path(partition, generation, VIEWS_SUFFIX)
+        with gzip.open(views_path + '.tmp', 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(view_fields(record), separators=(',', ':'), ensure_ascii=False) + '\n')
+        with open(views_path + '.tmp', 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(views_path + '.tmp', views_path)
+
+    def _publish(self, partition, changes):
+        """
+        Rewrite one partition with some registrations added, replaced or dropped
+        Args:
+            partition (str): Partition name
+            changes (dict): application_id -> new archived copy, or None to drop it
+        """
+        manifest = json.loads(json.dumps(self.manifest()))
+        entry = manifest['partitions'].get(partition)
+        records = {}
+        if entry is not None:
+            records = {record['application_id']: record
+                       for record in self._read_partition(partition, entry['generation'])}
+        statistics = RegistrationStatistics()
+        statistics.load_state(manifest['statistics'])
+        for application_id, new in changes.items():
+            old = records.pop(application_id, None)
+            if new is not None:
+                records[application_id] = new
+                manifest['version'] += record_version(new)
+            statistics.apply(old, new)
+
+        generation = (entry['generation'] if entry else 0) + 1
+        ordered = [records[application_id] for application_id in sorted(records)]
+        if ordered:
+            self._write_partition(partition, generation, ordered)
+            manifest['partitions'][partition] = {
+                'generation': generation,
+                'count': len(ordered),
+                'first_id': ordered[0]['application_id'],
+                'last_id': ordered[-1]['application_id'],
+            }
+        else:
+            manifest['partitions'].pop(partition, None)
+        manifest['statistics'] = statistics.get_state()
+        self._write_manifest(manifest)
+        self.remove_stale_files()
+
+    def add(self, partition, records):
+        """
+        Archive copies of registrations, replacing any earlier copies of them
+        Args:
+            partition (str): Partition the records belong to (see partition_of)
+            records (list): Registrations, already stamped as archived
+        """
+        self._publish(partition, {record['application_id']: record for record in records})
+
+    def discard(self, partition, application_ids):
+        """Drop registrations from a partition (copies whose removal from the store failed)"""
+        self._publish(partition, {application_id: None for application_id in application_ids})
+
+    def remove_stale_files(self):
+        """Delete generations the manifest no longer names, and files left by interrupted runs"""
+        current = {
+            os.path.basename(self._path(name, entry['generation'], suffix))
+            for name, entry in self.manifest()['partitions'].items()
+            for suffix in PARTITION_SUFFIXES
+        }
+        for name in os.listdir(self.directory):
+            if name.startswith(PARTITION_PREFIX) and name not in current:
+                os.remove(os.path.join(self.directory, name))
+
+
+def archive_decided(store, archive, older_than_days=ARCHIVE_AFTER_DAYS, dry_run=False, now=None):
+    """
+    Move claims decided more than older_than_days ago from the store to the archive
+
+    Each partition's archived copies are made durable before the claims are
+    removed from the store. If the run stops in between, the claims are in
+    both tiers until the next run archives them again, which replaces the
+    earlier copies.
+    Args:
+        store (RegistrationStore): Active store, with the archive attached
+        archive (ColdArchive): Archive to move claims into
+        older_than_days (int): Age of the decision before a claim is archived
+        dry_run (bool): Only count the claims that are due
+        now (datetime): Current time (default: now)
+    Returns: dict: partition -> number of claims archived (or due, on a dry run)
+    """
+    if older_than_days < 0:
+        raise ValueError('older_than_days must not be negative')
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=older_than_days)
+    moved = {}
+    with archive.lock:
+        archive.remove_stale_files()
+        due = {}
+        for record in store.iter_records():
+            decided = decided_at(record)
+            if decided is not None and decided < cutoff:
+                due.setdefault(partition_of(record), []).append(record['application_id'])
+        if dry_run:
+            return {partition: len(ids) for partition, ids in sorted(due.items())}
+
+        archived_at = now.isoformat()
+        for partition, ids in sorted(due.items()):
+            records = [record for record in map(store.get, ids) if record is not None and decided_at(record)]
+            if not records:
+                continue
+            copies = []
+            for record in records:
+                # One past the active version, so record ETags change with the move
+                copies.append(dict(record, version=record_version(record) + 1, archived_at=archived_at))
+            archive.add(partition, copies)
+            removed = set(store.remove_many(records))
+            kept = [record['application_id'] for record in records if record['application_id'] not in removed]
+            if kept:
+                # Changed since they were read; they stay active until the next run
+                logger.warning(f"{len(kept)} claims in {partition} changed while being archived; kept active")
+                archive.discard(partition, kept)
+            moved[partition] = len(removed)
+            logger.info(f"Archived {len(removed)} decided claims submitted in {partition}")
+    return moved
+
+
+def main(argv=None):
+    from registration_store import get_registration_store
+
+    parser = argparse.ArgumentParser(description='Move long-decided FRA claims to the cold archive')
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='Archive claims approved or rejected more than this many days ago')
+    parser.add_argument('--dry-run', action='store_true', help='Only report how many claims are due')
+    args = parser.parse_args(argv)
+
+    store = get_registration_store()
+    if store._archive is None:
+        logger.error('The registration store has no cold archive attached')
+        return 1
+    report = archive_decided(store, store._archive, older_than_days=args.older_than_days, dry_run=args.dry_run)
+    json.dump({'dry_run': args.dry_run, 'partitions': report, 'total': sum(report.values())}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
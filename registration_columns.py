@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Columnar Registration Analytics
+An in-memory, column-oriented mirror of the registrations: NumPy arrays for
+numeric fields and dictionary-encoded codes for categorical ones, so reporting
+group-bys and aggregates run as vectorized array operations instead of walking
+nested dicts
+"""
+
+from datetime import date
+
+import numpy as np
+
+from registration_index import INDEXED_FIELDS, normalize_value
+
+
+def _personal(record):
+    return record.get('personal_details') or {}
+
+
+def _land(record):
+    return record.get('land_details') or {}
+
+
+# Numeric fields available to aggregates and bucketed group-bys
+NUMERIC_FIELDS = {
+    'land_area': lambda r: _land(r).get('land_area'),
+    'family_members': lambda r: _personal(r).get('family_members'),
+    # The registration form stores 0 when the year is left blank
+    'occupation_since': lambda r: _land(r).get('occupation_since') or None,
+    'approval_probability': lambda r: (r.get('prediction') or {}).get('probability'),
+}
+
+# count:<field> counts the registrations that give the field
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+
+# Day number stored for registrations without a parseable submission date
+NO_DATE = -1
+
+INITIAL_CAPACITY = 1024
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return number if np.isfinite(number) else np.nan
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return NO_DATE
+
+
+def parse_group_by(specs):
+    """
+    Parse group-by specifications
+    Args: specs (list): Categorical field names (status, district, ...) or
+        numeric fields with an optional bucket width, e.g. 'occupation_since:10'
+    Returns: list: (field, bucket width or None) pairs
+    """
+    group_by = []
+    for spec in specs:
+        field, _, width = spec.partition(':')
+        if field in INDEXED_FIELDS and not width:
+            group_by.append((field, None))
+        elif field in NUMERIC_FIELDS:
+            try:
+                width = float(width) if width else 1.0
+            except ValueError:
+                raise ValueError(f"Bucket width in '{spec}' must be a number")
+            if not width > 0:
+                raise ValueError(f"Bucket width in '{spec}' must be positive")
+            group_by.append((field, width))
+        else:
+            raise ValueError(f"Cannot group by '{spec}'. Choose from: "
+                             f"{', '.join(list(INDEXED_FIELDS) + list(NUMERIC_FIELDS))}")
+    return group_by
+
+
+def parse_metrics(specs):
+    """
+    Parse aggregate specifications
+    Args: specs (list): 'count' or '<aggregate>:<numeric field>', e.g. 'mean:land_area'
+            ('count:<field>' counts the rows where the field is set)
+    Returns: list: (aggregate, field or None) pairs
+    """
+    metrics = []
+    for spec in specs:
+        if spec == 'count':
+            metrics.append(('count', None))
+            continue
+        aggregate, _, field = spec.partition(':')
+        if aggregate not in AGGREGATES or field not in NUMERIC_FIELDS:
+            raise ValueError(f"Unsupported metric '{spec}'. Use count or <{'|'.join(AGGREGATES)}>:<field> "
+                             f"with a field from: {', '.join(NUMERIC_FIELDS)}")
+        metrics.append((aggregate, field))
+    return metrics
+
+
+def metric_name(aggregate, field):
+    """Key a metric is reported under, e.g. mean_land_area"""
+    return aggregate if field is None else f"{aggregate}_{field}"
+
+
+def _python(value):
+    """Convert a NumPy scalar to a JSON-friendly value, NaN becoming None"""
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class RegistrationColumns:
+    """
+    Column arrays with one row per registration
+
+    Attach to a store with RegistrationStore.subscribe. Each application keeps
+    its row for life, so an update overwrites the row in place; categorical
+    values are stored as int32 codes into a per-field dictionary (code 0 means
+    missing), numeric values as float64 with NaN for missing, and submission
+    dates as day numbers so date-range filters are array comparisons.
+
+    Columns saved with a snapshot (see pack) are read from the shared mapping
+    and come first; rows for applications changed since follow them, coded
+    with the same dictionaries.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all rows before a full rebuild"""
+        self._saved = None
+        self._saved_size = 0
+        self.rows = {}
+        self.size = 0
+        self._free = []
+        self.live = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.days = np.full(INITIAL_CAPACITY, NO_DATE, dtype=np.int32)
+        self.numeric = {field: np.full(INITIAL_CAPACITY, np.nan) for field in NUMERIC_FIELDS}
+        self.codes = {field: np.zeros(INITIAL_CAPACITY, dtype=np.int32) for field in INDEXED_FIELDS}
+        self.dictionary = {field: {None: 0} for field in INDEXED_FIELDS}
+        self.labels = {field: [None] for field in INDEXED_FIELDS}
+
+    def attach(self, saved):
+        """
+        Start from the columns saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+        self._saved_size = saved.count
+        for field in INDEXED_FIELDS:
+            keys, labels = saved.meta['keys'][field], saved.meta['labels'][field]
+            self.dictionary[field] = {key: code for code, key in enumerate(keys)}
+            self.labels[field] = list(labels)
+
+    def pack(self, rows):
+        """
+        Save the columns as arrays for a snapshot
+        Args: rows (dict): application_id -> row of every stored application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        ids = list(self.rows)
+        source = np.array([self.rows[application_id] for application_id in ids], dtype=np.intp)
+        target = np.array([rows[application_id] for application_id in ids], dtype=np.intp)
+
+        def place(array, fill):
+            packed = np.full(len(rows), fill, dtype=array.dtype)
+            packed[target] = array[source]
+            return packed
+
+        arrays = {'days': place(self.days, NO_DATE)}
+        arrays.update((f"numeric.{field}", place(array, np.nan)) for field, array in self.numeric.items())
+        arrays.update((f"codes.{field}", place(array, 0)) for field, array in self.codes.items())
+        meta = {
+            'keys': {field: sorted(dictionary, key=dictionary.get) for field, dictionary in self.dictionary.items()},
+            'labels': self.labels,
+        }
+        return meta, arrays
+
+    def row(self, application_id):
+        """Row of an application in the columns (and masks), or None"""
+        row = self.rows.get(application_id)
+        if row is not None:
+            return self._saved_size + row
+        return self._saved.row(application_id) if self._saved is not None else None
+
+    def saved_rows(self, mask):
+        """The part of a mask over the rows saved with the snapshot, in its row order, or None"""
+        return mask[:self._saved_size] if self._saved is not None else None
+
+    def _column(self, name, field=None):
+        """A column over every row, saved rows first"""
+        column = getattr(self, name)
+        column = (column if field is None else column[field])[:self.size]
+        if self._saved is None:
+            return column
+        if name == 'live':
+            saved = ~self._saved.replaced
+        else:
+            saved = self._saved.arrays[name if field is None else f"{name}.{field}"]
+        return np.concatenate([saved, column])
+
+    def _grow(self):
+        capacity = 2 * len(self.live)
+
+        def grow(array, fill):
+            grown = np.full(capacity, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.live = grow(self.live, False)
+        self.days = grow(self.days, NO_DATE)
+        self.numeric = {field: grow(array, np.nan) for field, array in self.numeric.items()}
+        self.codes = {field: grow(array, 0) for field, array in self.codes.items()}
+
+    def _code(self, field, record):
+        value = INDEXED_FIELDS[field](record)
+        key = normalize_value(value)
+        code = self.dictionary[field].get(key)
+        if code is None:
+            code = self.dictionary[field][key] = len(self.labels[field])
+            self.labels[field].append(str(value).strip())
+        return code
+
+    def apply(self, old, new):
+        """
+        Write an application's row after an insert or update
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        application_id = (new or old or {}).get('application_id')
+        if not application_id:
+            return
+        if self._saved is not None:
+            self._saved.replace(application_id)
+        row = self.rows.get(application_id)
+        if new is None:
+            if row is not None:
+                del self.rows[application_id]
+                self.live[row] = False
+                self._free.append(row)
+            return
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self.size == len(self.live):
+                    self._grow()
+                row = self.size
+                self.size += 1
+            self.rows[application_id] = row
+        self.live[row] = True
+        self.days[row] = _day(new.get('submission_date'))
+        for field, get in NUMERIC_FIELDS.items():
+            self.numeric[field][row] = _number(get(new))
+        for field in INDEXED_FIELDS:
+            self.codes[field][row] = self._code(field, new)
+
+    def mask(self, query=None, application_ids=None):
+        """
+        Select the rows passing a query's field and date filters
+        Args:
+            query (RegistrationQuery): Filters to apply; free text is not handled here
+            application_ids (iterable): Further restrict to these applications
+        Returns: numpy.ndarray: Boolean mask over every row (see row)
+        """
+        mask = self._column('live')
+        if self._saved is None:
+            mask = mask.copy()
+        if application_ids is not None:
+            application_ids = list(application_ids)
+            allowed = np.zeros(len(mask), dtype=bool)
+            rows = [self._saved_size + self.rows[i] for i in application_ids if i in self.rows]
+            allowed[np.array(rows, dtype=np.intp)] = True
+            if self._saved is not None:
+                saved_rows = self._saved.rows_of(application_ids)
+                allowed[saved_rows[saved_rows >= 0]] = True
+            mask &= allowed
+        if query is None:
+            return mask
+        for field, accepted in query._accepted.items():
+            codes = [self.dictionary[field][key] for key in accepted if key in self.dictionary[field]]
+            mask &= np.isin(self._column('codes', field), codes)
+        if query.date_from or query.date_before:
+            days = self._column('days')
+            if query.date_from:
+                mask &= days >= _day(query.date_from)
+            if query.date_before:
+                mask &= days < _day(query.date_before)
+        return mask
+
+    def aggregate(self, group_by, metrics, mask=None):
+        """
+        Group the selected rows and compute aggregates per group
+        Args:
+            group_by (list): (field, bucket width or None) pairs from parse_group_by
+            metrics (list): (aggregate, field) pairs from parse_metrics
+            mask (numpy.ndarray): Rows to include (default: every registration)
+        Returns: tuple: (list of groups, largest first, each {'key': {...}, <metric>: value},
+            number of registrations aggregated)
+        """
+        rows = np.flatnonzero(self.mask() if mask is None else mask)
+        if not len(rows):
+            return [], 0
+
+        # Factorize each group-by column, then combine them into one group number per row
+        group = np.zeros(len(rows), dtype=np.int64)
+        group_values = []
+        for field, width in group_by:
+            if width is None:
+                column = self._column('codes', field)[rows]
+            else:
+                column = np.floor(self._column('numeric', field)[rows] / width) * width
+            values, inverse = np.unique(column, return_inverse=True)
+            group = group * len(values) + inverse.reshape(-1)
+            group_values.append(values)
+        keys, group = np.unique(group, return_inverse=True)
+        group = group.reshape(-1)
+        counts = np.bincount(group, minlength=len(keys))
+
+        results = {'count': counts}
+        order = sorted_group = starts = None
+        for aggregate, field in metrics:
+            if field is None:
+                continue
+            values = self._column('numeric', field)[rows]
+            present = ~np.isnan(values)
+            if aggregate == 'count':
+                results[metric_name(aggregate, field)] = np.bincount(group, weights=present, minlength=len(keys))
+            elif aggregate in ('sum', 'mean'):
+                totals = np.bincount(group, weights=np.where(present, values, 0.0), minlength=len(keys))
+                if aggregate == 'mean':
+                    valid = np.bincount(group, weights=present, minlength=len(keys))
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        totals = np.where(valid > 0, totals / np.maximum(valid, 1), np.nan)
+                results[metric_name(aggregate, field)] = totals
+            else:
+                if order is None:
+                    order = np.argsort(group, kind='stable')
+                    sorted_group = group[order]
+                    starts = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+                # fmin/fmax skip NaN unless every value in the group is missing
+                reduce = np.fmin if aggregate == 'min' else np.fmax
+                results[metric_name(aggregate, field)] = reduce.reduceat(values[order], starts)
+
+        # Decode each combined group number back into its per-field labels
+        groups = []
+        for number in range(len(keys)):
+            remainder = int(keys[number])
+            key = {}
+            for (field, width), values in zip(reversed(group_by), reversed(group_values)):
+                remainder, index = divmod(remainder, len(values))
+                value = values[index]
+                key[field] = self.labels[field][value] if width is None else _python(value)
+            entry = {'key': {field: key[field] for field, _ in group_by}}
+            for aggregate, field in metrics:
+                name = metric_name(aggregate, field)
+                value = results['count' if field is None else name][number]
+                # Counts are whole numbers; every other metric stays a float, whatever its value
+                entry[name] = int(value) if aggregate == 'count' else _python(value)
+            entry.setdefault('count', int(counts[number]))
+            groups.append(entry)
+        groups.sort(key=lambda entry: -entry['count'])
+        return groups, len(rows)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Storage for Claim Documents
+Uploaded Aadhaar scans, tribal certificates, occupation proofs and photographs
+are stored once per distinct content under their SHA-256, fanned out into
+hash-prefix subdirectories, and registrations keep references to the content
+instead of private copies
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+
+from werkzeug.utils import secure_filename
+
+from registration_store import _fsync_directory
+from registration_uploads import UploadPolicy, UploadSpool
+
+logger = logging.getLogger(__name__)
+
+# Document storage configuration (overridable through the environment)
+DOCUMENT_FOLDER = os.environ.get('VANMITRA_DOCUMENT_DIR', os.path.join('uploads', 'documents'))
+
+DOCUMENT_FIELDS = ('aadhaarDoc', 'tribalCert', 'occupationProof', 'photograph', 'additionalDocs')
+DOCUMENT_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+MAX_DOCUMENT_BYTES = int(os.environ.get('VANMITRA_MAX_DOCUMENT_BYTES', 10 * 1024 * 1024))
+
+# Two levels of two hex digits: 65,536 leaf directories, ~15 files each at a million documents
+FANOUT_LEVELS = 2
+FANOUT_WIDTH = 2
+CHUNK_SIZE = 64 * 1024
+TEMP_DIRNAME = 'tmp'
+STALE_TEMP_SECONDS = 3600
+
+
+def allowed_document(filename):
+    """Check that an uploaded file name has an accepted document extension"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in DOCUMENT_EXTENSIONS
+
+
+class DocumentWriter:
+    """
+    One document being written into the store
+
+    Chunks are hashed and written to a temporary file in the same pass; commit()
+    then moves the file to its content address, or discards it when identical
+    content is already stored.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._temp_path = os.path.join(store.temp_dir, uuid.uuid4().hex)
+        self._file = open(self._temp_path, 'wb')
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """
+        Make the document durable at its content address
+        Returns: tuple: (sha256 hex digest, size in bytes, whether the content was new)
+        """
+        digest = self._hash.hexdigest()
+        path = self.store.path_for(digest)
+        if os.path.exists(path):
+            self.abort()
+            return digest, self.size, False
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Concurrent writers of the same content race harmlessly: both files hold identical bytes
+            os.replace(self._temp_path, path)
+        except BaseException:
+            self.abort()
+            raise
+        _fsync_directory(directory)
+        return digest, self.size, True
+
+    def abort(self):
+        """Discard a partially written document"""
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class DocumentStore:
+    """
+    Files keyed by the SHA-256 of their content, e.g. ab/cd/abcd1234...
+
+    Identical uploads (a family re-submitting the same scan, or the same
+    certificate attached to several claims) occupy disk space once. Objects are
+    immutable; a reference is just the digest, so registrations stay small.
+    """
+
+    def __init__(self, root):
+        """
+        Args: root (str): Folder holding the hash-prefix directories
+        """
+        self.root = root
+        self.temp_dir = os.path.join(root, TEMP_DIRNAME)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._remove_stale_temp_files()
+
+    def _remove_stale_temp_files(self):
+        """Delete uploads abandoned by a crashed worker; live ones are younger than the cutoff"""
+        cutoff = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.temp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def path_for(self, digest):
+        """Return the file path of a stored document"""
+        digest = digest.lower()
+        if len(digest) != 64 or any(c not in '0123456789abcdef' for c in digest):
+            raise ValueError(f"Invalid document digest '{digest}'")
+        parts = [digest[i * FANOUT_WIDTH:(i + 1) * FANOUT_WIDTH] for i in range(FANOUT_LEVELS)]
+        return os.path.join(self.root, *parts, digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def writer(self):
+        """Start writing a document chunk by chunk; see DocumentWriter"""
+        return DocumentWriter(self)
+
+    def put_stream(self, stream):
+        """
+        Store the contents of a readable binary stream in one pass
+        Returns: tuple: (sha256 hex digest, size in bytes, whether the content was new)
+        """
+        writer = self.writer()
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def put_spool(self, spool):
+        """
+        Store an upload that was hashed while it streamed in (see UploadSpool)
+        Spools live in this store's temp folder, so new content is moved into place by rename
+        Returns: tuple: (sha256 hex digest, size in bytes, whether the content was new)
+        """
+        digest = spool.sha256
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            spool.close()
+            return digest, spool.size, False
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        spool.move_to(path)
+        _fsync_directory(directory)
+        return digest, spool.size, True
+
+    def open(self, digest):
+        """Open a stored document for reading"""
+        return open(self.path_for(digest), 'rb')
+
+
+def document_reference(digest, size, filename, content_type=None):
+    """
+    Reference to stored content as kept in registration_data['documents']
+    Returns: dict: sha256, size and the uploader's (sanitized) file name
+    """
+    reference = {'sha256': digest, 'size': size, 'filename': secure_filename(filename or '') or digest}
+    if content_type:
+        reference['content_type'] = content_type
+    return reference
+
+
+def store_uploaded_documents(document_store, files, allowed=allowed_document):
+    """
+    Store every claim document in a request's uploaded files
+    Args:
+        document_store (DocumentStore): Destination store
+        files: Mapping of form field -> uploaded files, such as flask.request.files
+        allowed (callable): File name filter
+    Returns: dict: Form field -> reference, or a list of references for several files
+    """
+    documents = {}
+    for field_name in DOCUMENT_FIELDS:
+        references = []
+        for upload in files.getlist(field_name):
+            if upload and upload.filename and allowed(upload.filename):
+                if isinstance(upload.stream, UploadSpool):
+                    digest, size, created = document_store.put_spool(upload.stream)
+                else:
+                    digest, size, created = document_store.put_stream(upload.stream)
+                if not created:
+                    logger.info(f"Document {digest[:12]} already stored; referencing the existing copy")
+                references.append(document_reference(digest, size, upload.filename, upload.mimetype))
+        if references:
+            documents[field_name] = references if len(references) > 1 else references[0]
+    return documents
+
+
+def document_upload_policy(allowed=allowed_document):
+    """Streaming upload policy for claim documents: spooled in the store's temp folder"""
+    return UploadPolicy(allowed, MAX_DOCUMENT_BYTES, lambda: get_document_store().temp_dir)
+
+
+_default_document_store = None
+_default_document_store_lock = threading.Lock()
+
+
+def get_document_store():
+    """Return the shared document store for the configured folder"""
+    global _default_document_store
+    with _default_document_store_lock:
+        if _default_document_store is None:
+            _default_document_store = DocumentStore(DOCUMENT_FOLDER)
+        return _default_document_store
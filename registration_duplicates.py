@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Duplicate Claim Detection
+Keyed hashes of each claim's Aadhaar number and land parcel (state, district,
+village and survey number), kept by the registration store so a submission can
+be checked against every stored claim with one dictionary lookup per key.
+Only HMAC-SHA256 digests are indexed; raw Aadhaar numbers never leave the
+registration records.
+"""
+
+import os
+import re
+import hmac
+import hashlib
+import secrets
+import logging
+
+import numpy as np
+
+from registration_index import normalize_value
+
+logger = logging.getLogger(__name__)
+
+# Duplicate handling configuration (overridable through the environment)
+# flag: store the claim and record the matches, reject: refuse it with 409, off: no check
+DUPLICATE_POLICY = os.environ.get('VANMITRA_DUPLICATE_POLICY', 'flag').lower()
+KEY_FILENAME = 'duplicate_index.key'
+KEY_BYTES = 32
+# Truncated digests: 2^-64 odds of two different values sharing a key per pair
+DIGEST_BYTES = 16
+
+AADHAAR = 'aadhaar'
+LAND_PARCEL = 'land_parcel'
+DUPLICATE_FIELDS = (AADHAAR, LAND_PARCEL)
+
+# Claims in these statuses may be filed again without counting as duplicates
+INACTIVE_STATUSES = ('rejected',)
+
+_WHITESPACE = re.compile(r'\s+')
+_SURVEY_SEPARATORS = re.compile(r'\s*[-/\\.,]\s*')
+
+
+def load_duplicate_key(data_folder):
+    """
+    Return the secret key for duplicate-claim digests
+    VANMITRA_DUPLICATE_KEY takes precedence; otherwise a random key is created
+    once in the data folder and shared by every worker from then on.
+    Args: data_folder (str): Folder holding registration data
+    Returns: bytes
+    """
+    configured = os.environ.get('VANMITRA_DUPLICATE_KEY')
+    if configured:
+        return configured.encode('utf-8')
+    path = os.path.join(data_folder, KEY_FILENAME)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(data_folder, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(secrets.token_bytes(KEY_BYTES))
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        # link() fails if another worker created the key first; theirs wins
+        os.link(temp_path, path)
+        logger.info(f"Created duplicate-claim key {path}")
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp_path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def key_fingerprint(key):
+    """Identify a key without revealing it, to notice persisted digests made with another key"""
+    return hmac.new(key, b'key-id', hashlib.sha256).hexdigest()[:16]
+
+
+def normalize_aadhaar(value):
+    """Return the 12 Aadhaar digits without spaces or dashes, or None if it is not an Aadhaar number"""
+    if value is None:
+        return None
+    digits = re.sub(r'[\s-]', '', str(value))
+    return digits if len(digits) == 12 and digits.isdigit() else None
+
+
+def normalize_survey_number(value):
+    """
+    Canonical survey number: case, spacing, separators ('12-3', '12 / 3') and
+    leading zeros ('012/3') do not matter
+    """
+    value = normalize_value(value)
+    if value is None:
+        return None
+    parts = _SURVEY_SEPARATORS.split(value)
+    parts = [(part.lstrip('0') or '0') if part.isdigit() else _WHITESPACE.sub('', part) for part in parts]
+    return '/'.join(part for part in parts if part) or None
+
+
+def land_parcel(record):
+    """
+    Normalized (state, district, village, survey number) of a claim
+    Returns: tuple or None: None unless all four are given
+    """
+    address = (record.get('personal_details') or {}).get('address') or {}
+    values = [normalize_value(address.get(field)) for field in ('state', 'district', 'village')]
+    values = [_WHITESPACE.sub(' ', value) if value else None for value in values]
+    values.append(normalize_survey_number((record.get('land_details') or {}).get('survey_number')))
+    return tuple(values) if all(values) else None
+
+
+def claim_keys(record, key):
+    """
+    Keyed digests identifying a claim's applicant and land parcel
+    Args:
+        record (dict): Registration data
+        key (bytes): Secret from load_duplicate_key
+    Returns: dict: Field (AADHAAR, LAND_PARCEL) -> digest bytes, for the fields the claim has
+    """
+    keys = {}
+    aadhaar = normalize_aadhaar((record.get('personal_details') or {}).get('aadhaar'))
+    if aadhaar:
+        keys[AADHAAR] = _digest(key, AADHAAR, aadhaar)
+    parcel = land_parcel(record)
+    if parcel:
+        keys[LAND_PARCEL] = _digest(key, LAND_PARCEL, '\x1f'.join(parcel))
+    return keys
+
+
+def _digest(key, field, value):
+    # The field name separates the two key spaces
+    return hmac.new(key, f"{field}\x00{value}".encode('utf-8'), hashlib.sha256).digest()[:DIGEST_BYTES]
+
+
+def is_active(record):
+    """Whether a claim blocks others with the same Aadhaar number or land parcel"""
+    return record.get('status') not in INACTIVE_STATUSES
+
+
+class DuplicateIndex:
+    """
+    Digest -> application_id postings for the Aadhaar number and land parcel
+
+    Attach to a store with RegistrationStore.subscribe. Most digests belong to a
+    single claim, so postings hold a plain application_id and only grow into a
+    set on the first duplicate. Postings saved with a snapshot (see pack) are
+    sorted digest and row arrays read from the shared mapping; only claims
+    changed since are held here.
+    """
+
+    def __init__(self, key):
+        """
+        Args: key (bytes): Secret from load_duplicate_key
+        """
+        self.key = key
+        self.reset()
+
+    def reset(self):
+        """Drop all postings before a full rebuild"""
+        self.postings = {field: {} for field in DUPLICATE_FIELDS}
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the postings saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned with the same key, as mapped from the snapshot
+        Raises: ValueError: They were made with another key
+        """
+        if saved.meta['key'] != key_fingerprint(self.key):
+            raise ValueError('Saved duplicate digests were made with another key')
+        self.reset()
+        self._saved = saved
+
+    def pack(self, rows):
+        """
+        Save the postings as arrays for a snapshot, with the key's fingerprint
+        (never the key) so a reader can tell whether the digests still apply
+        Args: rows (dict): application_id -> row of every stored application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        arrays = {}
+        for field, postings in self.postings.items():
+            pairs = sorted((digest, rows[application_id]) for digest, current in postings.items()
+                           for application_id in (current if isinstance(current, set) else (current,)))
+            arrays[f"digests.{field}"] = np.array([digest for digest, _ in pairs], dtype=f"S{DIGEST_BYTES}")
+            arrays[f"rows.{field}"] = np.array([row for _, row in pairs], dtype=np.int32)
+        return {'key': key_fingerprint(self.key)}, arrays
+
+    def apply(self, old, new):
+        """
+        Move a claim's postings from its old digests to its new ones
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        if self._saved is not None:
+            self._saved.replace((new or old or {}).get('application_id') or '')
+        if old is not None and is_active(old):
+            for field, digest in claim_keys(old, self.key).items():
+                self._discard(field, digest, old.get('application_id'))
+        if new is not None and new.get('application_id') and is_active(new):
+            for field, digest in claim_keys(new, self.key).items():
+                self._add(field, digest, new['application_id'])
+
+    def _add(self, field, digest, application_id):
+        postings = self.postings[field]
+        current = postings.get(digest)
+        if current is None:
+            postings[digest] = application_id
+        elif isinstance(current, set):
+            current.add(application_id)
+        elif current != application_id:
+            postings[digest] = {current, application_id}
+
+    def _discard(self, field, digest, application_id):
+        postings = self.postings[field]
+        current = postings.get(digest)
+        if current == application_id:
+            del postings[digest]
+        elif isinstance(current, set):
+            current.discard(application_id)
+            if len(current) == 1:
+                postings[digest] = current.pop()
+
+    def find(self, record):
+        """
+        Stored claims sharing a digest with a registration
+        Args: record (dict): Registration data, stored or not
+        Returns: dict: Field -> sorted application IDs of other active claims (matching fields only)
+        """
+        matches = {}
+        for field, digest in claim_keys(record, self.key).items():
+            current = self.postings[field].get(digest)
+            if isinstance(current, set):
+                ids = set(current)
+            else:
+                ids = {current} if current is not None else set()
+            if self._saved is not None:
+                ids.update(self._saved_matches(field, digest))
+            ids.discard(record.get('application_id'))
+            if ids:
+                matches[field] = sorted(ids)
+        return matches
+
+    def _saved_matches(self, field, digest):
+        digests = self._saved.arrays[f"digests.{field}"]
+        start, end = np.searchsorted(digests, digest, 'left'), np.searchsorted(digests, digest, 'right')
+        return self._saved.ids_of(self._saved.current(self._saved.arrays[f"rows.{field}"][start:end]))
+
+
+def merge_duplicates(*found):
+    """
+    Combine the matches of several indexes (stores, shards, the archive or a batch)
+    Args: found: Results of DuplicateIndex.find or RegistrationStore.duplicates
+    Returns: dict: Field -> sorted application IDs matched in any of them
+    """
+    merged = {}
+    for matches in found:
+        for field, ids in matches.items():
+            merged.setdefault(field, set()).update(ids)
+    return {field: sorted(merged[field]) for field in DUPLICATE_FIELDS if field in merged}
+
+
+class DuplicateClaimError(ValueError):
+    """A submission matches an existing claim and the policy is to reject it"""
+
+    def __init__(self, matches):
+        self.matches = matches
+        super().__init__(f"A claim with the same {' and '.join(describe_fields(matches))} is already registered")
+
+
+def describe_fields(matches):
+    """Human-readable names of the matching fields"""
+    labels = {AADHAAR: 'Aadhaar number', LAND_PARCEL: 'land parcel (village and survey number)'}
+    return [labels[field] for field in DUPLICATE_FIELDS if field in matches]
+
+
+def check_duplicates(store, record, policy=None, batch=None):
+    """
+    Apply the duplicate policy to a new claim before it is saved
+    With the 'flag' policy, matches are recorded in record['duplicate_of'] for
+    reviewers; the applicant is only told which fields matched.
+    Args:
+        store (RegistrationStore): Store holding the existing claims
+        record (dict): Registration data about to be submitted
+        policy (str): 'flag', 'reject' or 'off' (default: VANMITRA_DUPLICATE_POLICY)
+        batch (DuplicateIndex): Claims submitted together with this one but not saved yet
+    Returns: dict: Field -> application IDs of matching claims (empty when none)
+    Raises: DuplicateClaimError: The claim matches and the policy is 'reject'
+    """
+    policy = policy or DUPLICATE_POLICY
+    if policy == 'off':
+        return {}
+    matches = store.duplicates(record)
+    if batch is not None:
+        matches = merge_duplicates(matches, batch.find(record))
+    if matches and policy == 'reject':
+        raise DuplicateClaimError(matches)
+    if matches:
+        record['duplicate_of'] = matches
+    return matches
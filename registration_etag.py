@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Conditional GET Support for Registration Endpoints
+Strong ETags derived from record and store versions, so polling clients get
+a bodiless 304 Not Modified whenever nothing has changed since their last fetch
+"""
+
+import json
+import hashlib
+
+from flask import request, current_app
+
+from registration_stats import record_version
+
+
+def record_etag(record):
+    """
+    Entity tag for a single registration
+    Returns: str: Unquoted tag that changes whenever the record is saved
+    """
+    return f"{record.get('application_id')}-v{record_version(record)}"
+
+
+def registry_etag(store_version, args):
+    """
+    Entity tag for a listing derived from the whole store
+    Args:
+        store_version (int): RegistrationStore.version() read before building the response
+        args: Request query-string arguments that shape the response
+    Returns: str: Unquoted tag that changes with any write or a different query
+    """
+    items = sorted(args.items(multi=True)) if hasattr(args, 'getlist') else sorted(args.items())
+    digest = hashlib.sha1(json.dumps(items).encode('utf-8')).hexdigest()[:16]
+    return f"r{store_version}-{digest}"
+
+
+def conditional_response(etag, build):
+    """
+    Answer with 304 when the client already holds the current representation
+    Args:
+        etag (str): Unquoted strong entity tag of the current representation
+        build (callable): Produces the full response; only called when it is needed
+    Returns: flask.Response: 304 without a body, or the built response, with the ETag set
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(build())
+    response.set_etag(etag)
+    # Clients may keep the response but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
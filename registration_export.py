@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Streaming Registration Export
+Generators that turn a stream of registrations into NDJSON, CSV or a JSON
+array chunk by chunk, so exports never hold the full dataset in memory
+"""
+
+import io
+import csv
+import json
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+# Records serialized per yielded chunk; keeps chunk overhead low without buffering much
+RECORDS_PER_CHUNK = 100
+
+
+def _personal(record):
+    return record.get('personal_details') or {}
+
+
+def _address(record):
+    return _personal(record).get('address') or {}
+
+
+def _land(record):
+    return record.get('land_details') or {}
+
+
+def _prediction(record):
+    return record.get('prediction') or {}
+
+
+# Flattened CSV layout: nested personal_details/land_details become columns
+CSV_COLUMNS = [
+    ('application_id', lambda r: r.get('application_id')),
+    ('submission_date', lambda r: r.get('submission_date')),
+    ('status', lambda r: r.get('status')),
+    ('applicant_name', lambda r: _personal(r).get('applicant_name')),
+    ('father_name', lambda r: _personal(r).get('father_name')),
+    ('phone', lambda r: _personal(r).get('phone')),
+    ('tribe', lambda r: _personal(r).get('tribe')),
+    ('family_members', lambda r: _personal(r).get('family_members')),
+    ('village', lambda r: _address(r).get('village')),
+    ('tehsil', lambda r: _address(r).get('tehsil')),
+    ('district', lambda r: _address(r).get('district')),
+    ('state', lambda r: _address(r).get('state')),
+    ('claim_type', lambda r: _land(r).get('claim_type')),
+    ('land_area', lambda r: _land(r).get('land_area')),
+    ('occupation_since', lambda r: _land(r).get('occupation_since')),
+    ('forest_type', lambda r: _land(r).get('forest_type')),
+    ('survey_number', lambda r: _land(r).get('survey_number')),
+    ('boundaries', lambda r: _land(r).get('boundaries')),
+    ('latitude', lambda r: (_land(r).get('location') or {}).get('latitude')),
+    ('longitude', lambda r: (_land(r).get('location') or {}).get('longitude')),
+    ('parcel_geojson', lambda r: _dumps(_land(r)['parcel']) if _land(r).get('parcel') else None),
+    ('parcel_area', lambda r: _land(r).get('parcel_area')),
+    ('land_use', lambda r: ';'.join(_land(r).get('land_use') or [])),
+    ('approval_probability', lambda r: _prediction(r).get('probability')),
+    ('assessment', lambda r: _prediction(r).get('assessment')),
+    ('remarks', lambda r: r.get('remarks')),
+]
+
+
+def _dumps(record):
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+
+def iter_ndjson(records):
+    """Yield registrations as newline-delimited JSON"""
+    lines = []
+    for record in records:
+        lines.append(_dumps(record))
+        if len(lines) >= RECORDS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_csv(records):
+    """Yield registrations as CSV rows with nested details flattened into columns"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in CSV_COLUMNS])
+    rows = 0
+    for record in records:
+        writer.writerow(['' if value is None else value for value in (get(record) for _, get in CSV_COLUMNS)])
+        rows += 1
+        if rows >= RECORDS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_json_array(records):
+    """Yield registrations as a single JSON array, one chunk at a time"""
+    yield '['
+    separator = ''
+    parts = []
+    for record in records:
+        parts.append(separator + _dumps(record))
+        separator = ','
+        if len(parts) >= RECORDS_PER_CHUNK:
+            yield ''.join(parts)
+            parts = []
+    if parts:
+        yield ''.join(parts)
+    yield ']\n'
+
+
+EXPORTERS = {
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+    'json': iter_json_array,
+}
+
+
+def stream_export(records, export_format):
+    """
+    Serialize registrations in the requested export format
+    Args:
+        records: Iterable of registrations (typically a store iterator)
+        export_format (str): 'ndjson', 'csv' or 'json'
+    Returns: tuple: (generator of text chunks, mimetype)
+    """
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unsupported export format '{export_format}'. "
+                         f"Choose from: {', '.join(sorted(EXPORTERS))}")
+    return EXPORTERS[export_format](records), EXPORT_FORMATS[export_format]
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Registration Change Feed
+Pushes registration inserts and status changes to admin dashboards as
+Server-Sent Events. Each worker keeps a short buffer of recent changes, keyed
+by the store-wide version they produced, so a reconnecting dashboard resumes
+from its Last-Event-ID instead of reloading the whole list.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+from registration_stats import record_version
+
+logger = logging.getLogger(__name__)
+
+# Feed configuration (overridable through the environment)
+FEED_BUFFER_SIZE = int(os.environ.get('VANMITRA_FEED_BUFFER', 1000))
+POLL_INTERVAL_SECONDS = float(os.environ.get('VANMITRA_FEED_POLL_MS', 500)) / 1000.0
+# Request threads per gunicorn worker; the Procfile passes the same setting to --threads
+WORKER_THREADS = int(os.environ.get('VANMITRA_THREADS', 16))
+# Threads per worker never given to streams, so submissions and listings keep being served
+RESERVED_THREADS = 4
+# Live streams per worker: half its threads by default, and always below the thread count
+MAX_STREAMS = max(0, min(int(os.environ.get('VANMITRA_MAX_STREAMS', WORKER_THREADS // 2)),
+                         WORKER_THREADS - RESERVED_THREADS))
+
+# Comment lines keep proxies from closing idle connections
+KEEPALIVE_SECONDS = 15
+# Streams end after this long and the browser reconnects with its Last-Event-ID,
+# so worker threads are recycled
+STREAM_MAX_SECONDS = 300
+RETRY_MILLISECONDS = 2000
+
+
+def change_event(old, new):
+    """
+    Describe one registration change as a feed event
+    Args:
+        old (dict): Previous version of the registration, or None on insert
+        new (dict): New version of the registration, or None on removal
+    Returns: tuple: (event type, payload dict)
+    """
+    if new is None:
+        return 'remove', {'application_id': old.get('application_id')}
+    if old is None:
+        return 'insert', {'registration': new}
+    if old.get('status') != new.get('status'):
+        history = new.get('status_history') or [{}]
+        return 'status', {
+            'application_id': new.get('application_id'),
+            'status': new.get('status'),
+            'previous_status': old.get('status'),
+            'version': new.get('version'),
+            'event': history[-1],
+        }
+    return 'update', {'registration': new}
+
+
+def format_event(event_type, data, event_id=None):
+    """Encode one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class ChangeFeed:
+    """
+    Recent registration changes of one worker, for Server-Sent Events streams
+
+    Attach with ChangeFeed(store). The feed is a store listener that turns each
+    change into an encoded event whose id is the store version after the
+    change; versions are the same in every worker, so Last-Event-ID works
+    whichever worker a dashboard reconnects to. While any stream is open a
+    background thread asks the store to pick up other workers' writes every
+    poll interval; with no streams open nothing runs.
+
+    When the store rebuilds its derived views, or changes cannot be followed
+    one by one (SQLite databases written by other workers), the feed emits a
+    'reset' event and the dashboard reloads.
+    """
+
+    def __init__(self, store, buffer_size=FEED_BUFFER_SIZE, poll_interval=POLL_INTERVAL_SECONDS):
+        """
+        Args:
+            store (RegistrationStore): Store to follow
+            buffer_size (int): Events kept for reconnecting streams
+            poll_interval (float): Seconds between checks for other workers' writes
+        """
+        self.store = store
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        # (version, encoded message) pairs; the buffer covers every change after self._floor
+        self._events = deque()
+        self._floor = None
+        # None while the store is replaying into its listeners
+        self.version = None
+        self._streams = 0
+        self._poller = None
+        with store._mutex:
+            store.subscribe(self, replay=False)
+            self._restart(store.version())
+
+    # Store listener protocol
+
+    def reset(self):
+        """The store is rebuilding its views; ignore the replay until the next sync"""
+        with self._condition:
+            self.version = None
+
+    def apply(self, old, new):
+        with self._condition:
+            if self.version is None:
+                return
+            self.version += record_version(new) - record_version(old)
+            event_type, data = change_event(old, new)
+            self._events.append((self.version, format_event(event_type, data, self.version)))
+            if len(self._events) > self.buffer_size:
+                self._floor = self._events.popleft()[0]
+            self._condition.notify_all()
+
+    def _restart(self, version):
+        """Start over at a store version; earlier cursors get a reset event"""
+        with self._condition:
+            self.version = version
+            self._floor = version
+            self._events.clear()
+            self._condition.notify_all()
+
+    def sync(self):
+        """Pick up changes made by other workers, restarting if they could not be followed"""
+        with self.store._mutex:
+            version = self.store.version()
+            with self._condition:
+                if version != self.version:
+                    self._restart(version)
+                else:
+                    # Wake streams so they notice a restart made by reset()
+                    self._condition.notify_all()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._condition:
+                if not self._streams:
+                    self._poller = None
+                    return
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Change feed poll failed: {str(e)}")
+
+    def _events_after(self, cursor):
+        """
+        Encoded events after a cursor, or None when the buffer no longer reaches back to it
+        Must be called while holding the condition
+        """
+        if cursor is None or cursor < self._floor or cursor > self.version:
+            return None
+        return [message for version, message in self._events if version > cursor]
+
+    def stream(self, last_event_id=None, max_seconds=STREAM_MAX_SECONDS):
+        """
+        Open the Server-Sent Events stream for one client
+        The stream takes one of this worker's MAX_STREAMS slots as soon as it is
+        opened, so a burst of dashboards cannot get past the limit before their
+        streams start, and gives it back when the server closes the response.
+        Args:
+            last_event_id (str): Last-Event-ID sent by a reconnecting browser
+            max_seconds (float): Seconds before the stream ends and the browser reconnects
+        Returns: iterable of str: Encoded messages: 'ready' with the current
+            version for a new client, or 'reset' when a returning client must
+            reload; then 'insert', 'status' and 'update' events, a 'statistics'
+            event after each batch, and keep-alive comments while idle. None
+            when every slot is taken.
+        """
+        with self._condition:
+            if self._streams >= MAX_STREAMS:
+                return None
+            self._streams += 1
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='registration-change-feed', daemon=True)
+                self._poller.start()
+        return _Stream(self, self._messages(last_event_id, max_seconds))
+
+    def _release(self):
+        with self._condition:
+            self._streams -= 1
+
+    def _messages(self, last_event_id, max_seconds):
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        try:
+            cursor = int(last_event_id) if last_event_id else None
+        except ValueError:
+            cursor = None
+        self.sync()
+        if cursor is None:
+            with self._condition:
+                cursor = self.version
+            yield format_event('ready', {'version': cursor}, cursor)
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            with self._condition:
+                if self.version is not None and cursor == self.version:
+                    self._condition.wait(min(KEEPALIVE_SECONDS, max(deadline - time.monotonic(), 0)))
+                stale = self.version is None
+                if not stale:
+                    messages = self._events_after(cursor)
+                    if messages is None:
+                        messages = [format_event('reset', {'version': self.version}, self.version)]
+                    cursor = self.version
+            if stale:
+                # The store rebuilt its views; catch up before sending anything
+                self.sync()
+            elif messages:
+                yield ''.join(messages) + format_event('statistics', self.store.statistics())
+            else:
+                yield ': keep-alive\n\n'
+
+
+class _Stream:
+    """One client's messages; closing it (as the WSGI server does) frees its stream slot"""
+
+    def __init__(self, feed, messages):
+        self._feed = feed
+        self._messages = messages
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._messages)
+
+    def close(self):
+        self._messages.close()
+        if self._open:
+            self._open = False
+            self._feed._release()
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_change_feed(store):
+    """Return this worker process's change feed for a store"""
+    key = (id(store), os.getpid())
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = ChangeFeed(store)
+        return feed
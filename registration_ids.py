@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Time-Sortable Application IDs
+FRA application IDs that sort in the order they were issued: the FRA prefix and
+submission date staff already read, then the millisecond of the day and a
+counter, ULID-style, in Crockford base32. IDs from one process are strictly
+increasing, so registrations append in ID order and an ID range is a time range.
+
+Format: FRA + YYYYMMDD + 6 characters of time + 6 characters of randomness,
+e.g. FRA20241001 0F8Q2A 7KX3MZ (without the spaces)
+"""
+
+import os
+import secrets
+import threading
+from datetime import datetime
+
+ID_PREFIX = 'FRA'
+
+# Crockford's base32: no I, L, O or U, and digits sort before letters
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+TIME_CHARS = 6
+RANDOM_CHARS = 6
+RANDOM_BITS = 5 * RANDOM_CHARS
+
+
+def _encode(number, width):
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class ApplicationIdGenerator:
+    """
+    Monotonic, collision-resistant application ID source
+
+    Each millisecond starts from a fresh random value in the lower half of the
+    random range (30 bits), so IDs minted by different workers in the same
+    millisecond are very unlikely to meet. Further IDs in the same
+    millisecond, or while the clock steps backwards, increment the previous
+    one instead, so a process never issues the same ID twice or an ID smaller
+    than the last.
+    """
+
+    def __init__(self, prefix=ID_PREFIX, clock=datetime.now):
+        """
+        Args:
+            prefix (str): Leading letters of every ID
+            clock (callable): Returns the current local datetime
+        """
+        self.prefix = prefix
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last = None
+        self._pid = None
+
+    def new_id(self):
+        """Return the next application ID"""
+        now = self.clock()
+        day = now.strftime('%Y%m%d')
+        ms = ((now.hour * 60 + now.minute) * 60 + now.second) * 1000 + now.microsecond // 1000
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not continue its parent's sequence
+                self._last = None
+                self._pid = os.getpid()
+            if self._last is not None and (day, ms) <= self._last[:2]:
+                day, ms, random = self._last
+                random += 1
+                if random >> RANDOM_BITS:
+                    # Counter exhausted: borrow the next millisecond
+                    ms += 1
+                    random = secrets.randbits(RANDOM_BITS - 1)
+            else:
+                random = secrets.randbits(RANDOM_BITS - 1)
+            self._last = (day, ms, random)
+        return f"{self.prefix}{day}{_encode(ms, TIME_CHARS)}{_encode(random, RANDOM_CHARS)}"
+
+
+_default_generator = ApplicationIdGenerator()
+
+
+def new_application_id():
+    """Return a new time-sortable FRA application ID"""
+    return _default_generator.new_id()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Bulk Registration Import
+Validates and scores spreadsheets of land claims (CSV or NDJSON) in a process
+pool, runs the registration form's duplicate and parcel overlap checks on
+each row, and commits every accepted row in a single batched write, returning
+a per-row report instead of failing the whole file on one bad row
+
+Usage: python registration_import.py claims.csv [--format csv|ndjson] [--workers N] [--dry-run]
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import re
+import math
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from registration_export import CSV_COLUMNS
+from registration_scoring import calculate_fra_approval_probability
+from registration_ids import new_application_id
+from registration_map import parse_location
+from registration_parcels import parse_parcel, parcel_area, check_new_claims
+from registration_duplicates import normalize_aadhaar
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Process pool sizing (overridable through the environment)
+IMPORT_WORKERS = int(os.environ.get('VANMITRA_IMPORT_WORKERS', 0)) or os.cpu_count() or 1
+# Rows sent to a pool worker per task; keeps pickling overhead per row small
+ROWS_PER_CHUNK = 500
+# Files smaller than this are validated in-process; starting a pool would cost more
+MIN_POOL_ROWS = 2000
+
+MAX_LAND_AREA = 100.0
+EARLIEST_OCCUPATION_YEAR = 1900
+
+_PHONE_SEPARATORS = re.compile(r'[\s().-]')
+# Country code (+91 / 0091 / 91) or trunk prefix (0) in front of a 10-digit Indian mobile number
+_PHONE_PREFIX = re.compile(r'^(?:\+91|0091|91|0)(?=\d{10}$)')
+
+
+def parse_phone(value):
+    """
+    Normalize a mobile number as typed on the form or found in an export
+    Spaces, dashes, brackets and a +91, 91 or 0 prefix are dropped
+    Args: value (str): Phone number, possibly blank
+    Returns: str or None: The 10 digits, None when blank
+    Raises: ValueError: Anything other than a 10-digit number
+    """
+    value = _PHONE_SEPARATORS.sub('', str(value or ''))
+    if not value:
+        return None
+    value = _PHONE_PREFIX.sub('', value)
+    if len(value) != 10 or not value.isdigit():
+        raise ValueError('Phone number must be a 10-digit mobile number')
+    return value
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(row, field, cast, errors, required=False, minimum=None, maximum=None):
+    """Parse a numeric column, recording a readable error instead of raising"""
+    value = _text(row, field)
+    if value is None:
+        if required:
+            errors.append(f"'{field}' is required")
+        return None
+    try:
+        number = float(value)
+        if not math.isfinite(number) or (cast is int and not number.is_integer()):
+            raise ValueError(value)
+        number = cast(number)
+    except ValueError:
+        errors.append(f"'{field}' must be a {'whole number' if cast is int else 'number'}")
+        return None
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        errors.append(f"'{field}' must be between {minimum} and {maximum}")
+        return None
+    return number
+
+
+def _aadhaar(row, errors):
+    value = _text(row, 'aadhaar')
+    if value is None:
+        return None
+    digits = normalize_aadhaar(value)
+    if digits is None:
+        errors.append("'aadhaar' must be 12 digits")
+    return digits
+
+
+def flatten_row(data):
+    """
+    Accept either a flat row (CSV columns) or a nested registration as exported
+    Returns: dict: Column name -> value, using the export CSV column names
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Row must be a JSON object')
+    if 'personal_details' not in data and 'land_details' not in data:
+        return data
+    row = {name: get(data) for name, get in CSV_COLUMNS}
+    row['aadhaar'] = (data.get('personal_details') or {}).get('aadhaar')
+    land_use = (data.get('land_details') or {}).get('land_use')
+    if isinstance(land_use, list):
+        row['land_use'] = ';'.join(land_use)
+    return row
+
+
+def _assign_ids(store, registrations):
+    """
+    Give the batch fresh application IDs in row order
+    Rows are validated in pool processes that each mint their own IDs; minting
+    them again here makes IDs ascend with the row number, so the batch appends
+    in ID order. An ID that is already stored is skipped, as save_many would
+    otherwise silently replace that claim
+    """
+    for registration in registrations:
+        application_id = new_application_id()
+        while store.get(application_id) is not None:
+            application_id = new_application_id()
+        registration['application_id'] = application_id
+
+
+def build_registration(row):
+    """
+    Validate one imported row and turn it into a scored registration
+    Args: row (dict): Flat row keyed by the export CSV column names
+    Returns: tuple: (registration dict or None, list of error messages)
+    """
+    errors = []
+    for field in ('applicant_name', 'village', 'district'):
+        if _text(row, field) is None:
+            errors.append(f"'{field}' is required")
+    family_members = _number(row, 'family_members', int, errors, required=True, minimum=1, maximum=100)
+    land_area = _number(row, 'land_area', float, errors, required=True, minimum=0.1, maximum=MAX_LAND_AREA)
+    # The form stores 0 for a blank year, so exports carry 0 back in
+    occupation_since = None if _text(row, 'occupation_since') in ('0', '0.0') else _number(
+        row, 'occupation_since', int, errors, minimum=EARLIEST_OCCUPATION_YEAR, maximum=datetime.now().year)
+    aadhaar = _aadhaar(row, errors)
+    phone = None
+    try:
+        phone = parse_phone(_text(row, 'phone'))
+    except ValueError as e:
+        errors.append(str(e))
+    try:
+        location = parse_location(_text(row, 'latitude'), _text(row, 'longitude'))
+    except ValueError as e:
+        errors.append(str(e))
+    try:
+        parcel = parse_parcel(_text(row, 'parcel_geojson'))
+    except ValueError as e:
+        errors.append(str(e))
+    if errors:
+        return None, errors
+
+    application_id = new_application_id()
+    land_use = _text(row, 'land_use')
+    registration = {
+        'application_id': application_id,
+        'submission_date': datetime.now().isoformat(),
+        'status': 'submitted',
+        'personal_details': {
+            'applicant_name': _text(row, 'applicant_name'),
+            'father_name': _text(row, 'father_name'),
+            'aadhaar': aadhaar,
+            'phone': phone,
+            'tribe': _text(row, 'tribe'),
+            'family_members': family_members,
+            'address': {
+                'village': _text(row, 'village'),
+                'tehsil': _text(row, 'tehsil'),
+                'district': _text(row, 'district'),
+                'state': _text(row, 'state')
+            }
+        },
+        'land_details': {
+            'claim_type': _text(row, 'claim_type'),
+            'land_area': land_area,
+            'occupation_since': occupation_since or 0,
+            'forest_type': _text(row, 'forest_type'),
+            'survey_number': _text(row, 'survey_number'),
+            'boundaries': _text(row, 'boundaries'),
+            'location': location,
+            'parcel': parcel,
+            'land_use': [part.strip() for part in land_use.split(';') if part.strip()] if land_use else []
+        },
+        'remarks': _text(row, 'remarks'),
+        'documents': {}
+    }
+    if parcel:
+        registration['land_details']['parcel_area'] = round(parcel_area(parcel), 4)
+    registration['prediction'] = calculate_fra_approval_probability(registration)
+    return registration, []
+
+
+def _validate_chunk(rows):
+    """
+    Pool task: validate and score a chunk of rows
+    Args: rows (list): (row number, raw row) pairs; NDJSON rows arrive as undecoded text
+    Returns: list: (row number, registration or None, errors) triples
+    """
+    results = []
+    for row_number, raw in rows:
+        try:
+            data = json.loads(raw) if isinstance(raw, str) else raw
+        except ValueError as e:
+            results.append((row_number, None, [f"Invalid JSON: {str(e)}"]))
+            continue
+        try:
+            registration, errors = build_registration(flatten_row(data))
+        except ValueError as e:
+            registration, errors = None, [str(e)]
+        results.append((row_number, registration, errors))
+    return results
+
+
+def iter_rows(stream, import_format):
+    """
+    Split an uploaded file into numbered rows without decoding them further
+    Args:
+        stream: Binary file object
+        import_format (str): 'csv' or 'ndjson'
+    Yields: tuple: (line number in the file, raw row)
+    Raises: ValueError for an unknown format, undecodable text or malformed CSV
+    """
+    if import_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format '{import_format}'. "
+                         f"Choose from: {', '.join(IMPORT_FORMATS)}")
+    # utf-8-sig drops the byte-order mark spreadsheet programs put on CSV exports
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if import_format == 'csv':
+            reader = csv.DictReader(text)
+            if not reader.fieldnames:
+                return
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            try:
+                for row in reader:
+                    yield reader.line_num, row
+            except csv.Error as e:
+                raise ValueError(f"Malformed CSV near line {reader.line_num}: {str(e)}")
+        else:
+            for line_number, line in enumerate(text, 1):
+                if line.strip():
+                    yield line_number, line
+    except UnicodeDecodeError:
+        raise ValueError('Import file must be UTF-8 encoded text')
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_rows(rows, workers=IMPORT_WORKERS):
+    """
+    Validate and score rows, in a process pool for large files
+    Args:
+        rows: Iterable of (row number, raw row) pairs from iter_rows
+        workers (int): Pool size; 1 validates in-process
+    Returns: list: (row number, registration or None, errors) in file order
+    """
+    rows = list(rows)
+    if workers <= 1 or len(rows) < MIN_POOL_ROWS:
+        return _validate_chunk(rows)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk_results in pool.map(_validate_chunk, _chunks(rows, ROWS_PER_CHUNK)):
+            results.extend(chunk_results)
+    return results
+
+
+def check_claims(store, results, policy=None, save=False):
+    """
+    Run the submission checks of the registration form on validated rows
+    Each row is compared with the stored claims and with the rows before it in
+    the same file: matching Aadhaar numbers or land parcels are flagged in
+    duplicate_of (or the row is refused under the reject policy) and
+    overlapping parcels are recorded in parcel_overlaps.
+    Args:
+        store (RegistrationStore): Store the rows are imported into
+        results (list): (row number, registration or None, errors) from validate_rows
+        policy (str): Duplicate policy (default: VANMITRA_DUPLICATE_POLICY)
+        save (bool): Also save the rows that pass, in one commit checked under
+            the store's write lock (see RegistrationStore.save_claims)
+    Returns: tuple: (the results with refused rows turned into errors,
+        dict of refused row number -> matching duplicate fields)
+    """
+    registrations = [registration for _, registration, _ in results if registration is not None]
+    if not registrations:
+        failures = {}
+    elif save:
+        failures = store.save_claims(registrations, policy)
+    else:
+        _, failures = check_new_claims(store, registrations, policy)
+    checked = []
+    refused = {}
+    for row_number, registration, errors in results:
+        error = failures.get(registration['application_id']) if registration is not None else None
+        if error is not None:
+            checked.append((row_number, None, [str(error)]))
+            refused[row_number] = list(error.matches)
+        else:
+            checked.append((row_number, registration, errors))
+    return checked, refused
+
+
+def _row_report(row_number, registration):
+    entry = {'row': row_number, 'application_id': registration['application_id']}
+    if registration.get('duplicate_of'):
+        entry['duplicate_fields'] = list(registration['duplicate_of'])
+    if registration.get('parcel_overlaps'):
+        entry['overlapping_claims'] = len(registration['parcel_overlaps'])
+    return entry
+
+
+def _error_report(row_number, errors, duplicate_fields=None):
+    entry = {'row': row_number, 'errors': errors}
+    if duplicate_fields:
+        entry['duplicate_fields'] = duplicate_fields
+    return entry
+
+
+def import_registrations(store, rows, workers=IMPORT_WORKERS, dry_run=False, policy=None):
+    """
+    Import rows into a registration store as one batched write
+    Args:
+        store (RegistrationStore): Destination store
+        rows: Iterable of (row number, raw row) pairs from iter_rows
+        workers (int): Validation pool size
+        dry_run (bool): Validate, score and check without saving anything
+        policy (str): Duplicate policy (default: VANMITRA_DUPLICATE_POLICY)
+    Returns: dict: Counts, the application ID assigned to each imported row (with
+        any duplicate fields and overlapping claims it was flagged for) and per-row errors
+    """
+    results = validate_rows(rows, workers)
+    if not dry_run:
+        # Final IDs first, so rows flagged against earlier rows of the file name their real IDs
+        _assign_ids(store, [registration for _, registration, _ in results if registration is not None])
+    results, refused = check_claims(store, results, policy, save=not dry_run)
+    registrations = [registration for _, registration, _ in results if registration is not None]
+    if registrations and not dry_run:
+        logger.info(f"Bulk import saved {len(registrations)} registrations")
+    report = [_row_report(row_number, registration) for row_number, registration, _ in results
+              if registration is not None]
+    return {
+        'total_rows': len(results),
+        'imported': 0 if dry_run else len(registrations),
+        'valid': len(registrations),
+        'failed': len(results) - len(registrations),
+        'flagged': sum(1 for entry in report if 'duplicate_fields' in entry or 'overlapping_claims' in entry),
+        'dry_run': dry_run,
+        'registrations': report,
+        'errors': [_error_report(row_number, errors, refused.get(row_number))
+                   for row_number, registration, errors in results if registration is None],
+    }
+
+
+def detect_format(filename, mimetype=None):
+    """Guess the import format from a file name or content type; None if unknown"""
+    name = (filename or '').lower()
+    if name.endswith('.csv') or (mimetype or '').startswith('text/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or (mimetype or '') in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+
+def main(argv=None):
+    from registration_store import get_registration_store
+
+    parser = argparse.ArgumentParser(description='Bulk import FRA land claims from CSV or NDJSON')
+    parser.add_argument('path', help='CSV or NDJSON file of claims')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='Input format (default: from the file extension)')
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS, help='Validation processes')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and score without saving')
+    args = parser.parse_args(argv)
+
+    import_format = args.format or detect_format(args.path)
+    if import_format is None:
+        parser.error('cannot tell the format from the file name; pass --format')
+    with open(args.path, 'rb') as f:
+        report = import_registrations(get_registration_store(), iter_rows(f, import_format),
+                                      workers=args.workers, dry_run=args.dry_run)
+    json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write('\n')
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Secondary Indexes and Facet Counts for Registrations
+In-memory inverted indexes over the fields admins filter on, so filtering and
+per-value facet counts cost time proportional to the matching set instead of
+a scan over every registration
+"""
+
+import sys
+from collections import Counter
+
+import numpy as np
+
+
+def _address(record):
+    return (record.get('personal_details') or {}).get('address') or {}
+
+
+def _land(record):
+    return record.get('land_details') or {}
+
+
+# Fields admins can filter and facet on, mapped to their location in registration_data
+INDEXED_FIELDS = {
+    'status': lambda r: r.get('status'),
+    'district': lambda r: _address(r).get('district'),
+    'state': lambda r: _address(r).get('state'),
+    'tribe': lambda r: (r.get('personal_details') or {}).get('tribe'),
+    'claim_type': lambda r: _land(r).get('claim_type'),
+    'forest_type': lambda r: _land(r).get('forest_type'),
+}
+
+
+def normalize_value(value):
+    """Index key for a field value; lookups are case- and whitespace-insensitive"""
+    if value is None:
+        return None
+    # Interned so every registration's copy of a common value is one shared string
+    value = sys.intern(str(value).strip().lower())
+    return value or None
+
+
+def record_values(record):
+    """
+    Extract normalized values for every indexed field
+    Returns: dict: Field -> normalized value (None when missing)
+    """
+    return {field: normalize_value(get(record)) for field, get in INDEXED_FIELDS.items()}
+
+
+class SecondaryIndexes:
+    """
+    Value -> application_id postings for each indexed field
+
+    Attach to a store with RegistrationStore.subscribe; it is updated in place
+    on every insert and status change. A reverse map of each application's
+    indexed values makes facet counting over a result set a single pass.
+
+    Indexes saved with a snapshot (see pack) are read as arrays from the
+    shared mapping: a code per row and field plus rows grouped by code. Only
+    applications changed since then live in the dictionaries.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all postings before a full rebuild"""
+        self.postings = {field: {} for field in INDEXED_FIELDS}
+        self.labels = {field: {} for field in INDEXED_FIELDS}
+        self.values = {}
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the indexes saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+        self._saved_codes = {field: {key: code for code, key in enumerate(keys, 1)}
+                             for field, keys in saved.meta['keys'].items()}
+
+    def pack(self, rows):
+        """
+        Save the indexes as arrays for a snapshot
+        Args: rows (dict): application_id -> row of every indexed application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        meta = {'keys': {}, 'labels': {}}
+        arrays = {}
+        for field in INDEXED_FIELDS:
+            keys = list(self.postings[field])
+            codes = np.zeros(len(rows), dtype=np.int32)
+            for code, key in enumerate(keys, 1):
+                codes[[rows[application_id] for application_id in self.postings[field][key]]] = code
+            order = np.argsort(codes, kind='stable').astype(np.int32)
+            offsets = np.searchsorted(codes[order], np.arange(1, len(keys) + 2))
+            meta['keys'][field] = keys
+            meta['labels'][field] = [self.labels[field][key] for key in keys]
+            arrays[f"codes.{field}"] = codes
+            arrays[f"postings.{field}"] = order[offsets[0]:]
+            arrays[f"offsets.{field}"] = offsets - offsets[0]
+        return meta, arrays
+
+    def __len__(self):
+        """Number of indexed applications"""
+        return len(self.values) + (len(self._saved) if self._saved is not None else 0)
+
+    def apply(self, old, new):
+        """
+        Move an application's postings from its old field values to its new ones
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        application_id = (new or old or {}).get('application_id')
+        if not application_id:
+            return
+        if self._saved is not None:
+            self._saved.replace(application_id)
+        previous = self.values.pop(application_id, None)
+        if previous:
+            for field, key in previous.items():
+                if key is None:
+                    continue
+                ids = self.postings[field].get(key)
+                if ids is not None:
+                    ids.discard(application_id)
+                    if not ids:
+                        del self.postings[field][key]
+                        self.labels[field].pop(key, None)
+        if new is None:
+            return
+        current = record_values(new)
+        self.values[application_id] = current
+        for field, key in current.items():
+            if key is None:
+                continue
+            self.postings[field].setdefault(key, set()).add(application_id)
+            self.labels[field].setdefault(key, str(INDEXED_FIELDS[field](new)).strip())
+
+    def candidates(self, filters):
+        """
+        Find applications matching every field filter
+        Args: filters (dict): Field -> list of accepted values (any of them)
+        Returns: set or None: Matching application IDs, or None when no indexed filter applies
+        """
+        groups = []
+        saved_rows = None
+        for field, accepted in filters.items():
+            if field not in self.postings or not accepted:
+                continue
+            union = set()
+            for value in accepted:
+                union |= self.postings[field].get(normalize_value(value), set())
+            groups.append(union)
+            if self._saved is not None:
+                rows = self._saved_postings(field, accepted)
+                saved_rows = rows if saved_rows is None else np.intersect1d(saved_rows, rows, assume_unique=True)
+        if not groups:
+            return None
+        groups.sort(key=len)
+        result = set(groups[0])
+        for group in groups[1:]:
+            result &= group
+            if not result:
+                break
+        if saved_rows is not None:
+            result.update(self._saved.ids_of(self._saved.current(saved_rows)))
+        return result
+
+    def _saved_postings(self, field, accepted):
+        """Sorted saved rows holding any of the accepted values of a field"""
+        postings = self._saved.arrays[f"postings.{field}"]
+        offsets = self._saved.arrays[f"offsets.{field}"]
+        codes = {self._saved_codes[field].get(normalize_value(value)) for value in accepted}
+        parts = [postings[offsets[code - 1]:offsets[code]] for code in codes if code is not None]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    def facet_counts(self, fields, application_ids=None):
+        """
+        Count applications per value of each requested field
+        Args:
+            fields (list): Indexed fields to facet on
+            application_ids (iterable): Restrict counting to these applications;
+                None counts every application straight from the postings
+        Returns: dict: Field -> {value label: count}, most common first
+        """
+        facets = {}
+        saved = self._saved
+        if application_ids is not None and saved is not None:
+            application_ids = list(application_ids)
+            saved_rows = saved.rows_of(application_ids)
+        for field in fields:
+            if field not in self.postings:
+                raise ValueError(f"Cannot facet on '{field}'. Choose from: {', '.join(INDEXED_FIELDS)}")
+            keys = saved.meta['keys'][field] if saved is not None else ()
+            if application_ids is None:
+                counts = Counter()
+                if saved is not None:
+                    saved_counts = np.diff(saved.arrays[f"offsets.{field}"])
+                    if saved.replaced_count:
+                        replaced = saved.arrays[f"codes.{field}"][saved.replaced]
+                        saved_counts -= np.bincount(replaced, minlength=len(keys) + 1)[1:]
+                    counts.update({key: count for key, count in zip(keys, saved_counts.tolist()) if count})
+                for key, ids in self.postings[field].items():
+                    counts[key] += len(ids)
+            elif saved is None:
+                counts = Counter()
+                for application_id in application_ids:
+                    key = self.values.get(application_id, {}).get(field)
+                    if key is not None:
+                        counts[key] += 1
+            else:
+                counts = Counter()
+                codes = saved.take(f"codes.{field}", saved_rows).tolist()
+                for application_id, code in zip(application_ids, codes):
+                    key = keys[code - 1] if code else self.values.get(application_id, {}).get(field)
+                    if key is not None:
+                        counts[key] += 1
+            facets[field] = {self._label(field, key): count for key, count in counts.most_common()}
+        return facets
+
+    def _label(self, field, key):
+        if self._saved is not None:
+            code = self._saved_codes[field].get(key)
+            if code is not None:
+                return self._saved.meta['labels'][field][code - 1]
+        return self.labels[field].get(key, key)
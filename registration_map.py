@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Claim Locations for the FRA Smart Atlas
+Registrations carry the claimed land's coordinates in land_details['location'].
+The store keeps a pyramid of per-zoom grid cells over them (Web Mercator
+tiles divided into CELL_BITS x CELL_BITS cells), each holding approved,
+pending and rejected counts and a centroid, so a map view at any zoom is
+answered from pre-aggregated clusters instead of raw points.
+"""
+
+import math
+
+import numpy as np
+
+# Deepest zoom with its own cluster level; closer views get individual claims
+MAX_CLUSTER_ZOOM = 14
+# Cells per tile side as a power of two: 2 gives 4 x 4 cells of 64 pixels per 256-pixel tile
+CELL_BITS = 2
+GRID_BITS = MAX_CLUSTER_ZOOM + CELL_BITS
+MAX_MAP_ZOOM = 22
+# Individual claims are sent past MAX_CLUSTER_ZOOM only while a view holds this few
+MAX_POINTS = 2000
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.05112878
+
+APPROVED, PENDING, REJECTED = 0, 1, 2
+STATUS_GROUPS = ('approved', 'pending', 'rejected')
+
+
+def status_group(status):
+    """Map a workflow status onto the atlas's approved / pending / rejected buckets"""
+    if status == 'approved':
+        return APPROVED
+    if status == 'rejected':
+        return REJECTED
+    return PENDING
+
+
+def parse_location(latitude, longitude):
+    """
+    Validate coordinates from a form or import row
+    Args:
+        latitude: Decimal degrees north, as a number or text (None or '' if not given)
+        longitude: Decimal degrees east
+    Returns: dict or None: {'latitude', 'longitude'}, or None when neither is given
+    Raises: ValueError: Only one is given, or either is not a valid coordinate
+    """
+    given = [value for value in (latitude, longitude) if value not in (None, '')]
+    if not given:
+        return None
+    if len(given) == 1:
+        raise ValueError('Give both latitude and longitude, or neither')
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError('Latitude and longitude must be decimal degrees')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Latitude must be between -90 and 90 and longitude between -180 and 180')
+    return {'latitude': round(latitude, 6), 'longitude': round(longitude, 6)}
+
+
+def claim_location(record):
+    """
+    Coordinates of a registration's claimed land
+    Returns: tuple or None: (latitude, longitude)
+    """
+    location = (record.get('land_details') or {}).get('location') or {}
+    try:
+        latitude, longitude = float(location['latitude']), float(location['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def _project(latitude, longitude):
+    """Web Mercator position as fractions of the world's width and height"""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = (longitude + 180.0) / 360.0
+    sine = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sine) / (1 - sine)) / (4 * math.pi)
+    return x, y
+
+
+def grid_cell(latitude, longitude, bits=GRID_BITS):
+    """Cell (x, y) containing a point on the 2^bits x 2^bits grid"""
+    x, y = _project(latitude, longitude)
+    size = 1 << bits
+    return min(int(x * size), size - 1), min(int(y * size), size - 1)
+
+
+def cell_ranges(bbox, level):
+    """
+    Cell ranges covering a bounding box at a cluster level
+    Args:
+        bbox (tuple): (west, south, east, north) in degrees; west > east crosses the antimeridian
+        level (int): Cluster level (zoom), 0 to MAX_CLUSTER_ZOOM
+    Returns: list: (x0, x1, y0, y1) inclusive cell ranges
+    """
+    west, south, east, north = bbox
+    bits = level + CELL_BITS
+    size = 1 << bits
+    x0, y0 = grid_cell(north, west, bits)
+    x1, y1 = grid_cell(south, east, bits)
+    if west <= east:
+        return [(x0, x1, y0, y1)]
+    return [(x0, size - 1, y0, y1), (0, x1, y0, y1)]
+
+
+def cell_key(x, y):
+    """Pack a cell's grid coordinates into one dictionary key"""
+    return (x << 32) | y
+
+
+def parse_map_query(args):
+    """
+    Validate /api/map/claims query parameters
+    Args: args (dict): bbox ('west,south,east,north') and zoom
+    Returns: tuple: (bbox tuple, zoom int)
+    Raises: ValueError: A parameter is missing or out of range
+    """
+    try:
+        bbox = tuple(float(value) for value in (args.get('bbox') or '').split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4 or not all(math.isfinite(value) for value in bbox):
+        raise ValueError("'bbox' must be west,south,east,north in decimal degrees")
+    west, south, east, north = bbox
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("'bbox' is outside the map or has south above north")
+    try:
+        zoom = int(args.get('zoom', 5))
+    except (TypeError, ValueError):
+        raise ValueError("'zoom' must be a whole number")
+    if not 0 <= zoom <= MAX_MAP_ZOOM:
+        raise ValueError(f"'zoom' must be between 0 and {MAX_MAP_ZOOM}")
+    return bbox, zoom
+
+
+def map_response(zoom, cells, points=None):
+    """
+    Shape clusters for the atlas
+    Args:
+        zoom (int): Requested zoom
+        cells (iterable): [approved, pending, rejected, latitude sum, longitude sum] per cell
+        points (list): Individual claims as (application_id, latitude, longitude, group), if sent
+    Returns: dict: clusters (centroid, count and per-group counts), points and totals
+    """
+    clusters = []
+    totals = [0, 0, 0]
+    for cell in cells:
+        count = cell[APPROVED] + cell[PENDING] + cell[REJECTED]
+        if not count:
+            continue
+        cluster = {
+            'latitude': round(cell[3] / count, 6),
+            'longitude': round(cell[4] / count, 6),
+            'count': count,
+        }
+        for group, name in enumerate(STATUS_GROUPS):
+            cluster[name] = cell[group]
+            totals[group] += cell[group]
+        clusters.append(cluster)
+    clusters.sort(key=lambda cluster: -cluster['count'])
+    response = {
+        'zoom': zoom,
+        'clusters': clusters if points is None else [],
+        'points': [
+            {'application_id': application_id, 'latitude': latitude, 'longitude': longitude,
+             'status': STATUS_GROUPS[group]}
+            for application_id, latitude, longitude, group in points or ()
+        ],
+        'totals': dict(zip(STATUS_GROUPS, totals), count=sum(totals)),
+    }
+    return response
+
+
+def merge_cells(parts, zoom, max_points=MAX_POINTS):
+    """
+    Combine the cells found in several stores (shards) for the same view
+    Args:
+        parts (list): (cells, points) pairs, see ClaimMap.cells
+        zoom (int): Requested zoom
+    Returns: tuple: (cells, points) as one store would have found them
+    """
+    cells = {}
+    for part_cells, _ in parts:
+        for key, cell in part_cells.items():
+            merged = cells.setdefault(key, [0, 0, 0, 0.0, 0.0])
+            for i, value in enumerate(cell):
+                merged[i] += value
+    points = None
+    # Each part sent its claims if it alone had few enough; the whole view must too
+    if zoom > MAX_CLUSTER_ZOOM and sum(sum(cell[:3]) for cell in cells.values()) <= max_points:
+        points = [point for _, part_points in parts for point in part_points or ()]
+    return cells, points
+
+
+def _in_ranges(key, ranges):
+    x, y = key >> 32, key & 0xFFFFFFFF
+    return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, x1, y0, y1 in ranges)
+
+
+class ClaimMap:
+    """
+    Zoom pyramid of claim clusters plus the claims in each finest cell
+
+    Attach to a store with RegistrationStore.subscribe. A change touches one
+    cell per zoom level, so keeping the pyramid current costs
+    MAX_CLUSTER_ZOOM + 1 dictionary updates; a map view then reads only the
+    cells inside its bounding box at its zoom.
+
+    A pyramid saved with a snapshot (see pack) is read as arrays from the
+    shared mapping; the dictionaries then hold only what changed since, as
+    differences from the saved cells.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all cells before a full rebuild"""
+        # Per level: cell key -> [approved, pending, rejected, latitude sum, longitude sum]
+        self.levels = [{} for _ in range(MAX_CLUSTER_ZOOM + 1)]
+        # Finest cell key -> {application_id: (latitude, longitude, group)}
+        self.points = {}
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the pyramid saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+
+    def pack(self, rows):
+        """
+        Save the pyramid as arrays for a snapshot: per level the sorted cell keys,
+        counts and coordinate sums, and every claim's point by finest cell
+        Args: rows (dict): application_id -> row of every stored application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        arrays = {}
+        for level, cells in enumerate(self.levels):
+            keys = sorted(cells)
+            values = np.array([cells[key] for key in keys], dtype=float).reshape(-1, 5)
+            arrays[f"keys.{level}"] = np.array(keys, dtype=np.int64)
+            arrays[f"counts.{level}"] = values[:, :3].astype(np.int64)
+            arrays[f"sums.{level}"] = values[:, 3:]
+        keys = sorted(self.points)
+        points = [(key, rows[application_id]) + claim
+                  for key in keys for application_id, claim in self.points[key].items()]
+        arrays['point_keys'] = np.array([point[0] for point in points], dtype=np.int64)
+        arrays['point_rows'] = np.array([point[1] for point in points], dtype=np.int32)
+        arrays['point_coordinates'] = np.array([point[2:4] for point in points], dtype=float).reshape(-1, 2)
+        arrays['point_groups'] = np.array([point[4] for point in points], dtype=np.int8)
+        return {}, arrays
+
+    def apply(self, old, new):
+        """
+        Move a claim between cells when it is added, moved, changes status or is removed
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        if self._saved is not None:
+            # A saved point is skipped from now on; its cells are corrected below
+            self._saved.replace((new or old or {}).get('application_id') or '')
+        if old is not None:
+            self._update(old, -1)
+        if new is not None:
+            self._update(new, 1)
+
+    def _update(self, record, sign):
+        location = claim_location(record)
+        application_id = record.get('application_id')
+        if location is None or not application_id:
+            return
+        latitude, longitude = location
+        group = status_group(record.get('status'))
+        x, y = grid_cell(latitude, longitude)
+        for level, cells in enumerate(self.levels):
+            shift = MAX_CLUSTER_ZOOM - level
+            key = cell_key(x >> shift, y >> shift)
+            cell = cells.get(key)
+            if cell is None:
+                # Without saved cells there is nothing to take a claim away from
+                if sign < 0 and self._saved is None:
+                    continue
+                cell = cells[key] = [0, 0, 0, 0.0, 0.0]
+            cell[group] += sign
+            cell[3] += sign * latitude
+            cell[4] += sign * longitude
+            # A difference from a saved cell can net to no claims yet still move the centroid
+            if not (cell[APPROVED] or cell[PENDING] or cell[REJECTED]) and self._saved is None:
+                del cells[key]
+        key = cell_key(x, y)
+        if sign > 0:
+            self.points.setdefault(key, {})[application_id] = (latitude, longitude, group)
+        else:
+            claims = self.points.get(key)
+            if claims is not None:
+                claims.pop(application_id, None)
+                if not claims:
+                    del self.points[key]
+
+    def _cells_in(self, level, ranges):
+        cells = self.levels[level]
+        area = sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, x1, y0, y1 in ranges)
+        if area <= len(cells):
+            for x0, x1, y0, y1 in ranges:
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        key = cell_key(x, y)
+                        if key in cells:
+                            yield key, cells[key]
+            return
+        # Cell key order, as the range walk above yields them
+        for key in sorted(key for key in cells if _in_ranges(key, ranges)):
+            yield key, cells[key]
+
+    def _saved_cells_in(self, level, ranges):
+        """Saved cells inside cell ranges, corrected by the changes since"""
+        keys = self._saved.arrays[f"keys.{level}"]
+        x, y = keys >> 32, keys & 0xFFFFFFFF
+        inside = np.zeros(len(keys), dtype=bool)
+        for x0, x1, y0, y1 in ranges:
+            inside |= (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        found = {}
+        for key, counts, sums in zip(keys[inside].tolist(), self._saved.arrays[f"counts.{level}"][inside].tolist(),
+                                     self._saved.arrays[f"sums.{level}"][inside].tolist()):
+            found[key] = counts + sums
+        for key, change in self._cells_in(level, ranges):
+            cell = found.setdefault(key, [0, 0, 0, 0.0, 0.0])
+            for i, value in enumerate(change):
+                cell[i] += value
+        return sorted((key, cell) for key, cell in found.items() if cell[APPROVED] or cell[PENDING] or cell[REJECTED])
+
+    def _saved_points(self, key):
+        """Saved claims in a finest cell that have not changed since"""
+        keys = self._saved.arrays['point_keys']
+        start, end = np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+        rows = self._saved.arrays['point_rows'][start:end]
+        current = ~self._saved.replaced[rows]
+        coordinates = self._saved.arrays['point_coordinates'][start:end][current].tolist()
+        groups = self._saved.arrays['point_groups'][start:end][current].tolist()
+        return [(application_id, latitude, longitude, group) for application_id, (latitude, longitude), group
+                in zip(self._saved.ids_of(rows[current]), coordinates, groups)]
+
+    def cells(self, bbox, zoom, max_points=MAX_POINTS):
+        """
+        Cells inside a bounding box at a zoom level's cluster level
+        Args:
+            bbox (tuple): (west, south, east, north) in degrees
+            zoom (int): Map zoom; past MAX_CLUSTER_ZOOM individual claims are
+                returned while there are at most max_points of them
+        Returns: tuple: (dict of cell key -> [approved, pending, rejected, latitude sum,
+            longitude sum], list of (application_id, latitude, longitude, group) claims or None)
+        """
+        level = min(zoom, MAX_CLUSTER_ZOOM)
+        ranges = cell_ranges(bbox, level)
+        if self._saved is None:
+            found = {key: list(cell) for key, cell in self._cells_in(level, ranges)}
+        else:
+            found = dict(self._saved_cells_in(level, ranges))
+        points = None
+        if zoom > MAX_CLUSTER_ZOOM and sum(sum(cell[:3]) for cell in found.values()) <= max_points:
+            points = []
+            for key in found:
+                if self._saved is not None:
+                    points.extend(self._saved_points(key))
+                points.extend((application_id,) + claim for application_id, claim in self.points.get(key, {}).items())
+        return found, points
+
+    def clusters(self, bbox, zoom, max_points=MAX_POINTS):
+        """
+        Claims inside a bounding box, clustered for a zoom level
+        Returns: dict: See map_response (arguments as for cells)
+        """
+        cells, points = self.cells(bbox, zoom, max_points)
+        return map_response(zoom, cells.values(), points)
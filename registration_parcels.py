@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Claimed Parcel Geometry and Overlap Detection
+Claims may carry their boundary as a GeoJSON Polygon or MultiPolygon in
+land_details['parcel']. Areas come from the shoelace formula over NumPy
+coordinate arrays, and an STR-packed bounding-box tree finds the parcels a
+new claim might overlap without comparing it against every stored parcel;
+only those candidates get the exact overlap computation.
+"""
+
+import json
+import math
+import secrets
+
+import numpy as np
+
+from registration_duplicates import (
+    DuplicateIndex, DuplicateClaimError, KEY_BYTES, check_duplicates, is_active
+)
+
+# Mean Earth radius; parcels are small enough for a local equirectangular projection
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180.0
+SQUARE_METERS_PER_HECTARE = 10000.0
+
+MAX_PARCEL_VERTICES = 5000
+# Overlaps smaller than this are rounding along shared boundaries, not double claims
+MIN_OVERLAP_SQUARE_METERS = 10.0
+
+# Children per tree node
+NODE_CAPACITY = 16
+# Parcels added since the last packing are scanned directly until there are this many,
+# or this share of the packed tree, whichever is larger
+MIN_UNPACKED = 256
+UNPACKED_FRACTION = 0.05
+
+
+def parse_parcel(value):
+    """
+    Validate a claimed parcel boundary
+    Args: value: GeoJSON Polygon, MultiPolygon or a Feature holding one, as a
+        dict or JSON text (None or '' if not given)
+    Returns: dict or None: Normalized geometry with closed rings of
+        [longitude, latitude] positions, outer rings counter-clockwise and holes clockwise
+    Raises: ValueError: The boundary is not a usable polygon
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError('Parcel boundary must be GeoJSON')
+    if isinstance(value, dict) and value.get('type') == 'Feature':
+        value = value.get('geometry')
+    if not isinstance(value, dict) or value.get('type') not in ('Polygon', 'MultiPolygon'):
+        raise ValueError('Parcel boundary must be a GeoJSON Polygon or MultiPolygon')
+    polygons = value.get('coordinates')
+    if value['type'] == 'Polygon':
+        polygons = [polygons]
+    if not isinstance(polygons, list) or not polygons:
+        raise ValueError('Parcel boundary has no coordinates')
+    normalized = []
+    vertices = 0
+    for polygon in polygons:
+        if not isinstance(polygon, list) or not polygon:
+            raise ValueError('Each polygon needs an outer ring')
+        rings = []
+        for position, ring in enumerate(polygon):
+            points = _ring_array(ring)
+            vertices += len(points)
+            # Outer rings counter-clockwise, holes clockwise, as in RFC 7946
+            if (_signed_area(points) > 0) != (position == 0):
+                points = points[::-1]
+            rings.append(np.round(points, 7).tolist())
+        normalized.append(rings)
+    if vertices > MAX_PARCEL_VERTICES:
+        raise ValueError(f"Parcel boundary has more than {MAX_PARCEL_VERTICES} vertices")
+    geometry = {'type': 'Polygon', 'coordinates': normalized[0]} if len(normalized) == 1 else \
+        {'type': 'MultiPolygon', 'coordinates': normalized}
+    if parcel_area(geometry) <= 0:
+        raise ValueError('Parcel boundary encloses no area')
+    return geometry
+
+
+def _ring_array(ring):
+    try:
+        points = np.array(ring, dtype=float)
+    except (TypeError, ValueError):
+        raise ValueError('Ring positions must be [longitude, latitude] pairs')
+    if points.ndim != 2 or points.shape[1] < 2:
+        raise ValueError('Ring positions must be [longitude, latitude] pairs')
+    points = points[:, :2]
+    if not np.isfinite(points).all() or (np.abs(points[:, 0]) > 180).any() or (np.abs(points[:, 1]) > 90).any():
+        raise ValueError('Ring positions must be valid longitudes and latitudes')
+    if not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    if len(points) < 4:
+        raise ValueError('Each ring needs at least three distinct positions')
+    return points
+
+
+def _signed_area(points):
+    """Shoelace area of a closed ring, positive when counter-clockwise (in the ring's own units)"""
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def parcel_rings(geometry):
+    """Every ring of a normalized geometry as a closed (n, 2) array of [longitude, latitude]"""
+    polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+    return [np.asarray(ring, dtype=float) for polygon in polygons for ring in polygon]
+
+
+def project(rings, reference_latitude):
+    """Rings in metres on a local equirectangular projection"""
+    scale = np.array([METERS_PER_DEGREE * math.cos(math.radians(reference_latitude)), METERS_PER_DEGREE])
+    return [ring * scale for ring in rings]
+
+
+def parcel_area(geometry):
+    """
+    Area of a parcel in hectares
+    Holes are clockwise, so summing every ring's signed area subtracts them
+    """
+    rings = parcel_rings(geometry)
+    reference = float(np.mean(rings[0][:, 1]))
+    return sum(_signed_area(ring) for ring in project(rings, reference)) / SQUARE_METERS_PER_HECTARE
+
+
+def claim_parcel(record):
+    """The normalized parcel geometry of a registration, or None"""
+    parcel = (record.get('land_details') or {}).get('parcel')
+    return parcel if isinstance(parcel, dict) and parcel.get('coordinates') else None
+
+
+def bounding_box(geometry):
+    """(min longitude, min latitude, max longitude, max latitude) of a parcel"""
+    points = np.vstack(parcel_rings(geometry))
+    return tuple(float(v) for v in (points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()))
+
+
+def _clip_area(ring, triangle):
+    """
+    Signed area of a ring clipped to a counter-clockwise triangle (Sutherland-Hodgman)
+    Clipping any ring to a convex window keeps its signed area inside the window
+    """
+    points = [tuple(p) for p in ring[:-1]]
+    for i in range(3):
+        ax, ay = triangle[i]
+        bx, by = triangle[(i + 1) % 3]
+        ex, ey = bx - ax, by - ay
+        inside = [ex * (py - ay) - ey * (px - ax) >= 0 for px, py in points]
+        clipped = []
+        for j, current in enumerate(points):
+            previous = points[j - 1]
+            if inside[j]:
+                if not inside[j - 1]:
+                    clipped.append(_crossing(previous, current, ax, ay, ex, ey))
+                clipped.append(current)
+            elif inside[j - 1]:
+                clipped.append(_crossing(previous, current, ax, ay, ex, ey))
+        points = clipped
+        if len(points) < 3:
+            return 0.0
+    closed = np.array(points + points[:1])
+    return _signed_area(closed)
+
+
+def _crossing(p, q, ax, ay, ex, ey):
+    # Where segment p-q crosses the line through a with direction e
+    dp = ex * (p[1] - ay) - ey * (p[0] - ax)
+    dq = ex * (q[1] - ay) - ey * (q[0] - ax)
+    t = dp / (dp - dq)
+    return p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1])
+
+
+def overlap_area(first, second):
+    """
+    Area shared by two parcels, in hectares
+    The second parcel is split into signed fan triangles (their signs add up to
+    the parcel, holes included) and every ring of the first is clipped to each.
+    Args: first, second (dict): Normalized geometries
+    """
+    first_rings = parcel_rings(first)
+    second_rings = parcel_rings(second)
+    reference = float(np.mean(first_rings[0][:, 1]))
+    first_rings = project(first_rings, reference)
+    second_rings = project(second_rings, reference)
+    total = 0.0
+    for ring in second_rings:
+        origin = ring[0]
+        for i in range(1, len(ring) - 2):
+            triangle = np.array([origin, ring[i], ring[i + 1]])
+            sign = _signed_area(np.vstack([triangle, triangle[:1]]))
+            if sign == 0:
+                continue
+            if sign < 0:
+                triangle = triangle[::-1]
+            clipped = sum(_clip_area(first_ring, triangle) for first_ring in first_rings)
+            total += clipped if sign > 0 else -clipped
+    return max(total, 0.0) / SQUARE_METERS_PER_HECTARE
+
+
+def find_overlaps(geometry, candidates, exclude=None):
+    """
+    Exact overlaps between a parcel and candidate parcels
+    Args:
+        geometry (dict): Normalized geometry of the claim being checked
+        candidates (iterable): (application_id, geometry) pairs whose bounding boxes intersect it
+        exclude (str): The claim's own application_id
+    Returns: list: {'application_id', 'overlap_hectares', 'overlap_percent'} for
+        every real overlap, largest first
+    """
+    area = parcel_area(geometry)
+    overlaps = []
+    for application_id, other in candidates:
+        if application_id == exclude:
+            continue
+        shared = overlap_area(geometry, other)
+        if shared * SQUARE_METERS_PER_HECTARE >= MIN_OVERLAP_SQUARE_METERS:
+            overlaps.append({
+                'application_id': application_id,
+                'overlap_hectares': round(shared, 4),
+                'overlap_percent': round(100.0 * shared / area, 1) if area else None,
+            })
+    overlaps.sort(key=lambda overlap: -overlap['overlap_hectares'])
+    return overlaps
+
+
+def merge_overlaps(*found):
+    """
+    Combine the overlaps found in several places (stores, shards, the archive or a batch)
+    Returns: list: One overlap per claim, largest first; a claim found twice (moving
+        to the archive) is listed once
+    """
+    overlaps = list({overlap['application_id']: overlap
+                     for overlaps in reversed(found) for overlap in overlaps}.values())
+    overlaps.sort(key=lambda overlap: -overlap['overlap_hectares'])
+    return overlaps
+
+
+class PackedBoxTree:
+    """
+    Static R-tree packed with Sort-Tile-Recursive
+
+    Boxes are sorted into vertical slices by x, each slice by y, and grouped
+    NODE_CAPACITY at a time; every level above holds the bounding boxes of
+    the groups below as one NumPy array, so a search tests a whole node's
+    children with one vectorized comparison.
+    """
+
+    def __init__(self, ids, boxes):
+        """
+        Args:
+            ids (list): Application IDs
+            boxes (np.ndarray): (n, 4) min x, min y, max x, max y per ID
+        """
+        order = self._str_order(boxes)
+        self.ids = [ids[i] for i in order]
+        self.levels = [boxes[order]]
+        while len(self.levels[-1]) > NODE_CAPACITY:
+            below = self.levels[-1]
+            groups = np.arange(0, len(below), NODE_CAPACITY)
+            self.levels.append(np.column_stack([
+                np.minimum.reduceat(below[:, 0], groups), np.minimum.reduceat(below[:, 1], groups),
+                np.maximum.reduceat(below[:, 2], groups), np.maximum.reduceat(below[:, 3], groups),
+            ]))
+
+    @staticmethod
+    def _str_order(boxes):
+        count = len(boxes)
+        if count == 0:
+            return np.arange(0)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        slices = max(1, math.ceil(math.sqrt(math.ceil(count / NODE_CAPACITY))))
+        per_slice = slices * NODE_CAPACITY
+        by_x = np.argsort(centers[:, 0], kind='stable')
+        order = []
+        for start in range(0, count, per_slice):
+            members = by_x[start:start + per_slice]
+            order.append(members[np.argsort(centers[members, 1], kind='stable')])
+        return np.concatenate(order)
+
+    @classmethod
+    def restore(cls, ids, levels):
+        """Rebuild a packed tree from its ids and levels, as saved by ParcelIndex.pack"""
+        tree = cls.__new__(cls)
+        tree.ids = ids
+        tree.levels = levels
+        return tree
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, box):
+        """Application IDs whose boxes intersect box (min x, min y, max x, max y)"""
+        if not len(self.ids):
+            return []
+        nodes = np.arange(len(self.levels[-1]))
+        for depth in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[depth]
+            boxes = level[nodes]
+            hits = nodes[(boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) &
+                         (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1])]
+            if depth == 0 or not len(hits):
+                nodes = hits
+                break
+            below = len(self.levels[depth - 1])
+            nodes = (hits[:, None] * NODE_CAPACITY + np.arange(NODE_CAPACITY)).ravel()
+            nodes = nodes[nodes < below]
+        return [self.ids[i] for i in nodes]
+
+
+class ParcelIndex:
+    """
+    Claimed parcels of a store, searchable by bounding box
+
+    Attach to a store with RegistrationStore.subscribe. Parcels of claims that
+    are not rejected live in a PackedBoxTree plus a short list of those added
+    since it was packed; replaced or removed parcels are skipped until the
+    next packing. The tree is repacked lazily, on the first search after the
+    unpacked and stale share grows past its limit, so replaying a whole store
+    does not pack it repeatedly.
+
+    A tree saved with a snapshot (see pack) is searched straight from the
+    shared mapping, and its parcels are read from the snapshot's records when
+    they match; only parcels changed since are held here.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all parcels before a full rebuild"""
+        self.parcels = {}
+        self._tree = PackedBoxTree([], np.empty((0, 4)))
+        self._unpacked = {}
+        # Packed entries whose parcel has since changed or gone
+        self._stale = 0
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the tree saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+        self._saved_tree = PackedBoxTree.restore(
+            saved.arrays['rows'], [saved.arrays[f"level.{depth}"] for depth in range(saved.meta['levels'])])
+
+    def pack(self, rows):
+        """
+        Save the parcels' packed tree for a snapshot; the parcels stay in the records
+        Args: rows (dict): application_id -> row of every stored application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        ids = list(self.parcels)
+        boxes = np.array([self._box(application_id) for application_id in ids], dtype=float).reshape(-1, 4)
+        tree = PackedBoxTree([rows[application_id] for application_id in ids], boxes)
+        arrays = {f"level.{depth}": level for depth, level in enumerate(tree.levels)}
+        arrays['rows'] = np.array(tree.ids, dtype=np.int32)
+        return {'levels': len(tree.levels)}, arrays
+
+    def apply(self, old, new):
+        """
+        Track a claim's current parcel
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        application_id = (new or old or {}).get('application_id')
+        if not application_id:
+            return
+        if self._saved is not None:
+            self._saved.replace(application_id)
+        geometry = claim_parcel(new) if new is not None and is_active(new) else None
+        current = self.parcels.get(application_id)
+        if geometry == current:
+            return
+        if current is not None and self._unpacked.pop(application_id, None) is None:
+            self._stale += 1
+        if geometry is None:
+            del self.parcels[application_id]
+            return
+        self.parcels[application_id] = geometry
+        self._unpacked[application_id] = bounding_box(geometry)
+
+    def _repack(self):
+        ids = list(self.parcels)
+        boxes = np.array([self._box(application_id) for application_id in ids], dtype=float).reshape(-1, 4)
+        self._tree = PackedBoxTree(ids, boxes)
+        self._unpacked = {}
+        self._stale = 0
+
+    def _box(self, application_id):
+        box = self._unpacked.get(application_id)
+        return box if box is not None else bounding_box(self.parcels[application_id])
+
+    def candidates(self, box):
+        """
+        Stored parcels whose bounding boxes intersect a box
+        Args: box (tuple): (min longitude, min latitude, max longitude, max latitude)
+        Returns: list: (application_id, geometry) pairs
+        """
+        if len(self._unpacked) + self._stale > max(MIN_UNPACKED, UNPACKED_FRACTION * len(self._tree)):
+            self._repack()
+        found = set()
+        for application_id in self._tree.search(box):
+            # Packed boxes of changed parcels are stale; their current box is in _unpacked
+            if application_id in self.parcels and application_id not in self._unpacked:
+                found.add(application_id)
+        for application_id, (x0, y0, x1, y1) in self._unpacked.items():
+            if x0 <= box[2] and x1 >= box[0] and y0 <= box[3] and y1 >= box[1]:
+                found.add(application_id)
+        parcels = {application_id: self.parcels[application_id] for application_id in found}
+        if self._saved is not None:
+            rows = self._saved.current(np.array(self._saved_tree.search(box), dtype=np.int64))
+            for row in rows.tolist():
+                record = self._saved.record(row)
+                parcels[record['application_id']] = claim_parcel(record)
+        return sorted(parcels.items())
+
+    def overlaps(self, record):
+        """Overlaps between a registration's parcel and the stored ones (see find_overlaps)"""
+        geometry = claim_parcel(record)
+        if geometry is None:
+            return []
+        return find_overlaps(geometry, self.candidates(bounding_box(geometry)), record.get('application_id'))
+
+
+def check_overlaps(store, record, batch=None):
+    """
+    Record the stored claims a new claim's parcel overlaps, before it is saved
+    Matches go to record['parcel_overlaps'] for reviewers and the parcel's area
+    to land_details['parcel_area']; overlaps are flagged, never refused, since
+    community and individual rights can lawfully cover the same land.
+    Args:
+        store (RegistrationStore): Store holding the existing claims
+        record (dict): Registration data about to be submitted
+        batch (ParcelIndex): Claims submitted together with this one but not saved yet
+    Returns: list: Overlaps (see find_overlaps); empty without a parcel
+    """
+    geometry = claim_parcel(record)
+    if geometry is None:
+        return []
+    record['land_details']['parcel_area'] = round(parcel_area(geometry), 4)
+    overlaps = store.overlapping_claims(record)
+    if batch is not None:
+        overlaps = merge_overlaps(overlaps, batch.overlaps(record))
+    if overlaps:
+        record['parcel_overlaps'] = overlaps
+    return overlaps
+
+
+def check_new_claims(store, records, policy=None):
+    """
+    Run the duplicate and overlap checks on new claims committed together
+    Each claim is compared with the stored claims and with the claims before it
+    in the list, so two submissions of one Aadhaar number or parcel in the same
+    commit are caught like two in separate commits. Callers hold the store's
+    write lock (see RegistrationStore.save_claims) so no other commit can land
+    between the checks and the save.
+    Args:
+        store (RegistrationStore): Store holding the existing claims
+        records (list): Registration data about to be saved, in commit order
+        policy (str): Duplicate policy (default: VANMITRA_DUPLICATE_POLICY)
+    Returns: tuple: (list of claims to save, dict of refused application ID ->
+        DuplicateClaimError under the reject policy)
+    """
+    # Digests only have to match within this batch, so any key will do
+    batch_duplicates = DuplicateIndex(secrets.token_bytes(KEY_BYTES))
+    batch_parcels = ParcelIndex()
+    accepted = []
+    refused = {}
+    for record in records:
+        try:
+            check_duplicates(store, record, policy, batch=batch_duplicates)
+        except DuplicateClaimError as e:
+            refused[record['application_id']] = e
+            continue
+        check_overlaps(store, record, batch=batch_parcels)
+        batch_duplicates.apply(None, record)
+        batch_parcels.apply(None, record)
+        accepted.append(record)
+    return accepted, refused
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Server-Side Registration Queries for the Admin Dashboard
+Filtering, sorting and cursor-based pagination for /api/registrations, so
+responses stay bounded by the page size however many claims are stored
+"""
+
+import json
+import base64
+import heapq
+import bisect
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from registration_index import INDEXED_FIELDS, normalize_value
+from registration_search import tokenize, text_matches
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_SORT = '-submission_date'
+# Pending changes a SortIndex applies one by one; beyond this it re-sorts
+SORT_INDEX_BATCH = 64
+# Saved keys read for the first block of a page; later blocks double
+SAVED_KEYS_BLOCK = 64
+
+
+def _address(record):
+    return (record.get('personal_details') or {}).get('address') or {}
+
+
+def _lower(value):
+    return (value or '').lower()
+
+
+# Sort keys available to the dashboard, each mapping a record to a comparable value
+SORT_FIELDS = {
+    'submission_date': lambda r: r.get('submission_date') or '',
+    'application_id': lambda r: r.get('application_id') or '',
+    'status': lambda r: r.get('status') or '',
+    'applicant_name': lambda r: _lower((r.get('personal_details') or {}).get('applicant_name')),
+    'district': lambda r: _lower(_address(r).get('district')),
+    'state': lambda r: _lower(_address(r).get('state')),
+    'land_area': lambda r: float((r.get('land_details') or {}).get('land_area') or 0),
+}
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def encode_cursor(sort, key):
+    """Encode the sort key of the last returned record as an opaque cursor"""
+    payload = json.dumps({'s': sort, 'k': list(key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Decode a cursor produced by encode_cursor for the same sort order
+    Returns: tuple: Sort key of the last record on the previous page
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        key = tuple(payload['k'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid pagination cursor')
+    if payload.get('s') != sort or len(key) != 2:
+        raise ValueError('Pagination cursor does not match the requested sort order')
+    return key
+
+
+class RegistrationQuery:
+    """
+    Filters, sort order and page position for a registrations listing
+
+    Pages are addressed by keyset cursors: each cursor carries the
+    (sort value, application_id) of the last record returned, so fetching the
+    next page never depends on offsets that shift as new claims arrive.
+    """
+
+    def __init__(self, status=None, district=None, state=None, date_from=None, date_to=None,
+                 text=None, sort=DEFAULT_SORT, limit=DEFAULT_PAGE_SIZE, cursor=None,
+                 field_filters=None):
+        """
+        Args:
+            status (list): Statuses to include (any of them)
+            district (str): District name, matched case-insensitively
+            state (str): State name, matched case-insensitively
+            field_filters (dict): Any indexed field (tribe, claim_type, forest_type, ...)
+                -> list of accepted values, matched case-insensitively
+            date_from (str): First submission date to include (YYYY-MM-DD)
+            date_to (str): Last submission date to include (YYYY-MM-DD)
+            text (str): Free text; every word must start a word in one of the
+                searchable fields (application ID, names, village, land description)
+            sort (str): Sort field, prefixed with '-' for descending order
+            limit (int): Page size
+            cursor (str): Cursor returned with the previous page
+        """
+        self.sort = sort or DEFAULT_SORT
+        self.descending = self.sort.startswith('-')
+        self.sort_field = self.sort.lstrip('-')
+        if self.sort_field not in SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field '{self.sort_field}'. "
+                             f"Choose from: {', '.join(sorted(SORT_FIELDS))}")
+
+        filters = {'status': list(status or []), 'district': [district], 'state': [state]}
+        for field, accepted in (field_filters or {}).items():
+            accepted = [accepted] if isinstance(accepted, str) else list(accepted or [])
+            filters[field] = filters.get(field, []) + accepted
+        self.field_filters = {}
+        for field, accepted in filters.items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Cannot filter on '{field}'")
+            accepted = [value for value in accepted if normalize_value(value)]
+            if accepted:
+                self.field_filters[field] = accepted
+        self._accepted = {
+            field: {normalize_value(value) for value in accepted}
+            for field, accepted in self.field_filters.items()
+        }
+        self.date_from = _parse_date(date_from, 'from').isoformat() if date_from else None
+        self.date_before = (_parse_date(date_to, 'to') + timedelta(days=1)).isoformat() if date_to else None
+        self.terms = tokenize(text)
+        self.text = ' '.join(self.terms) or None
+
+        self.limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        self.cursor = cursor or None
+        self.after = decode_cursor(cursor, self.sort) if cursor else None
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Build a query from request query-string arguments
+        Args: args: Mapping such as flask.request.args
+        Returns: RegistrationQuery
+        """
+        try:
+            limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("'limit' must be an integer")
+        field_filters = {}
+        for field in INDEXED_FIELDS:
+            values = args.getlist(field) if hasattr(args, 'getlist') else [args.get(field)]
+            accepted = []
+            for value in values:
+                accepted.extend(part.strip() for part in (value or '').split(','))
+            field_filters[field] = accepted
+        return cls(
+            field_filters=field_filters,
+            date_from=args.get('from'),
+            date_to=args.get('to'),
+            text=args.get('q'),
+            sort=args.get('sort', DEFAULT_SORT),
+            limit=limit,
+            cursor=args.get('cursor'),
+        )
+
+    @property
+    def has_residual_filters(self):
+        """Whether any filter (dates, free text) cannot be answered by the field indexes"""
+        return bool(self.date_from or self.date_before or self.text)
+
+    def matches(self, record):
+        """Check whether a registration passes every filter"""
+        for field, accepted in self._accepted.items():
+            if normalize_value(INDEXED_FIELDS[field](record)) not in accepted:
+                return False
+        submitted = record.get('submission_date') or ''
+        if self.date_from and submitted < self.date_from:
+            return False
+        if self.date_before and submitted >= self.date_before:
+            return False
+        if self.terms and not text_matches(record, self.terms):
+            return False
+        return True
+
+    def sort_key(self, record):
+        """Return the (sort value, application_id) key used for ordering and cursors"""
+        return (SORT_FIELDS[self.sort_field](record), record.get('application_id') or '')
+
+    def is_after_cursor(self, key):
+        """Check whether a sort key falls after the cursor in the requested order"""
+        if self.after is None:
+            return True
+        return key < self.after if self.descending else key > self.after
+
+
+def build_page(records, query, total_matching):
+    """
+    Assemble the response page from up to limit + 1 ordered records
+    Args:
+        records (list): Records in the requested order, at most one beyond the page size
+        query (RegistrationQuery): The query that produced them
+        total_matching (int): Number of registrations matching the filters
+    Returns: dict: Page of registrations with pagination details
+    """
+    has_more = len(records) > query.limit
+    page = records[:query.limit]
+    next_cursor = encode_cursor(query.sort, query.sort_key(page[-1])) if has_more else None
+    return {
+        'registrations': page,
+        'pagination': {
+            'limit': query.limit,
+            'sort': query.sort,
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+            'total_matching': total_matching,
+        },
+    }
+
+
+def run_query(records, query):
+    """
+    Evaluate a query over an iterable of registrations in a single pass
+    Only limit + 1 candidates are held at a time, so memory stays bounded by
+    the page size regardless of how many registrations are scanned
+    Returns: dict: See build_page
+    """
+    total_matching = 0
+    candidates = []
+    for record in records:
+        if not query.matches(record):
+            continue
+        total_matching += 1
+        key = query.sort_key(record)
+        if query.is_after_cursor(key):
+            candidates.append((key, record))
+            # Trim periodically instead of maintaining a heap on every insert
+            if len(candidates) > 4 * (query.limit + 1):
+                candidates = _top(candidates, query)
+
+    ordered = [record for key, record in _top(candidates, query)]
+    return build_page(ordered, query, total_matching)
+
+
+class SortIndex:
+    """
+    Registrations in (submission date, application_id) order, for listing pages
+
+    Attach to a store with RegistrationStore.subscribe. Keys are the same
+    (sort value, application_id) pairs cursors carry, so a page in the
+    default order bisects to its cursor and date range and reads the next
+    keys instead of sorting every match. Changes are queued and folded in on
+    the next read: a few by bisection, a replay by one merge sort.
+
+    An order saved with a snapshot (see pack) is read as arrays from the
+    shared mapping; keys of applications changed since are kept in the list
+    and merged with it while a page is read.
+    """
+
+    field = DEFAULT_SORT.lstrip('-')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all keys before a full rebuild"""
+        self._order = []
+        self._added = set()
+        self._removed = set()
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the order saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+
+    def pack(self, rows):
+        """
+        Save the order as arrays for a snapshot: each key's sort value (text) and
+        row, and each row's position
+        Args: rows (dict): application_id -> row of every stored application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        order = self.order()
+        ordered = np.array([rows[application_id] for _, application_id in order], dtype=np.int32)
+        ranks = np.zeros(len(rows), dtype=np.int32)
+        ranks[ordered] = np.arange(len(ordered), dtype=np.int32)
+        values = np.array([value.encode('utf-8') for value, _ in order], dtype=np.bytes_)
+        return {'field': self.field}, {'values': values, 'rows': ordered, 'ranks': ranks}
+
+    @classmethod
+    def key(cls, record):
+        return (SORT_FIELDS[cls.field](record), record.get('application_id') or '')
+
+    def apply(self, old, new):
+        """
+        Move an application's key after an insert, update or removal
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        if self._saved is not None and self._saved.replace((new or old or {}).get('application_id') or ''):
+            # The saved key is skipped from now on; only the new one goes in the list
+            old = None
+        old_key = self.key(old) if old is not None else None
+        new_key = self.key(new) if new is not None else None
+        if old_key == new_key:
+            return
+        if old_key is not None:
+            if old_key in self._added:
+                self._added.discard(old_key)
+            else:
+                self._removed.add(old_key)
+        if new_key is not None:
+            if new_key in self._removed:
+                self._removed.discard(new_key)
+            else:
+                self._added.add(new_key)
+
+    def order(self):
+        """
+        Returns: list: Every registration's key, ascending
+        """
+        if len(self._added) + len(self._removed) > SORT_INDEX_BATCH:
+            order = [key for key in self._order if key not in self._removed] if self._removed else self._order
+            # Two sorted runs: Timsort merges them in linear time
+            order.extend(sorted(self._added))
+            order.sort()
+            self._order = order
+        else:
+            for key in self._removed:
+                position = bisect.bisect_left(self._order, key)
+                if position < len(self._order) and self._order[position] == key:
+                    del self._order[position]
+            for key in self._added:
+                bisect.insort(self._order, key)
+        self._added.clear()
+        self._removed.clear()
+        return self._order
+
+    def page(self, query, accept=None, saved_rows=None):
+        """
+        Application IDs of a page in the default order, without reading any registration
+        Args:
+            query (RegistrationQuery): Query sorted on SortIndex.field, without free text
+            accept (callable): application_id -> whether it passes the field filters
+            saved_rows (numpy.ndarray): The same filters over the snapshot's rows, so
+                saved keys are filtered without looking up their IDs
+        Returns: tuple: (up to query.limit + 1 application IDs in page order,
+            number of registrations in the query's date range)
+        """
+        order = self.order()
+        start, end, (low, high) = self._bounds(query, len(order), lambda key, right: (
+            bisect.bisect_right if right else bisect.bisect_left)(order, key))
+        in_range = max(high - low, 0)
+        keys = (order[position] for position in _positions(query, start, end))
+        if accept is not None:
+            keys = (key for key in keys if accept(key[1]))
+        if self._saved is not None:
+            start, end, (low, high) = self._bounds(query, self._saved.count, self._saved_bisect)
+            in_range += max(high - low, 0)
+            if self._saved.replaced_count and high > low:
+                ranks = self._saved.arrays['ranks'][self._saved.replaced]
+                in_range -= int(np.count_nonzero((ranks >= low) & (ranks < high)))
+            saved = self._saved_keys(query, start, end, saved_rows)
+            if accept is not None and saved_rows is None:
+                saved = (key for key in saved if accept(key[1]))
+            keys = heapq.merge(keys, saved, reverse=query.descending)
+        ids = []
+        for _, application_id in keys:
+            ids.append(application_id)
+            if len(ids) > query.limit:
+                break
+        return ids, in_range
+
+    @staticmethod
+    def _bounds(query, size, bisect_key):
+        """
+        Positions of a page's keys in one sorted run
+        Args: bisect_key (callable): (key, right) -> bisect position of a key in the run
+        Returns: tuple: (start, end) past the cursor, and (start, end) of the whole date range
+        """
+        start = bisect_key((query.date_from,), False) if query.date_from else 0
+        end = bisect_key((query.date_before,), False) if query.date_before else size
+        date_range = (start, end)
+        if query.after is not None:
+            after = tuple(query.after)
+            if query.descending:
+                end = min(end, bisect_key(after, False))
+            else:
+                start = max(start, bisect_key(after, True))
+        return start, end, date_range
+
+    def _saved_bisect(self, key, right):
+        """bisect over the saved keys: a 1-tuple key sorts before every key with its value"""
+        values = self._saved.arrays['values']
+        value = key[0].encode('utf-8')
+        start = int(np.searchsorted(values, value, 'left'))
+        if len(key) == 1:
+            return start
+        end = int(np.searchsorted(values, value, 'right'))
+        ids = self._saved.views.ids[self._saved.arrays['rows'][start:end]]
+        return start + int(np.searchsorted(ids, key[1].encode('utf-8'), 'right' if right else 'left'))
+
+    def _saved_keys(self, query, start, end, accepted=None):
+        """
+        Saved keys between two positions in page order, skipping applications
+        changed since and, given accepted rows, those failing the filters
+        Keys come in growing blocks, so a short page reads few and a sparse
+        filter is still checked a block at a time.
+        """
+        values, rows, replaced = self._saved.arrays['values'], self._saved.arrays['rows'], self._saved.replaced
+        block = SAVED_KEYS_BLOCK
+        while start < end:
+            if query.descending:
+                positions = np.arange(end - 1, max(end - block, start) - 1, -1)
+                end = max(end - block, start)
+            else:
+                positions = np.arange(start, min(start + block, end))
+                start = min(start + block, end)
+            block *= 2
+            found = rows[positions]
+            keep = ~replaced[found]
+            if accepted is not None:
+                keep &= accepted[found]
+            positions, found = positions[keep], found[keep]
+            for value, application_id in zip(values[positions].tolist(), self._saved.views.ids_of(found)):
+                yield value.decode('utf-8'), application_id
+
+
+def _positions(query, start, end):
+    return range(end - 1, start - 1, -1) if query.descending else range(start, end)
+
+
+def merge_pages(pages, query):
+    """
+    Combine the pages several stores (shards) returned for the same query
+    Each page holds its store's first matches after the cursor, so the first
+    query.limit of their union are the first of all the stores together
+    Args:
+        pages (list): Pages from build_page, one per store
+        query (RegistrationQuery): The query every store answered
+    Returns: dict: See build_page
+    """
+    candidates = [(query.sort_key(record), record) for page in pages for record in page['registrations']]
+    ordered = [record for key, record in _top(candidates, query)]
+    page = build_page(ordered, query, sum(page['pagination']['total_matching'] for page in pages))
+    pagination = page['pagination']
+    if not pagination['has_more'] and any(other['pagination']['has_more'] for other in pages):
+        # A store with more to come filled the page on its own
+        pagination['has_more'] = True
+        pagination['next_cursor'] = encode_cursor(query.sort, query.sort_key(page['registrations'][-1]))
+    return page
+
+
+def _top(candidates, query):
+    select = heapq.nlargest if query.descending else heapq.nsmallest
+    return select(query.limit + 1, candidates, key=lambda item: item[0])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compact In-Memory Registration Records
+A slotted representation of registration_data for the records stores keep
+in memory: frequently read fields live in fixed slots, repeated categorical
+values (status, tribe, village, district, ...) are interned so all claims share
+one string object, and rarely read parts (boundaries, remarks, documents, the
+prediction text) stay as compact JSON until the full record is needed
+"""
+
+import sys
+import json
+
+# Slot name, path inside registration_data, and whether the value is categorical (interned)
+FIELDS = (
+    ('application_id', ('application_id',), False),
+    ('submission_date', ('submission_date',), False),
+    ('status', ('status',), True),
+    ('version', ('version',), False),
+    ('applicant_name', ('personal_details', 'applicant_name'), False),
+    ('father_name', ('personal_details', 'father_name'), False),
+    ('tribe', ('personal_details', 'tribe'), True),
+    ('family_members', ('personal_details', 'family_members'), False),
+    ('village', ('personal_details', 'address', 'village'), True),
+    ('tehsil', ('personal_details', 'address', 'tehsil'), True),
+    ('district', ('personal_details', 'address', 'district'), True),
+    ('state', ('personal_details', 'address', 'state'), True),
+    ('claim_type', ('land_details', 'claim_type'), True),
+    ('land_area', ('land_details', 'land_area'), False),
+    ('occupation_since', ('land_details', 'occupation_since'), False),
+    ('forest_type', ('land_details', 'forest_type'), True),
+    ('probability', ('prediction', 'probability'), False),
+    ('assessment', ('prediction', 'assessment'), True),
+    ('recommendation', ('prediction', 'recommendation'), True),
+)
+
+SLOT_INDEX = {path: i for i, (_, path, _) in enumerate(FIELDS)}
+SLOT_NAMES = tuple(name for name, _, _ in FIELDS)
+SCALAR_TYPES = (str, int, float, bool)
+
+# Marks a value kept in the JSON remainder rather than in a slot
+REST = -1
+
+# Key layouts shared by every record with the same shape (every form submission has one)
+_LAYOUTS = {}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _split(record, path, slots, rest):
+    """
+    Walk a record, moving slotted scalars into slots and everything else into rest
+    Returns: tuple: The record's key layout, ((key, child layout | slot index | REST), ...)
+    """
+    layout = []
+    for key, value in record.items():
+        child_path = path + (key,)
+        if isinstance(value, dict):
+            layout.append((key, _split(value, child_path, slots, rest)))
+            continue
+        slot = SLOT_INDEX.get(child_path)
+        if slot is not None and isinstance(value, SCALAR_TYPES):
+            slots[slot] = _intern(value) if FIELDS[slot][2] else value
+            layout.append((key, slot))
+        else:
+            rest.append(value)
+            layout.append((key, REST))
+    return tuple(layout)
+
+
+class RegistrationRecord:
+    """
+    Slotted, memory-compact form of one registration
+
+    Build with from_dict() and turn back into the exact registration_data dict
+    with to_dict(). Slot values are read without decoding anything. The
+    record's key layout is shared with every record of the same shape, and the
+    remaining values are kept as one UTF-8 JSON array, so key order and any
+    unexpected fields survive the round trip.
+    """
+
+    __slots__ = SLOT_NAMES + ('_layout', '_rest')
+
+    @classmethod
+    def from_dict(cls, record):
+        """
+        Args: record (dict): Registration data as built by the registration endpoints
+        Returns: RegistrationRecord
+        """
+        compact = cls.__new__(cls)
+        slots = [None] * len(FIELDS)
+        rest = []
+        layout = _split(record, (), slots, rest)
+        for name, value in zip(SLOT_NAMES, slots):
+            setattr(compact, name, value)
+        compact._layout = _LAYOUTS.setdefault(layout, layout)
+        compact._rest = json.dumps(rest, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return compact
+
+    def to_dict(self):
+        """
+        Decode the full registration
+        Returns: dict: A fresh registration_data dict, safe for the caller to modify
+        """
+        return self._build(self._layout, iter(json.loads(self._rest)))
+
+    def _build(self, layout, rest):
+        record = {}
+        for key, child in layout:
+            if child.__class__ is tuple:
+                record[key] = self._build(child, rest)
+            elif child == REST:
+                record[key] = next(rest)
+            else:
+                record[key] = getattr(self, SLOT_NAMES[child])
+        return record
+
+    def __repr__(self):
+        return f"RegistrationRecord({self.application_id!r}, status={self.status!r})"
+
+
+def compact_record(record):
+    """Convert a registration dict to its compact in-memory form (None passes through)"""
+    return None if record is None else RegistrationRecord.from_dict(record)
+
+
+def expand_record(compact):
+    """Convert a compact record back to a registration dict (None passes through)"""
+    return None if compact is None else compact.to_dict()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+FRA Approval Scoring
+Heuristic approval probability for a land claim, shared by the registration
+servers and the bulk importer so every path scores claims the same way
+"""
+
+
+def calculate_fra_approval_probability(registration_data):
+    """Calculate FRA approval probability based on registration data"""
+    try:
+        land_details = registration_data['land_details']
+        personal_details = registration_data['personal_details']
+
+        # Extract key factors
+        land_area = land_details.get('land_area', 0)
+        family_members = personal_details.get('family_members', 1)
+        occupation_since = land_details.get('occupation_since', 2000)
+        claim_type = land_details.get('claim_type', '')
+
+        # Basic scoring algorithm
+        score = 0.5  # Base score
+
+        # Land area factor (smaller areas have higher approval rates)
+        if land_area <= 2.0:
+            score += 0.2
+        elif land_area <= 4.0:
+            score += 0.1
+        else:
+            score -= 0.1
+
+        # Family size factor
+        if family_members >= 3:
+            score += 0.1
+
+        # Occupation period factor (longer occupation = higher approval)
+        occupation_years = 2005 - occupation_since
+        if occupation_years >= 20:
+            score += 0.2
+        elif occupation_years >= 10:
+            score += 0.1
+
+        # Claim type factor
+        if 'Individual' in claim_type:
+            score += 0.1
+        elif 'Community' in claim_type:
+            score += 0.05
+
+        # Ensure score is between 0 and 1
+        score = max(0.1, min(0.95, score))
+
+        # Determine assessment level
+        if score >= 0.7:
+            assessment = "High"
+            recommendation = "Strong case with good approval chances. Ensure all documents are complete."
+        elif score >= 0.5:
+            assessment = "Medium"
+            recommendation = "Moderate approval chances. Strengthen documentation and community support."
+        else:
+            assessment = "Low"
+            recommendation = "Consider improving documentation and seeking legal assistance."
+
+        return {
+            'probability': round(score, 3),
+            'percentage': f"{score * 100:.1f}%",
+            'assessment': assessment,
+            'recommendation': recommendation,
+            'factors': {
+                'land_area': land_area,
+                'family_size': family_members,
+                'occupation_years': occupation_years,
+                'claim_type': claim_type
+            }
+        }
+
+    except Exception as e:
+        return {
+            'probability': 0.5,
+            'percentage': "50.0%",
+            'assessment': "Unknown",
+            'recommendation': "Unable to calculate. Please ensure all data is provided correctly.",
+            'error': str(e)
+        }
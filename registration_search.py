@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search over Registrations
+An in-memory inverted index over applicant, village and land description
+fields, kept current on every submission, with prefix matching and BM25-style
+ranking so admin searches stay fast however many claims are stored
+"""
+
+import re
+import sys
+import math
+import heapq
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+def _personal(record):
+    return record.get('personal_details') or {}
+
+
+def _land(record):
+    return record.get('land_details') or {}
+
+
+# Searchable fields and their ranking weights; matches in names outrank free text
+SEARCH_FIELDS = {
+    'application_id': (lambda r: r.get('application_id'), 4.0),
+    'applicant_name': (lambda r: _personal(r).get('applicant_name'), 3.0),
+    'father_name': (lambda r: _personal(r).get('father_name'), 2.0),
+    'village': (lambda r: (_personal(r).get('address') or {}).get('village'), 2.0),
+    'tehsil': (lambda r: (_personal(r).get('address') or {}).get('tehsil'), 1.0),
+    'survey_number': (lambda r: _land(r).get('survey_number'), 2.0),
+    'boundaries': (lambda r: _land(r).get('boundaries'), 1.0),
+    'remarks': (lambda r: r.get('remarks'), 1.0),
+}
+
+# Letters and digits, keeping combining marks so Indic script words stay whole
+TOKEN_PATTERN = re.compile(r'(?:[^\W_]|[\u0300-\u036f\u0900-\u0dff])+')
+
+# Score multiplier for a term that only matches as a prefix of an indexed word
+PREFIX_WEIGHT = 0.5
+# BM25 term-frequency saturation
+K1 = 1.2
+
+
+def tokenize(text):
+    """Split text into lowercase search terms"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def record_terms(record):
+    """
+    Weighted term frequencies for a registration's searchable fields
+    Returns: dict: Term -> sum of the weights of every field occurrence
+    """
+    terms = {}
+    for get, weight in SEARCH_FIELDS.values():
+        for term in tokenize(get(record)):
+            terms[term] = terms.get(term, 0.0) + weight
+    return terms
+
+
+def text_matches(record, terms):
+    """Check that every search term is a prefix of some word in the record"""
+    words = record_terms(record)
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+
+class SearchIndex:
+    """
+    Term -> {application_id: weighted frequency} postings with a sorted vocabulary
+
+    Attach to a store with RegistrationStore.subscribe. Every query term
+    matches as a prefix of indexed words (exact words score higher), and all
+    terms must match. The vocabulary is kept sorted so expanding a prefix is a
+    bisect rather than a scan over every term.
+
+    An index saved with a snapshot (see pack) is read as arrays from the
+    shared mapping: the sorted vocabulary and, per term, its rows and weights.
+    Only applications changed since then live in the dictionaries.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop all postings before a full rebuild"""
+        self.postings = {}
+        self.terms = []
+        self.documents = {}
+        self._saved = None
+
+    def attach(self, saved):
+        """
+        Start from the index saved with a snapshot, then apply the changes since
+        Args: saved (SavedView): What pack returned, as mapped from the snapshot
+        """
+        self.reset()
+        self._saved = saved
+        self._vocabulary = _Vocabulary(saved.arrays['vocabulary'], saved.arrays['term_offsets'])
+
+    def pack(self, rows):
+        """
+        Save the index as arrays for a snapshot
+        Args: rows (dict): application_id -> row of every indexed application
+        Returns: tuple: (JSON details, dict of name -> array)
+        """
+        vocabulary = [term.encode('utf-8') for term in self.terms]
+        postings = [sorted((rows[i], weight) for i, weight in self.postings[term].items()) for term in self.terms]
+        pairs = np.array([pair for posting in postings for pair in posting], dtype=float).reshape(-1, 2)
+        return {}, {
+            'vocabulary': np.frombuffer(b''.join(vocabulary), dtype=np.uint8),
+            'term_offsets': np.cumsum([0] + [len(term) for term in vocabulary], dtype=np.int64),
+            'posting_offsets': np.cumsum([0] + [len(posting) for posting in postings], dtype=np.int64),
+            'posting_rows': pairs[:, 0].astype(np.int32),
+            'posting_weights': pairs[:, 1],
+        }
+
+    def __len__(self):
+        """Number of indexed applications"""
+        return len(self.documents) + (len(self._saved) if self._saved is not None else 0)
+
+    def apply(self, old, new):
+        """
+        Re-index an application after an insert or update
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        application_id = (new or old or {}).get('application_id')
+        if not application_id:
+            return
+        if self._saved is not None:
+            self._saved.replace(application_id)
+        for term in self.documents.pop(application_id, ()):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(application_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+        if new is None:
+            return
+        # Interned so every document containing a term shares one string
+        terms = {sys.intern(term): weight for term, weight in record_terms(new).items()}
+        self.documents[application_id] = tuple(terms)
+        for term, weight in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                insort(self.terms, term)
+            postings[application_id] = weight
+
+    def expand(self, prefix):
+        """Return every indexed term starting with prefix"""
+        start = bisect_left(self.terms, prefix)
+        end = start
+        while end < len(self.terms) and self.terms[end].startswith(prefix):
+            end += 1
+        return self.terms[start:end]
+
+    def _variants(self, term):
+        """
+        Indexed terms starting with term and their current postings
+        Returns: list: (variant, postings dict or None, saved (rows, weights) or None,
+            number of applications containing it), in vocabulary order
+        """
+        variants = {variant: [self.postings[variant], None, len(self.postings[variant])]
+                    for variant in self.expand(term)}
+        if self._saved is not None:
+            offsets = self._saved.arrays['posting_offsets']
+            for variant, i in self._vocabulary.expand(term):
+                start, end = offsets[i], offsets[i + 1]
+                rows = self._saved.arrays['posting_rows'][start:end]
+                weights = self._saved.arrays['posting_weights'][start:end]
+                if self._saved.replaced_count:
+                    current = ~self._saved.replaced[rows]
+                    rows, weights = rows[current], weights[current]
+                if len(rows):
+                    entry = variants.setdefault(variant, [None, None, 0])
+                    entry[1] = (rows, weights)
+                    entry[2] += len(rows)
+        return [(variant,) + tuple(variants[variant]) for variant in sorted(variants)]
+
+    def scores(self, terms):
+        """
+        Score every application matching all search terms
+        Args: terms (list): Search terms from tokenize()
+        Returns: dict: Application ID -> relevance score
+        """
+        if not terms:
+            return {}
+        total = len(self)
+        # Evaluate the rarest term first so later terms only probe a small set
+        expanded = []
+        for term in set(terms):
+            variants = self._variants(term)
+            expanded.append((sum(frequency for _, _, _, frequency in variants), term, variants))
+        expanded.sort(key=lambda item: item[:2])
+
+        # Saved rows are scored as arrays, applications changed since in the dictionary
+        scores = None
+        saved_rows = saved_scores = None
+        for _, term, variants in expanded:
+            term_scores = {}
+            term_rows, term_values = [], []
+            for variant, postings, saved, frequency in variants:
+                idf = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+                boost = idf * (1.0 if variant == term else PREFIX_WEIGHT)
+                if saved is not None:
+                    rows, weights = saved
+                    if saved_rows is not None:
+                        current = np.isin(rows, saved_rows, assume_unique=True)
+                        rows, weights = rows[current], weights[current]
+                    term_rows.append(rows)
+                    term_values.append(boost * weights * (K1 + 1) / (weights + K1))
+                if postings is None:
+                    continue
+                if scores is not None:
+                    # Only documents that matched every earlier term can still qualify
+                    if len(scores) < len(postings):
+                        postings = {i: postings[i] for i in scores if i in postings}
+                    else:
+                        postings = {i: w for i, w in postings.items() if i in scores}
+                # Weights are sums of a few field weights, so saturate each distinct one once
+                saturated = {w: boost * w * (K1 + 1) / (w + K1) for w in set(postings.values())}
+                if not term_scores:
+                    term_scores = {i: saturated[w] for i, w in postings.items()}
+                    continue
+                for application_id, weight in postings.items():
+                    score = saturated[weight]
+                    if score > term_scores.get(application_id, 0.0):
+                        term_scores[application_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {i: scores[i] + score for i, score in term_scores.items()}
+            if self._saved is not None:
+                rows, values = _best(term_rows, term_values)
+                if saved_rows is not None:
+                    values = saved_scores[np.searchsorted(saved_rows, rows)] + values
+                saved_rows, saved_scores = rows, values
+            if not scores and (saved_rows is None or not len(saved_rows)):
+                return {}
+        if saved_rows is not None and len(saved_rows):
+            scores.update(zip(self._saved.ids_of(saved_rows), saved_scores.tolist()))
+        return scores
+
+    def search(self, terms, limit):
+        """
+        Rank applications matching all search terms
+        Returns: list: (application_id, score) pairs, best first
+        """
+        scores = self.scores(terms)
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _best(rows, values):
+    """Highest value per row across several (rows, values) arrays, rows sorted"""
+    if not rows:
+        return np.empty(0, dtype=np.int32), np.empty(0)
+    rows, values = np.concatenate(rows), np.concatenate(values)
+    unique, inverse = np.unique(rows, return_inverse=True)
+    best = np.zeros(len(unique))
+    np.maximum.at(best, inverse.reshape(-1), values)
+    return unique, best
+
+
+class _Vocabulary:
+    """Sorted terms saved back to back in one byte array, as a sequence for bisect"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def expand(self, prefix):
+        """Yield (term, position) for every saved term starting with prefix"""
+        i = bisect_left(self, prefix)
+        while i < len(self):
+            term = self[i]
+            if not term.startswith(prefix):
+                return
+            yield term, i
+            i += 1
+
+
+def iter_ranked(scores):
+    """Yield (application_id, score) pairs best first without sorting every match up front"""
+    heap = [(-score, application_id) for application_id, score in scores.items()]
+    heapq.heapify(heap)
+    while heap:
+        score, application_id = heapq.heappop(heap)
+        yield application_id, -score
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Sharded Registration Storage
+Splits the registrations across several independent stores (shards), each
+with its own data folder, files or SQLite database and write lock, so
+imports and status changes landing on different shards commit in parallel
+and each shard's files and views stay a fraction of the whole. New claim
+submissions are checked for duplicates against every shard, so they still
+queue on one cross-shard claims lock. A router sends each write and point
+lookup to the shard that holds the application and fans queries out to
+every shard, merging their pages, counts and aggregates.
+
+New claims are placed on a consistent-hash ring, keyed by application_id or
+by the claim's state (states can also be pinned to a shard). Adding a shard
+to the ring moves only about 1/N of the keys, and existing claims never have
+to move: lookups try the owning shard first and then the others.
+Run as a script to see the shard sizes or to move an unsharded store's
+registrations onto the shards.
+"""
+
+import os
+import sys
+import json
+import heapq
+import bisect
+import hashlib
+import logging
+import argparse
+from collections import Counter, OrderedDict
+
+from registration_store import RegistrationStore
+from registration_stats import statistics_totals
+from registration_query import merge_pages
+from registration_index import INDEXED_FIELDS, normalize_value
+from registration_columns import metric_name
+from registration_duplicates import merge_duplicates
+from registration_parcels import merge_overlaps
+from registration_map import merge_cells
+from registration_anomalies import merge_village_tables
+
+logger = logging.getLogger(__name__)
+
+# Sharding configuration (overridable through the environment)
+SHARD_COUNT = int(os.environ.get('VANMITRA_SHARDS', 1))
+SHARD_KEY = os.environ.get('VANMITRA_SHARD_KEY', 'application_id').lower()
+# Comma-separated state=shard pairs that bypass the ring, e.g. "Odisha=shard-00,Jharkhand=shard-01"
+SHARD_STATES = os.environ.get('VANMITRA_SHARD_STATES', '')
+
+SHARDS_DIRNAME = 'shards'
+CLAIMS_LOCK_FILENAME = 'claims.lock'
+SHARD_KEYS = ('application_id', 'state')
+# Points per shard on the ring; more points spread keys more evenly
+VIRTUAL_NODES = 64
+# Registrations copied per commit when migrating an unsharded store
+MIGRATION_BATCH_SIZE = 500
+# Applications whose shard the router remembers, so lookups by ID alone start there
+HOME_CACHE_SIZE = 10000
+
+
+def shard_names(count):
+    """Names (and folder names) of the first count shards"""
+    return [f"shard-{number:02d}" for number in range(count)]
+
+
+def _hash(value):
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent-hash ring mapping keys onto shard names"""
+
+    def __init__(self, names, virtual_nodes=VIRTUAL_NODES):
+        points = sorted((_hash(f"{name}#{replica}"), name) for name in names for replica in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def shard_for(self, key):
+        """Return the shard owning a key: the first ring point at or after its hash"""
+        position = bisect.bisect_left(self._hashes, _hash(key))
+        return self._names[position % len(self._names)]
+
+
+def parse_state_pins(text, names):
+    """
+    Parse VANMITRA_SHARD_STATES
+    Args:
+        text (str): Comma-separated state=shard pairs
+        names (list): Existing shard names
+    Returns: dict: Normalized state -> shard name
+    Raises: ValueError: A pair is malformed or names an unknown shard
+    """
+    pins = {}
+    for pair in (text or '').split(','):
+        if not pair.strip():
+            continue
+        state, _, name = pair.partition('=')
+        state, name = normalize_value(state), name.strip()
+        if not state or name not in names:
+            raise ValueError(f"Invalid shard pin '{pair.strip()}'. Use <state>=<shard> with a shard from: "
+                             f"{', '.join(names)}")
+        pins[state] = name
+    return pins
+
+
+class ShardedRegistrationStore(RegistrationStore):
+    """
+    Router over several registration stores, one per shard
+
+    Each shard commits its part of a write on its own, so a batch spread over
+    several shards is durable shard by shard rather than all at once. The cold
+    archive, when attached, is shared by all shards and kept by the router.
+    A claim's duplicates and overlaps can sit on any shard, so save_claims()
+    holds the router's claims lock across its checks and commit.
+    """
+
+    def __init__(self, shards, shard_key=SHARD_KEY, state_pins=None, archive=None, claims_lock=None):
+        """
+        Args:
+            shards (dict): Shard name -> RegistrationStore
+            shard_key (str): 'application_id' or 'state': what places a new claim on the ring
+            state_pins (dict): Normalized state -> shard name, bypassing the ring
+            archive (ColdArchive): Cold archive of decided claims (None disables it)
+            claims_lock (FileLock): Cross-process lock serializing checked submissions
+                across the shards (None: this process's writers only)
+        """
+        if shard_key not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key: {shard_key}. Choose from: {', '.join(SHARD_KEYS)}")
+        if not shards:
+            raise ValueError('A sharded store needs at least one shard')
+        super().__init__(archive)
+        self.shards = OrderedDict(shards)
+        self.shard_key = shard_key
+        self.state_pins = dict(state_pins or {})
+        self._ring = HashRing(list(self.shards))
+        self._lock = claims_lock
+        # application_id -> shard last seen holding it; claims never move, so it stays right
+        self._homes = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def shard_for(self, record):
+        """Return the name of the shard a new registration is placed on"""
+        if self.shard_key == 'state':
+            state = normalize_value(INDEXED_FIELDS['state'](record)) or ''
+            return self.state_pins.get(state) or self._ring.shard_for(state)
+        return self._ring.shard_for(record['application_id'])
+
+    def _owner(self, application_id, record=None):
+        """
+        The shard most likely to hold an application: the one it was last found
+        on, else the ring's (or its state's, given the record) shard for it
+        """
+        name = self._homes.get(application_id)
+        if name is not None:
+            return name
+        if self.shard_key == 'state':
+            return self.shard_for(record) if record is not None else None
+        return self._ring.shard_for(application_id)
+
+    def _remember(self, application_id, name):
+        with self._mutex:
+            self._homes[application_id] = name
+            self._homes.move_to_end(application_id)
+            while len(self._homes) > HOME_CACHE_SIZE:
+                self._homes.popitem(last=False)
+
+    def _locate(self, application_id, record=None):
+        """
+        Find the shard holding an application
+        The owner shard (see _owner) is asked first; the others only on a miss,
+        since claims stored before the shard count or pins changed stay put.
+        Args: record (dict): The application's registration, if at hand, to find its state's shard
+        Returns: tuple: (shard name, stored registration), or (None, None)
+        """
+        owner = self._owner(application_id, record)
+        if owner is not None:
+            found = self.shards[owner].get(application_id)
+            if found is not None:
+                return owner, found
+        for name in self.shards:
+            if name == owner:
+                continue
+            found = self.shards[name].get(application_id)
+            if found is not None:
+                self._remember(application_id, name)
+                return name, found
+        return None, None
+
+    def _group(self, items, application_id, record=None, place=False):
+        """
+        Group items by the shard holding their application
+        Args:
+            items (list): Items to route, in order
+            application_id (callable): item -> application_id
+            record (callable): item -> registration, to start at its state's shard
+            place (bool): Send applications not stored yet to the shard for their
+                record (see shard_for) instead of leaving them out
+        Returns: tuple: (OrderedDict of shard name -> items, list of items with no shard)
+        """
+        groups = OrderedDict()
+        missing = []
+        for item in items:
+            registration = record(item) if record is not None else None
+            name, _ = self._locate(application_id(item), registration)
+            if name is None and place:
+                name = self.shard_for(registration)
+                self._remember(application_id(item), name)
+            if name is None:
+                missing.append(item)
+            else:
+                groups.setdefault(name, []).append(item)
+        return groups, missing
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save(self, record):
+        self.save_many([record])
+
+    def save_many(self, records, keep_versions=False):
+        for record in records:
+            if not record.get('application_id'):
+                raise ValueError('Registration record requires an application_id')
+        groups, _ = self._group(records, lambda record: record['application_id'], lambda record: record, place=True)
+        for name, group in groups.items():
+            self.shards[name].save_many(group, keep_versions)
+
+    def update_many(self, updates):
+        groups, missing = self._group(updates, lambda update: update[0])
+        updated = []
+        errors = []
+        for application_id, _ in missing:
+            if self._archived(application_id) is not None:
+                errors.append((application_id, ValueError(f"Application {application_id} is archived; "
+                                                          f"its decision is final")))
+            else:
+                errors.append((application_id, LookupError(f"Application {application_id} not found")))
+        for name, group in groups.items():
+            shard_updated, shard_errors = self.shards[name].update_many(group)
+            updated.extend(shard_updated)
+            errors.extend(shard_errors)
+        return updated, errors
+
+    def remove_many(self, records):
+        groups, _ = self._group(records, lambda record: record['application_id'], lambda record: record)
+        removed = []
+        for name, group in groups.items():
+            removed.extend(self.shards[name].remove_many(group))
+        return removed
+
+    # ------------------------------------------------------------------
+    # Point lookups and scans
+    # ------------------------------------------------------------------
+
+    def get(self, application_id):
+        _, record = self._locate(application_id)
+        return record if record is not None else self._archived(application_id)
+
+    def iter_records(self):
+        # Application IDs start with the submission time, so merging on them keeps submission order
+        return heapq.merge(*(shard.iter_records() for shard in self.shards.values()),
+                           key=lambda record: record['application_id'])
+
+    def count(self):
+        return sum(shard.count() for shard in self.shards.values())
+
+    def subscribe(self, listener, replay=True):
+        with self._mutex:
+            if replay:
+                listener.reset()
+                for record in self.iter_records():
+                    listener.apply(None, record)
+            for shard in self.shards.values():
+                shard.subscribe(listener, replay=False)
+
+    def _sync(self):
+        for shard in self.shards.values():
+            shard._sync()
+
+    # ------------------------------------------------------------------
+    # Scatter-gather queries
+    # ------------------------------------------------------------------
+
+    def _active_duplicates(self, record):
+        return merge_duplicates(*(shard.duplicates(record) for shard in self.shards.values()))
+
+    def _active_overlaps(self, record):
+        return merge_overlaps(*(shard.overlapping_claims(record) for shard in self.shards.values()))
+
+    def _active_map_cells(self, bbox, zoom):
+        return merge_cells([shard.map_cells(bbox, zoom) for shard in self.shards.values()], zoom)
+
+    def _active_village_counts(self):
+        return merge_village_tables([shard.village_counts() for shard in self.shards.values()])
+
+    def iter_matching(self, query):
+        return heapq.merge(*(shard.iter_matching(query) for shard in self.shards.values()),
+                           key=lambda record: record['application_id'])
+
+    def query(self, query):
+        return merge_pages([shard.query(query) for shard in self.shards.values()], query)
+
+    def facets(self, query, fields):
+        merged = {field: {} for field in fields}
+        labels = {field: {} for field in fields}
+        total_matching = 0
+        for shard in self.shards.values():
+            facets, matching = shard.facets(query, fields)
+            total_matching += matching
+            for field, counts in facets.items():
+                for label, count in counts.items():
+                    # Shards may spell a value differently; the first spelling seen is shown
+                    label = labels[field].setdefault(normalize_value(label), label)
+                    merged[field][label] = merged[field].get(label, 0) + count
+        return {
+            field: dict(sorted(counts.items(), key=lambda item: -item[1])) for field, counts in merged.items()
+        }, total_matching
+
+    def aggregate(self, query, group_by, metrics):
+        # Means do not add up; each shard reports the sum and count behind them instead
+        requested = list(metrics)
+        partial = list(OrderedDict.fromkeys(
+            [('count', None)] + [metric for metric in requested if metric[0] != 'mean'] +
+            [(aggregate, field) for mean, field in requested if mean == 'mean' for aggregate in ('sum', 'count')]
+        ))
+        groups = OrderedDict()
+        total = 0
+        for shard in self.shards.values():
+            shard_groups, aggregated = shard.aggregate(query, group_by, partial)
+            total += aggregated
+            for entry in shard_groups:
+                key = tuple(
+                    normalize_value(value) if isinstance(value, str) else value
+                    for value in (entry['key'][field] for field, _ in group_by)
+                )
+                merged = groups.get(key)
+                if merged is None:
+                    groups[key] = dict(entry)
+                    continue
+                for aggregate, field in partial:
+                    name = metric_name(aggregate, field)
+                    merged[name] = _combine(aggregate, merged.get(name), entry.get(name))
+
+        results = []
+        for merged in groups.values():
+            entry = {'key': merged['key']}
+            for aggregate, field in requested:
+                name = metric_name(aggregate, field)
+                if aggregate == 'mean':
+                    valid = merged.get(metric_name('count', field)) or 0
+                    entry[name] = merged[metric_name('sum', field)] / valid if valid else None
+                else:
+                    entry[name] = merged.get(name)
+            entry.setdefault('count', merged['count'])
+            results.append(entry)
+        results.sort(key=lambda entry: -entry['count'])
+        return results, total
+
+    def search(self, query):
+        if not query.terms:
+            raise ValueError("A search needs some text in 'q'")
+        # Scores are ranked within each shard, so relevance across shards is approximate
+        results = [result for shard in self.shards.values() for result in shard.search(query)]
+        results.sort(key=lambda result: (-result[1], result[0]['application_id']))
+        return results[:query.limit]
+
+    def statistics(self):
+        totals = Counter()
+        for shard in self.shards.values():
+            totals.update(statistics_totals(shard.statistics()))
+        return self._format_statistics(totals)
+
+    def version(self):
+        return sum(shard.version() for shard in self.shards.values()) + self._archive_version()
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+
+
+def _combine(aggregate, first, second):
+    """Combine one metric of the same group from two shards (None means no value)"""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    if aggregate == 'min':
+        return min(first, second)
+    if aggregate == 'max':
+        return max(first, second)
+    return first + second
+
+
+def migrate(source, store, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Copy the registrations of an unsharded store onto the shards
+    Applications already on a shard are skipped, so an interrupted migration can be
+    rerun. Records keep their versions, so the ETags clients cached stay valid.
+    Args:
+        source (RegistrationStore): Unsharded store to copy from (left unchanged)
+        store (ShardedRegistrationStore): Destination
+    Returns: dict: Number of registrations copied and skipped
+    """
+    copied = skipped = 0
+    batch = []
+    for record in source.iter_records():
+        if store._locate(record['application_id'])[0] is not None:
+            skipped += 1
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            store.save_many(batch, keep_versions=True)
+            copied += len(batch)
+            batch = []
+    if batch:
+        store.save_many(batch, keep_versions=True)
+        copied += len(batch)
+    logger.info(f"Migrated {copied} registrations onto {len(store.shards)} shards ({skipped} already there)")
+    return {'copied': copied, 'skipped': skipped}
+
+
+def main(argv=None):
+    from registration_store import create_registration_store, get_registration_store
+
+    parser = argparse.ArgumentParser(description='Show or populate the registration shards')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Copy the registrations of the unsharded store in the data folder onto the shards')
+    args = parser.parse_args(argv)
+
+    store = get_registration_store()
+    if not isinstance(store, ShardedRegistrationStore):
+        logger.error('Sharding is off; set VANMITRA_SHARDS to the number of shards')
+        return 1
+    report = {}
+    if args.migrate:
+        report['migration'] = migrate(create_registration_store(shards=1), store)
+    report['shard_key'] = store.shard_key
+    report['shards'] = {name: shard.count() for name, shard in store.shards.items()}
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Memory-Mapped Registration Snapshots
+A compact, read-only binary image of the registry that every gunicorn worker
+maps into memory, so point lookups and scans read shared page-cache pages
+instead of each worker holding its own index of every registration
+
+Layout (little-endian):
+    header   magic, format, record count, section offsets
+    heap     application IDs and record JSON, back to back
+    rows     fixed-width rows sorted by application_id for binary search
+    order    row numbers in submission order, for scans
+    views    optional: derived views of the same records as flat arrays
+             (JSON directory, then 8-byte aligned array data)
+    meta     JSON: log positions covered, statistics, status dictionary,
+             views section
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+
+import numpy as np
+
+from registration_stats import RegistrationStatistics, record_version
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VMSNAP\x00\x01'
+FORMAT = 1
+
+# magic, format, count, heap offset, rows offset, order offset, meta offset, meta length
+HEADER = struct.Struct('<8sIIQQQQI')
+# id offset, id length, record offset, record length, version, status code, reserved
+ROW = struct.Struct('<QIQIIHH')
+ORDER = struct.Struct('<I')
+# Length of the views section's JSON directory
+VIEWS_HEADER = struct.Struct('<I')
+ALIGNMENT = 8
+
+
+def write_snapshot(path, records, positions, views=None, views_meta=None):
+    """
+    Write a snapshot atomically (temp file, fsync, rename)
+    Args:
+        path (str): Snapshot file path
+        records: Iterable of the latest version of every registration
+        positions (dict): Log position the snapshot covers, {segment: [inode, offset]}
+        views (dict): Name -> empty derived view (reset(), apply(old, new) and
+            pack(rows)); each is fed every record and saved as arrays indexed by row
+        views_meta (dict): JSON-friendly details readers check before using the views
+    Returns: int: Number of registrations written
+    """
+    temp_path = path + '.tmp'
+    statistics = RegistrationStatistics()
+    statuses = {}
+    rows = []
+    with open(temp_path, 'wb') as f:
+        f.write(b'\x00' * HEADER.size)
+        offset = HEADER.size
+        for record in records:
+            application_id = record['application_id'].encode('utf-8')
+            data = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            status = statuses.setdefault(str(record.get('status')), len(statuses))
+            f.write(application_id)
+            f.write(data)
+            rows.append((application_id, offset, offset + len(application_id), len(data),
+                         record_version(record), status))
+            offset += len(application_id) + len(data)
+            statistics.apply(None, record)
+            for view in (views or {}).values():
+                view.apply(None, record)
+
+        heap_end = offset
+        order = sorted(range(len(rows)), key=lambda i: rows[i][0])
+        # position of each row in the sorted table, in submission order
+        rank = [0] * len(rows)
+        for sorted_position, i in enumerate(order):
+            rank[i] = sorted_position
+        for i in order:
+            application_id, id_offset, data_offset, data_length, version, status = rows[i]
+            f.write(ROW.pack(id_offset, len(application_id), data_offset, data_length, version, status, 0))
+        order_offset = heap_end + ROW.size * len(rows)
+        f.write(b''.join(ORDER.pack(r) for r in rank))
+
+        views_offset = order_offset + ORDER.size * len(rows)
+        views_length = 0
+        if views is not None:
+            padding = -views_offset % ALIGNMENT
+            f.write(b'\x00' * padding)
+            views_offset += padding
+            ids = [rows[i][0] for i in order]
+            views_length = _write_views(f, ids, views, views_meta)
+        meta_offset = views_offset + views_length
+        meta = {
+            'positions': positions,
+            'statistics': statistics.get_state(),
+            'statuses': sorted(statuses, key=statuses.get),
+        }
+        if views is not None:
+            meta['views'] = [views_offset, views_length]
+        meta = json.dumps(meta).encode('utf-8')
+        f.write(meta)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT, len(rows), HEADER.size, heap_end, order_offset,
+                            meta_offset, len(meta)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(rows)
+
+
+def _write_views(f, ids, views, views_meta):
+    """
+    Pack derived views into the views section at the file's current (aligned) position
+    Args:
+        ids (list): Encoded application IDs in row order
+    Returns: int: Bytes written
+    """
+    rows = {application_id.decode('utf-8'): row for row, application_id in enumerate(ids)}
+    arrays = {'ids': np.array(ids, dtype=f"S{max(map(len, ids), default=1)}")}
+    directory = {'meta': dict(views_meta or {}, views={}), 'arrays': {}}
+    for name, view in views.items():
+        meta, packed = view.pack(rows)
+        directory['meta']['views'][name] = meta
+        arrays.update((f"{name}.{key}", array) for key, array in packed.items())
+    data_offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise ValueError(f"View array {name} holds Python objects")
+        directory['arrays'][name] = [array.dtype.str, list(array.shape), data_offset]
+        data_offset += array.nbytes + (-array.nbytes % ALIGNMENT)
+    directory = json.dumps(directory, separators=(',', ':')).encode('utf-8')
+    start = VIEWS_HEADER.size + len(directory)
+    f.write(VIEWS_HEADER.pack(len(directory)))
+    f.write(directory)
+    f.write(b'\x00' * (-start % ALIGNMENT))
+    written = start + (-start % ALIGNMENT)
+    for array in arrays.values():
+        f.write(array.tobytes())
+        f.write(b'\x00' * (-array.nbytes % ALIGNMENT))
+        written += array.nbytes + (-array.nbytes % ALIGNMENT)
+    return written
+
+
+class RegistrySnapshot:
+    """
+    Read-only view over a snapshot file mapped with mmap
+
+    The mapping is shared through the page cache by every process that opens
+    the same file. Rows are fixed width, so a lookup is a binary search over
+    the row table touching a handful of pages, and only the matched record's
+    JSON is decoded.
+    """
+
+    def __init__(self, path):
+        """
+        Args: path (str): Snapshot file written by write_snapshot
+        Raises: ValueError if the file is not a readable snapshot
+        """
+        with open(path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"Snapshot {path} is truncated")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, count, _, rows_offset, order_offset, meta_offset, meta_length = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"Snapshot {path} has an unsupported format")
+        self.count = count
+        self._rows_offset = rows_offset
+        self._order_offset = order_offset
+        meta = json.loads(self._map[meta_offset:meta_offset + meta_length])
+        self.positions = {int(segment): tuple(position) for segment, position in meta['positions'].items()}
+        self.statistics = meta['statistics']
+        self.statuses = meta['statuses']
+        self._views = meta.get('views')
+
+    def _row(self, i):
+        return ROW.unpack_from(self._map, self._rows_offset + i * ROW.size)
+
+    def record_at(self, i):
+        """Return the registration in row i of the sorted row table"""
+        row = self._row(i)
+        return json.loads(self._map[row[2]:row[2] + row[3]])
+
+    def _find(self, application_id):
+        """Binary search the sorted row table; returns the row or None"""
+        key = application_id.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            row = self._row(middle)
+            current = self._map[row[0]:row[0] + row[1]]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return row
+        return None
+
+    def __contains__(self, application_id):
+        return self._find(application_id) is not None
+
+    def version_of(self, application_id):
+        """Return the snapshot's version of a registration without decoding it, or None"""
+        row = self._find(application_id)
+        return row[4] if row is not None else None
+
+    def get(self, application_id):
+        """Return the snapshot's copy of a registration, or None"""
+        row = self._find(application_id)
+        if row is None:
+            return None
+        return json.loads(self._map[row[2]:row[2] + row[3]])
+
+    def iter_entries(self):
+        """
+        Yield registrations in submission order without decoding their JSON
+        Yields: tuple: (application_id, raw record bytes)
+        """
+        for i in range(self.count):
+            (sorted_position,) = ORDER.unpack_from(self._map, self._order_offset + i * ORDER.size)
+            row = self._row(sorted_position)
+            yield self._map[row[0]:row[0] + row[1]].decode('utf-8'), self._map[row[2]:row[2] + row[3]]
+
+    def iter_records(self):
+        """Yield every registration in submission order"""
+        for _, data in self.iter_entries():
+            yield json.loads(data)
+
+    def views(self):
+        """
+        Returns: SnapshotViews or None: The derived views saved with the snapshot,
+            if any and readable
+        """
+        if self._views is None:
+            return None
+        offset, length = self._views
+        try:
+            return SnapshotViews(self, offset, length)
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable views in the registration snapshot: {str(e)}")
+            return None
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # Arrays from views() still point into the mapping; it closes when they are dropped
+            pass
+
+
+class SnapshotViews:
+    """
+    Derived views saved with a snapshot, as read-only arrays over its mapping
+
+    Arrays are plain numbers and fixed-width bytes described by a JSON
+    directory, so loading them runs no code from the file and copies nothing:
+    every worker reads the same page-cache pages. Row i of every view is the
+    registration in row i of the snapshot's sorted row table.
+    """
+
+    def __init__(self, snapshot, offset, length):
+        """
+        Args:
+            snapshot (RegistrySnapshot): Snapshot holding the views section
+            offset, length (int): Position of the views section in the file
+        Raises: ValueError: The section is malformed
+        """
+        self.snapshot = snapshot
+        buffer = snapshot._map
+        (size,) = VIEWS_HEADER.unpack_from(buffer, offset)
+        start = offset + VIEWS_HEADER.size
+        directory = json.loads(buffer[start:start + size])
+        start += size
+        data = start + (-start % ALIGNMENT)
+        self.meta = directory['meta']
+        self.arrays = {}
+        for name, (descr, shape, array_offset) in directory['arrays'].items():
+            dtype = np.dtype(descr)
+            if dtype.hasobject:
+                raise ValueError(f"View array {name} holds Python objects")
+            count = int(np.prod(shape, dtype=np.int64))
+            if data + array_offset + count * dtype.itemsize > offset + length:
+                raise ValueError(f"View array {name} runs past the views section")
+            self.arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                              offset=data + array_offset).reshape(shape)
+        self.ids = self.arrays['ids']
+        self.count = len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.meta['views']
+
+    def view(self, name):
+        """Return one saved view (see SavedView)"""
+        return SavedView(self, name)
+
+    def row(self, application_id):
+        """Row of an application, or None if the snapshot does not hold it"""
+        key = application_id.encode('utf-8')
+        row = int(np.searchsorted(self.ids, key))
+        return row if row < self.count and self.ids[row] == key else None
+
+    def id_of(self, row):
+        return self.ids[row].decode('utf-8')
+
+    def ids_of(self, rows):
+        """Application IDs of several rows, in the same order"""
+        return [application_id.decode('utf-8') for application_id in self.ids[rows].tolist()]
+
+    def record(self, row):
+        """Return the registration in a row"""
+        return self.snapshot.record_at(row)
+
+
+class SavedView:
+    """
+    One derived view saved with a snapshot, and the rows it has since lost
+
+    A view built on a saved one keeps the registrations changed after the
+    snapshot in its own dictionaries and skips their saved rows, which are
+    marked here; that set stays as small as the log after the snapshot.
+    """
+
+    def __init__(self, views, name):
+        """
+        Args:
+            views (SnapshotViews): Views section holding it
+            name (str): Name the view was saved under
+        """
+        self.views = views
+        self.meta = views.meta['views'][name]
+        prefix = f"{name}."
+        self.arrays = {key[len(prefix):]: array for key, array in views.arrays.items() if key.startswith(prefix)}
+        self.count = views.count
+        self.replaced = np.zeros(self.count, dtype=bool)
+        self.replaced_count = 0
+
+    def __len__(self):
+        """Saved rows still current"""
+        return self.count - self.replaced_count
+
+    def replace(self, application_id):
+        """
+        Stop using an application's saved row once it changes
+        Returns: bool: Whether it had a current saved row
+        """
+        row = self.views.row(application_id)
+        if row is None or self.replaced[row]:
+            return False
+        self.replaced[row] = True
+        self.replaced_count += 1
+        return True
+
+    def current(self, rows):
+        """The rows among rows (an array) that have not been replaced"""
+        return rows[~self.replaced[rows]] if self.replaced_count else rows
+
+    def rows_of(self, application_ids):
+        """
+        Current saved rows of several applications
+        Returns: numpy.ndarray: Row per application, -1 where it has none
+        """
+        keys = np.array([application_id.encode('utf-8') for application_id in application_ids], dtype=np.bytes_)
+        if not self.count:
+            return np.full(len(keys), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.views.ids, keys), self.count - 1)
+        found = (self.views.ids[rows] == keys) & ~self.replaced[rows]
+        return np.where(found, rows, -1)
+
+    def take(self, name, rows, fill=0):
+        """Values of one of the view's arrays at rows from rows_of, fill where there is none"""
+        array = self.arrays[name]
+        if not self.count:
+            return np.full(len(rows), fill, dtype=array.dtype)
+        return np.where(rows >= 0, array[rows], fill)
+
+    def row(self, application_id):
+        """Current saved row of an application, or None"""
+        row = self.views.row(application_id)
+        return row if row is not None and not self.replaced[row] else None
+
+    def ids_of(self, rows):
+        return self.views.ids_of(rows)
+
+    def record(self, row):
+        return self.views.record(row)
+
+
+def open_snapshot(path):
+    """
+    Map a snapshot if one exists and is readable
+    Returns: RegistrySnapshot or None
+    """
+    try:
+        return RegistrySnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable registration snapshot {path}: {str(e)}")
+        return None
@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+"""
+SQLite Registration Repository for VanMitra
+Optional storage backend using the standard library sqlite3 module in WAL mode,
+so gunicorn workers can read concurrently and look up applications by index
+"""
+
+import os
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from registration_store import RegistrationStore, apply_updates
+from registration_stats import RegistrationStatistics, statistics_delta, record_version, VERSIONS_KEY
+from registration_query import build_page
+from registration_index import INDEXED_FIELDS
+from registration_duplicates import claim_keys, is_active, key_fingerprint
+from registration_map import (
+    MAX_CLUSTER_ZOOM, MAX_POINTS, claim_location, grid_cell, cell_ranges, cell_key, status_group
+)
+from registration_search import SEARCH_FIELDS
+from registration_parcels import claim_parcel, bounding_box, find_overlaps, check_new_claims
+
+logger = logging.getLogger(__name__)
+
+# Indexed filter columns, named after the registration_index fields they mirror
+FILTER_COLUMNS = ('status', 'district', 'state', 'tribe', 'claim_type', 'forest_type')
+# Claim coordinates and their finest registration_map grid cell
+LOCATION_COLUMNS = (('latitude', 'REAL'), ('longitude', 'REAL'), ('map_x', 'INTEGER'), ('map_y', 'INTEGER'))
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS registrations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        application_id TEXT NOT NULL UNIQUE,
+        status TEXT,
+        district TEXT,
+        state TEXT,
+        tribe TEXT,
+        claim_type TEXT,
+        forest_type TEXT,
+        submission_date TEXT,
+        latitude REAL,
+        longitude REAL,
+        map_x INTEGER,
+        map_y INTEGER,
+        data TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS registration_stats (
+        key TEXT PRIMARY KEY,
+        value REAL NOT NULL
+    )
+    """,
+    # Keyed digests of each active claim's Aadhaar number and land parcel (registration_duplicates)
+    """
+    CREATE TABLE IF NOT EXISTS registration_claim_keys (
+        field TEXT NOT NULL,
+        digest BLOB NOT NULL,
+        application_id TEXT NOT NULL,
+        PRIMARY KEY (field, digest, application_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS registration_settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+]
+
+# Created after migrating older databases, which lack the newer filter columns
+INDEXES = [
+    "DROP INDEX IF EXISTS idx_registrations_status",
+    "CREATE INDEX IF NOT EXISTS idx_registrations_submission_date ON registrations (submission_date)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS idx_registrations_{column} ON registrations ({column} COLLATE NOCASE)"
+    for column in FILTER_COLUMNS if column != 'status'
+] + [
+    "CREATE INDEX IF NOT EXISTS idx_registrations_status_nocase ON registrations (status COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_registration_claim_keys_application ON registration_claim_keys (application_id)",
+    "CREATE INDEX IF NOT EXISTS idx_registrations_map_cell ON registrations (map_x, map_y) WHERE map_x IS NOT NULL",
+]
+
+# FTS5 table mirroring the searchable fields, keyed by registrations.id; combining
+# marks count as word characters so Indic script words stay whole
+SEARCH_TABLE_SQL = f"""
+    CREATE VIRTUAL TABLE registration_search USING fts5(
+        {', '.join(SEARCH_FIELDS)},
+        tokenize = "unicode61 remove_diacritics 0 categories 'L* N* Co M*'",
+        prefix = '2 3'
+    )
+"""
+SEARCH_INSERT_SQL = (
+    f"INSERT INTO registration_search (rowid, {', '.join(SEARCH_FIELDS)}) "
+    f"VALUES (?, {', '.join('?' for _ in SEARCH_FIELDS)})"
+)
+SEARCH_DELETE_SQL = "DELETE FROM registration_search WHERE rowid = ?"
+# bm25() ranks better matches lower; negate it and weight columns like the in-memory index
+SEARCH_SCORE = f"-bm25(registration_search, {', '.join(str(w) for _, w in SEARCH_FIELDS.values())})"
+
+# Statements are kept as module constants so sqlite3's per-connection
+# statement cache reuses the prepared form on every call
+UPSERT_SQL = """
+    INSERT INTO registrations (application_id, status, district, state, tribe, claim_type,
+                               forest_type, submission_date, latitude, longitude, map_x, map_y, data)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (application_id) DO UPDATE SET
+        status = excluded.status,
+        district = excluded.district,
+        state = excluded.state,
+        tribe = excluded.tribe,
+        claim_type = excluded.claim_type,
+        forest_type = excluded.forest_type,
+        submission_date = excluded.submission_date,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        map_x = excluded.map_x,
+        map_y = excluded.map_y,
+        data = excluded.data
+"""
+LOCATION_BACKFILL_SQL = "UPDATE registrations SET latitude = ?, longitude = ?, map_x = ?, map_y = ? WHERE id = ?"
+BACKFILL_SQL = """
+    UPDATE registrations SET status = ?, district = ?, state = ?, tribe = ?, claim_type = ?,
+                             forest_type = ?, submission_date = ?
+    WHERE id = ?
+"""
+GET_SQL = "SELECT data FROM registrations WHERE application_id = ?"
+ROW_ID_SQL = "SELECT id FROM registrations WHERE application_id = ?"
+ROW_SQL = "SELECT id, data FROM registrations WHERE application_id = ?"
+DELETE_SQL = "DELETE FROM registrations WHERE id = ?"
+SCAN_SQL = "SELECT id, data FROM registrations WHERE id > ? ORDER BY id LIMIT ?"
+COUNT_SQL = "SELECT COUNT(*) FROM registrations"
+STATS_SQL = "SELECT key, value FROM registration_stats"
+VERSION_SQL = "SELECT value FROM registration_stats WHERE key = ?"
+STATS_DELTA_SQL = """
+    INSERT INTO registration_stats (key, value) VALUES (?, ?)
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value
+"""
+CLAIM_KEYS_DELETE_SQL = "DELETE FROM registration_claim_keys WHERE application_id = ?"
+CLAIM_KEYS_INSERT_SQL = "INSERT OR IGNORE INTO registration_claim_keys (field, digest, application_id) VALUES (?, ?, ?)"
+CLAIM_KEYS_FIND_SQL = "SELECT application_id FROM registration_claim_keys WHERE field = ? AND digest = ?"
+SETTING_SQL = "SELECT value FROM registration_settings WHERE key = ?"
+SET_SETTING_SQL = "INSERT OR REPLACE INTO registration_settings (key, value) VALUES (?, ?)"
+DELETE_SETTING_SQL = "DELETE FROM registration_settings WHERE key = ?"
+DUPLICATE_KEY_SETTING = 'duplicate_key_fingerprint'
+# Clusters per finest-grid cell group; the shift coarsens cells to the requested zoom
+MAP_CELL_FILTER = "map_x BETWEEN ? AND ? AND map_y BETWEEN ? AND ?"
+MAP_CLUSTER_SQL = f"""
+    SELECT map_x >> ?, map_y >> ?, status, COUNT(*), SUM(latitude), SUM(longitude)
+    FROM registrations WHERE {MAP_CELL_FILTER}
+    GROUP BY 1, 2, 3
+"""
+MAP_POINTS_SQL = f"SELECT application_id, latitude, longitude, status FROM registrations WHERE {MAP_CELL_FILTER}"
+# R*Tree of the bounding boxes of active claims' parcels, keyed by registrations.id
+PARCEL_TABLE_SQL = "CREATE VIRTUAL TABLE registration_parcels USING rtree(id, min_lon, max_lon, min_lat, max_lat)"
+PARCEL_INSERT_SQL = "INSERT INTO registration_parcels (id, min_lon, max_lon, min_lat, max_lat) VALUES (?, ?, ?, ?, ?)"
+PARCEL_DELETE_SQL = "DELETE FROM registration_parcels WHERE id = ?"
+PARCEL_CANDIDATES_SQL = """
+    SELECT registrations.data FROM registration_parcels
+    JOIN registrations ON registrations.id = registration_parcels.id
+    WHERE min_lon <= ? AND max_lon >= ? AND min_lat <= ? AND max_lat >= ?
+"""
+
+SCAN_BATCH_SIZE = 500
+
+# Sort fields that map onto indexed columns; other sorts fall back to a scan
+SQL_SORT_COLUMNS = {
+    'submission_date': 'submission_date',
+    'application_id': 'application_id',
+    'status': 'status',
+}
+
+
+def indexed_columns(record):
+    """
+    Extract the indexed column values from a registration record
+    Returns: tuple: FILTER_COLUMNS values followed by submission_date
+    """
+    values = []
+    for column in FILTER_COLUMNS:
+        value = INDEXED_FIELDS[column](record)
+        values.append(str(value).strip() if value is not None else None)
+    return tuple(values) + (record.get('submission_date'),)
+
+
+def location_columns(record):
+    """
+    Extract the location column values from a registration record
+    Returns: tuple: latitude, longitude and finest grid cell (all None without coordinates)
+    """
+    location = claim_location(record)
+    if location is None:
+        return (None, None, None, None)
+    return location + grid_cell(*location)
+
+
+def parcel_box(record):
+    """
+    R*Tree entry values for a registration
+    Returns: tuple or None: (min lon, max lon, min lat, max lat) of an active claim's parcel
+    """
+    geometry = claim_parcel(record)
+    if geometry is None or not is_active(record):
+        return None
+    west, south, east, north = bounding_box(geometry)
+    return west, east, south, north
+
+
+def search_columns(record):
+    """Extract the full-text searchable field values from a registration record"""
+    return tuple(
+        str(value) if value is not None else None
+        for value in (get(record) for get, _ in SEARCH_FIELDS.values())
+    )
+
+
+def match_expression(terms):
+    """Build an FTS5 query requiring every term as a word prefix"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SQLiteRegistrationStore(RegistrationStore):
+    """
+    Registration repository backed by a SQLite database in WAL mode
+
+    Each thread of each worker process gets its own connection, created lazily
+    and reused for the life of the thread. WAL lets readers proceed while a
+    single writer commits, and SQLite's own locking serializes writers across
+    gunicorn workers so concurrent submissions are never lost.
+
+    Dashboard statistics live in a small registration_stats table that is
+    adjusted in the same transaction as each write, so reading them never
+    scans the registrations table. Free-text search uses an FTS5 table kept
+    in step with the registrations the same way, as are the table of keyed
+    Aadhaar and land-parcel digests used to spot duplicate claims and the
+    R*Tree of parcel bounding boxes used to find overlapping boundaries.
+    """
+
+    def __init__(self, path, legacy_file=None, timeout=30.0, duplicate_key=None, archive=None):
+        """
+        Args:
+            path (str): Database file path
+            legacy_file (str): JSON array file imported when the database is empty
+            timeout (float): Seconds to wait for another writer before failing
+            duplicate_key (bytes): Secret for the duplicate-claim digests (None disables them)
+            archive (ColdArchive): Cold archive of decided claims (None disables it)
+        """
+        self.path = path
+        self.timeout = timeout
+        self._duplicate_key = duplicate_key
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        super().__init__(archive)
+
+        with self._transaction() as connection:
+            for statement in TABLES:
+                connection.execute(statement)
+            self._migrate(connection)
+            for statement in INDEXES:
+                connection.execute(statement)
+            self._full_text = self._create_search_table(connection)
+            self._spatial = self._create_parcel_table(connection)
+
+        if legacy_file and os.path.exists(legacy_file) and self.count() == 0:
+            self._import_legacy(legacy_file)
+
+        with self._transaction() as connection:
+            self._check_claim_keys(connection)
+
+        totals = dict(self._connection().execute(STATS_SQL).fetchall())
+        if self.count() and (not totals.get('total_applications') or VERSIONS_KEY not in totals):
+            self._rebuild_statistics()
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use or after a fork"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, cached_statements=64, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA busy_timeout={int(self.timeout * 1000)}')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """Run a write transaction that holds SQLite's write lock from the start"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _migrate(self, connection):
+        """Add filter columns missing from databases created by older versions"""
+        existing = {row[1] for row in connection.execute('PRAGMA table_info(registrations)')}
+        self._migrate_locations(connection, existing)
+        missing = [column for column in FILTER_COLUMNS if column not in existing]
+        if not missing:
+            return
+        for column in missing:
+            connection.execute(f'ALTER TABLE registrations ADD COLUMN {column} TEXT')
+        rows = connection.execute('SELECT id, data FROM registrations').fetchall()
+        connection.executemany(
+            BACKFILL_SQL, [indexed_columns(json.loads(data)) + (row_id,) for row_id, data in rows]
+        )
+        logger.info(f"Added columns {', '.join(missing)} to {len(rows)} registrations")
+
+    def _migrate_locations(self, connection, existing):
+        """Add the location columns to databases created before claims had coordinates"""
+        missing = [(column, kind) for column, kind in LOCATION_COLUMNS if column not in existing]
+        if not missing:
+            return
+        for column, kind in missing:
+            connection.execute(f'ALTER TABLE registrations ADD COLUMN {column} {kind}')
+        rows = connection.execute('SELECT id, data FROM registrations').fetchall()
+        connection.executemany(LOCATION_BACKFILL_SQL, [
+            location_columns(record) + (row_id,)
+            for row_id, record in ((row_id, json.loads(data)) for row_id, data in rows)
+            if claim_location(record) is not None
+        ])
+        logger.info(f"Added location columns to {len(rows)} registrations")
+
+    def _create_search_table(self, connection):
+        """
+        Create the full-text search table, backfilling it for existing registrations
+        Returns: bool: False when this SQLite build lacks FTS5 and searches fall back to scans
+        """
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'registration_search'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            connection.execute(SEARCH_TABLE_SQL)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable, falling back to scans: {str(e)}")
+            return False
+        self._rebuild_search(connection)
+        return True
+
+    def _rebuild_search(self, connection):
+        connection.execute('DELETE FROM registration_search')
+        rows = connection.execute('SELECT id, data FROM registrations').fetchall()
+        connection.executemany(
+            SEARCH_INSERT_SQL, [(row_id,) + search_columns(json.loads(data)) for row_id, data in rows]
+        )
+
+    def _create_parcel_table(self, connection):
+        """
+        Create the parcel R*Tree, backfilling it for existing registrations
+        Returns: bool: False when this SQLite build lacks R*Tree and overlap checks fall back to scans
+        """
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'registration_parcels'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            connection.execute(PARCEL_TABLE_SQL)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"R*Tree unavailable, parcel overlap checks fall back to scans: {str(e)}")
+            return False
+        self._rebuild_parcels(connection)
+        return True
+
+    def _rebuild_parcels(self, connection):
+        connection.execute('DELETE FROM registration_parcels')
+        rows = connection.execute('SELECT id, data FROM registrations').fetchall()
+        boxes = ((row_id, parcel_box(json.loads(data))) for row_id, data in rows)
+        connection.executemany(PARCEL_INSERT_SQL, [(row_id,) + box for row_id, box in boxes if box])
+
+    def _check_claim_keys(self, connection):
+        """Rebuild the claim digests if they were made with another key, or not kept up to date"""
+        if not self._duplicate_key:
+            # Writes without a key leave the digests behind; the next keyed open rebuilds them
+            connection.execute(DELETE_SETTING_SQL, (DUPLICATE_KEY_SETTING,))
+            return
+        fingerprint = key_fingerprint(self._duplicate_key)
+        row = connection.execute(SETTING_SQL, (DUPLICATE_KEY_SETTING,)).fetchone()
+        if row and row[0] == fingerprint:
+            return
+        connection.execute('DELETE FROM registration_claim_keys')
+        rows = connection.execute('SELECT data FROM registrations').fetchall()
+        for (data,) in rows:
+            self._write_claim_keys(connection, None, json.loads(data))
+        connection.execute(SET_SETTING_SQL, (DUPLICATE_KEY_SETTING, fingerprint))
+        logger.info(f"Indexed duplicate-claim digests for {len(rows)} registrations")
+
+    def _write_claim_keys(self, connection, old, record):
+        if old is not None:
+            connection.execute(CLAIM_KEYS_DELETE_SQL, (record['application_id'],))
+        if is_active(record):
+            connection.executemany(CLAIM_KEYS_INSERT_SQL, [
+                (field, digest, record['application_id'])
+                for field, digest in claim_keys(record, self._duplicate_key).items()
+            ])
+
+    def _import_legacy(self, legacy_file):
+        with open(legacy_file, 'r') as f:
+            registrations = json.load(f)
+        with self._transaction() as connection:
+            connection.executemany(UPSERT_SQL, [self._row(record) for record in registrations])
+            # Digested by _check_claim_keys
+            connection.execute(DELETE_SETTING_SQL, (DUPLICATE_KEY_SETTING,))
+            if self._full_text:
+                self._rebuild_search(connection)
+            if self._spatial:
+                self._rebuild_parcels(connection)
+        logger.info(f"Imported {len(registrations)} registrations from {legacy_file}")
+
+    def _rebuild_statistics(self):
+        """Recompute the statistics table from scratch (recovery only)"""
+        statistics = RegistrationStatistics()
+        for record in self.iter_records():
+            statistics.apply(None, record)
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM registration_stats')
+            connection.executemany(STATS_DELTA_SQL, statistics.get_state().items())
+        logger.info("Rebuilt registration statistics table")
+
+    @staticmethod
+    def _row(record):
+        if not record.get('application_id'):
+            raise ValueError('Registration record requires an application_id')
+        return (record['application_id'],) + indexed_columns(record) + location_columns(record) + (
+            json.dumps(record, separators=(',', ':'), ensure_ascii=False),
+        )
+
+    def save(self, record):
+        self.save_many([record])
+
+    def save_many(self, records, keep_versions=False):
+        for record in records:
+            if not record.get('application_id'):
+                raise ValueError('Registration record requires an application_id')
+        with self._transaction() as connection:
+            self._write_records(connection, records, keep_versions)
+
+    def _write_records(self, connection, records, keep_versions=False):
+        for record in records:
+            previous = connection.execute(GET_SQL, (record['application_id'],)).fetchone()
+            old = json.loads(previous[0]) if previous else None
+            if not keep_versions:
+                # A claim brought back from the archive continues from its archived version
+                record['version'] = record_version(
+                    old if old is not None else self._archived(record['application_id'])) + 1
+            connection.execute(UPSERT_SQL, self._row(record))
+            connection.executemany(STATS_DELTA_SQL, statistics_delta(old, record).items())
+            if self._duplicate_key:
+                self._write_claim_keys(connection, old, record)
+            if not (self._full_text or self._spatial):
+                continue
+            row_id = connection.execute(ROW_ID_SQL, (record['application_id'],)).fetchone()[0]
+            if self._full_text:
+                connection.execute(SEARCH_DELETE_SQL, (row_id,))
+                connection.execute(SEARCH_INSERT_SQL, (row_id,) + search_columns(record))
+            if self._spatial:
+                box = parcel_box(record)
+                if old is not None:
+                    connection.execute(PARCEL_DELETE_SQL, (row_id,))
+                if box:
+                    connection.execute(PARCEL_INSERT_SQL, (row_id,) + box)
+
+    def remove_many(self, records):
+        removed = []
+        with self._transaction() as connection:
+            for record in records:
+                row = connection.execute(ROW_SQL, (record['application_id'],)).fetchone()
+                if not row:
+                    continue
+                row_id, old = row[0], json.loads(row[1])
+                if record_version(old) != record_version(record):
+                    continue
+                connection.execute(DELETE_SQL, (row_id,))
+                connection.executemany(STATS_DELTA_SQL, statistics_delta(old, None).items())
+                if self._duplicate_key:
+                    connection.execute(CLAIM_KEYS_DELETE_SQL, (record['application_id'],))
+                if self._full_text:
+                    connection.execute(SEARCH_DELETE_SQL, (row_id,))
+                if self._spatial:
+                    connection.execute(PARCEL_DELETE_SQL, (row_id,))
+                removed.append(record['application_id'])
+        return removed
+
+    def update_many(self, updates):
+        # Reads happen inside the write transaction, which holds SQLite's write lock
+        with self._transaction() as connection:
+            def stored(application_id):
+                row = connection.execute(GET_SQL, (application_id,)).fetchone()
+                return json.loads(row[0]) if row else self._archived(application_id)
+
+            updated, errors = apply_updates(updates, stored)
+            self._write_records(connection, updated)
+        return updated, errors
+
+    def save_claims(self, records, policy=None):
+        # The checks read through this thread's connection, inside the write transaction
+        with self._transaction() as connection:
+            accepted, refused = check_new_claims(self, records, policy)
+            self._write_records(connection, accepted)
+        return refused
+
+    def get(self, application_id):
+        row = self._connection().execute(GET_SQL, (application_id,)).fetchone()
+        return json.loads(row[0]) if row else self._archived(application_id)
+
+    def iter_records(self):
+        # Keyset pagination keeps each read transaction short
+        connection = self._connection()
+        last_id = 0
+        while True:
+            rows = connection.execute(SCAN_SQL, (last_id, SCAN_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+    def count(self):
+        return self._connection().execute(COUNT_SQL).fetchone()[0]
+
+    def query(self, query):
+        column = SQL_SORT_COLUMNS.get(query.sort_field)
+        if column is None or (query.terms and not self._full_text):
+            return super().query(query)
+
+        where, params = self._where(query)
+        connection = self._connection()
+        filters = f"WHERE {' AND '.join(where)}" if where else ''
+        total_matching = connection.execute(
+            f"SELECT COUNT(*) FROM registrations {filters}", params
+        ).fetchone()[0]
+
+        page_where, page_params = list(where), list(params)
+        if query.after is not None:
+            op = '<' if query.descending else '>'
+            page_where.append(f"({column} {op} ? OR ({column} = ? AND application_id {op} ?))")
+            page_params.extend([query.after[0], query.after[0], query.after[1]])
+        direction = 'DESC' if query.descending else 'ASC'
+        page_filters = f"WHERE {' AND '.join(page_where)}" if page_where else ''
+        rows = connection.execute(
+            f"SELECT data FROM registrations {page_filters} "
+            f"ORDER BY {column} {direction}, application_id {direction} LIMIT ?",
+            page_params + [query.limit + 1],
+        ).fetchall()
+        return build_page([json.loads(row[0]) for row in rows], query, total_matching)
+
+    @staticmethod
+    def _where(query, full_text=True):
+        """Translate the query's field, date and (optionally) text filters into SQL conditions"""
+        where, params = [], []
+        for field, accepted in query.field_filters.items():
+            where.append(f"{field} COLLATE NOCASE IN ({', '.join('?' for _ in accepted)})")
+            params.extend(value.strip() for value in accepted)
+        if query.date_from:
+            where.append('submission_date >= ?')
+            params.append(query.date_from)
+        if query.date_before:
+            where.append('submission_date < ?')
+            params.append(query.date_before)
+        if full_text and query.terms:
+            where.append('id IN (SELECT rowid FROM registration_search WHERE registration_search MATCH ?)')
+            params.append(match_expression(query.terms))
+        return where, params
+
+    def search(self, query):
+        if not query.terms or not self._full_text:
+            return super().search(query)
+        where, params = self._where(query, full_text=False)
+        filters = f"WHERE {' AND '.join(where)}" if where else ''
+        rows = self._connection().execute(
+            f"SELECT data, score FROM registrations JOIN ("
+            f"SELECT rowid, {SEARCH_SCORE} AS score FROM registration_search "
+            f"WHERE registration_search MATCH ?) AS matches ON matches.rowid = registrations.id "
+            f"{filters} ORDER BY score DESC, application_id LIMIT ?",
+            [match_expression(query.terms)] + params + [query.limit],
+        ).fetchall()
+        return [(json.loads(data), score) for data, score in rows]
+
+    def facets(self, query, fields):
+        if query.terms and not self._full_text:
+            return super().facets(query, fields)
+        for field in fields:
+            if field not in FILTER_COLUMNS:
+                raise ValueError(f"Cannot facet on '{field}'. Choose from: {', '.join(FILTER_COLUMNS)}")
+
+        where, params = self._where(query)
+        filters = f"WHERE {' AND '.join(where)}" if where else ''
+        connection = self._connection()
+        total_matching = connection.execute(
+            f"SELECT COUNT(*) FROM registrations {filters}", params
+        ).fetchone()[0]
+        facets = {}
+        for field in fields:
+            rows = connection.execute(
+                f"SELECT MIN({field}), COUNT(*) FROM registrations {filters} "
+                f"{'AND' if where else 'WHERE'} {field} IS NOT NULL AND {field} != '' "
+                f"GROUP BY {field} COLLATE NOCASE ORDER BY COUNT(*) DESC",
+                params,
+            ).fetchall()
+            facets[field] = {label: count for label, count in rows}
+        return facets, total_matching
+
+    def _active_duplicates(self, record):
+        if not self._duplicate_key:
+            return {}
+        connection = self._connection()
+        matches = {}
+        for field, digest in claim_keys(record, self._duplicate_key).items():
+            ids = {row[0] for row in connection.execute(CLAIM_KEYS_FIND_SQL, (field, digest))}
+            ids.discard(record.get('application_id'))
+            if ids:
+                matches[field] = sorted(ids)
+        return matches
+
+    def _active_overlaps(self, record):
+        geometry = claim_parcel(record)
+        if geometry is None:
+            return []
+        if not self._spatial:
+            return super()._active_overlaps(record)
+        # The R*Tree narrows the claims down by bounding box; only those get the exact overlap
+        west, south, east, north = bounding_box(geometry)
+        candidates = []
+        for (data,) in self._connection().execute(PARCEL_CANDIDATES_SQL, (east, west, north, south)):
+            stored = json.loads(data)
+            candidates.append((stored['application_id'], claim_parcel(stored)))
+        return find_overlaps(geometry, candidates, record.get('application_id'))
+
+    def _active_map_cells(self, bbox, zoom):
+        # Aggregated by SQLite over the (map_x, map_y) grid index rather than kept in memory
+        level = min(zoom, MAX_CLUSTER_ZOOM)
+        shift = MAX_CLUSTER_ZOOM - level
+        ranges = [
+            (x0 << shift, ((x1 + 1) << shift) - 1, y0 << shift, ((y1 + 1) << shift) - 1)
+            for x0, x1, y0, y1 in cell_ranges(bbox, level)
+        ]
+        connection = self._connection()
+        cells = {}
+        for bounds in ranges:
+            for x, y, status, count, latitude_sum, longitude_sum in connection.execute(
+                    MAP_CLUSTER_SQL, (shift, shift) + bounds):
+                cell = cells.setdefault(cell_key(x, y), [0, 0, 0, 0.0, 0.0])
+                cell[status_group(status)] += count
+                cell[3] += latitude_sum
+                cell[4] += longitude_sum
+        points = None
+        if zoom > MAX_CLUSTER_ZOOM and sum(sum(cell[:3]) for cell in cells.values()) <= MAX_POINTS:
+            points = [
+                (application_id, latitude, longitude, status_group(status))
+                for bounds in ranges
+                for application_id, latitude, longitude, status in connection.execute(MAP_POINTS_SQL, bounds)
+            ]
+        return cells, points
+
+    def statistics(self):
+        return self._format_statistics(dict(self._connection().execute(STATS_SQL).fetchall()))
+
+    def version(self):
+        row = self._connection().execute(VERSION_SQL, (VERSIONS_KEY,)).fetchone()
+        return (int(row[0]) if row else 0) + self._archive_version()
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local.connection = None
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Incrementally Maintained Registration Statistics
+Keeps the admin dashboard aggregates (status counts, land area, families)
+up to date as registrations are inserted or change status, instead of
+recomputing them over every record on each request
+"""
+
+from collections import Counter
+
+from registration_workflow import REVIEW_STATUSES
+
+# Statuses always reported to the admin dashboard, even when their count is zero
+DASHBOARD_STATUSES = ('submitted', 'under_review', 'approved', 'rejected')
+
+STATUS_KEY_PREFIX = 'status:'
+
+# Sum of every record's version: grows by one with each write, so it doubles
+# as a store-wide version for cache validation
+VERSIONS_KEY = 'record_versions'
+
+
+def record_version(record):
+    """
+    Version number of a stored registration
+    Returns: int: 0 for a missing record; records saved before versioning count as 1
+    """
+    if record is None:
+        return 0
+    return int(record.get('version') or 1)
+
+
+def record_contribution(record):
+    """
+    Compute what a single registration adds to the running aggregates
+    Args: record (dict): Registration data
+    Returns: dict: Aggregate key -> amount contributed by this record
+    """
+    land_details = record.get('land_details') or {}
+    personal_details = record.get('personal_details') or {}
+    return {
+        'total_applications': 1,
+        STATUS_KEY_PREFIX + str(record.get('status')): 1,
+        'total_land_area': float(land_details.get('land_area') or 0),
+        'total_families': int(personal_details.get('family_members') or 0),
+        VERSIONS_KEY: record_version(record),
+    }
+
+
+def statistics_delta(old, new):
+    """
+    Compute the change to the aggregates when a registration is replaced
+    Args:
+        old (dict): Previous version of the registration, or None on insert
+        new (dict): New version of the registration, or None on removal
+    Returns: dict: Aggregate key -> signed amount, omitting keys that do not change
+    """
+    delta = Counter()
+    if old is not None:
+        for key, value in record_contribution(old).items():
+            delta[key] -= value
+    if new is not None:
+        for key, value in record_contribution(new).items():
+            delta[key] += value
+    return {key: value for key, value in delta.items() if value}
+
+
+def format_statistics(totals):
+    """
+    Shape raw aggregate totals into the statistics payload used by the dashboard
+    Args: totals (dict): Aggregate key -> value
+    Returns: dict: Statistics with per-status counts and totals
+    """
+    by_status = {
+        key[len(STATUS_KEY_PREFIX):]: int(value)
+        for key, value in totals.items()
+        if key.startswith(STATUS_KEY_PREFIX) and value
+    }
+    stats = {'total_applications': int(totals.get('total_applications', 0))}
+    for status in DASHBOARD_STATUSES:
+        stats[status] = by_status.get(status, 0)
+    # Claims at any committee stage count as under review; by_status has the breakdown
+    stats['under_review'] = sum(by_status.get(status, 0) for status in REVIEW_STATUSES)
+    stats['total_land_area'] = round(totals.get('total_land_area', 0.0), 4)
+    stats['total_families'] = int(totals.get('total_families', 0))
+    stats['by_status'] = by_status
+    return stats
+
+
+def statistics_totals(stats):
+    """
+    Recover aggregate totals from a statistics payload, so payloads from
+    several stores (shards) can be added up and formatted again
+    Args: stats (dict): Statistics from format_statistics
+    Returns: Counter: Aggregate key -> value (without the version sum)
+    """
+    totals = Counter({STATUS_KEY_PREFIX + status: count for status, count in stats['by_status'].items()})
+    for key in ('total_applications', 'total_land_area', 'total_families'):
+        totals[key] = stats[key]
+    return totals
+
+
+class RegistrationStatistics:
+    """
+    Running registration aggregates, updated one change at a time
+    Attach it to a store with RegistrationStore.subscribe to keep it in sync
+    """
+
+    def __init__(self):
+        self.totals = Counter()
+
+    def reset(self):
+        """Forget all aggregates before a full rebuild"""
+        self.totals = Counter()
+
+    def apply(self, old, new):
+        """
+        Fold one registration change into the aggregates
+        Args:
+            old (dict): Previous version of the registration, or None on insert
+            new (dict): New version of the registration, or None on removal
+        """
+        for key, value in statistics_delta(old, new).items():
+            self.totals[key] += value
+
+    def version(self):
+        """Return the store-wide version these aggregates were computed at"""
+        return int(self.totals[VERSIONS_KEY])
+
+    def as_dict(self):
+        """Return the statistics payload for the admin dashboard"""
+        return format_statistics(self.totals)
+
+    def get_state(self):
+        """Return the aggregates in a JSON-serializable form for checkpointing"""
+        return dict(self.totals)
+
+    def load_state(self, state):
+        """Restore aggregates previously returned by get_state"""
+        self.totals = Counter(state)
@@ -0,0 +1,1626 @@
+#!/usr/bin/env python3
+"""
+Registration Storage Backends for VanMitra Land Claims
+Pluggable stores for FRA registrations: the legacy single JSON file and an
+append-only segmented log that keeps submission cost flat as volume grows
+"""
+
+import os
+import copy
+import json
+import atexit
+import logging
+import threading
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+
+from registration_stats import RegistrationStatistics, format_statistics, record_version
+from registration_query import SortIndex, run_query, build_page
+from registration_index import SecondaryIndexes
+from registration_search import SearchIndex, iter_ranked
+from registration_columns import RegistrationColumns
+from registration_duplicates import DuplicateIndex, load_duplicate_key, merge_duplicates
+from registration_map import ClaimMap, map_response, merge_cells
+from registration_parcels import ParcelIndex, merge_overlaps, check_new_claims
+from registration_anomalies import VillageCounts, count_villages, merge_village_tables
+from registration_record import RegistrationRecord, expand_record
+from registration_snapshot import write_snapshot, open_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Indexed lookups only pay off while the candidate set is a small share of the store
+INDEX_SELECTIVITY = 0.25
+
+# Storage configuration (overridable through the environment)
+DATA_FOLDER = os.environ.get('VANMITRA_DATA_DIR', 'data')
+STORE_BACKEND = os.environ.get('VANMITRA_REGISTRATION_STORE', 'log')
+SEGMENT_MAX_BYTES = int(os.environ.get('VANMITRA_SEGMENT_MAX_BYTES', 8 * 1024 * 1024))
+COMPACTION_THRESHOLD = int(os.environ.get('VANMITRA_COMPACTION_THRESHOLD', 4))
+RECORD_CACHE_SIZE = int(os.environ.get('VANMITRA_RECORD_CACHE_SIZE', 10000))
+SNAPSHOT_INTERVAL = int(os.environ.get('VANMITRA_SNAPSHOT_INTERVAL', 20000))
+
+LEGACY_FILENAME = 'registrations.json'
+LOG_DIRNAME = 'registrations'
+SQLITE_FILENAME = 'registrations.db'
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.jsonl'
+CHECKPOINT_FILENAME = 'statistics.json'
+SNAPSHOT_FILENAME = 'snapshot.bin'
+# Bumped whenever the checkpointed aggregates change shape
+CHECKPOINT_FORMAT = 2
+# Bumped whenever a derived view's saved arrays change shape, so older saved views are replayed instead
+VIEWS_FORMAT = 2
+# Derived views saved with each snapshot; statistics travel in the snapshot's JSON meta
+SNAPSHOT_VIEWS = ('_indexes', '_search', '_columns', '_order', '_map', '_parcels', '_villages', '_duplicates')
+
+
+class FileLock:
+    """
+    Cross-process advisory lock backed by a lock file
+    Re-entrant within a process so nested store operations do not deadlock
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mutex = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    def acquire(self, blocking=True):
+        if not self._mutex.acquire(blocking):
+            return False
+        if self._depth == 0:
+            handle = open(self.path, 'a+')
+            if fcntl is not None:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(handle.fileno(), flags)
+                except OSError:
+                    handle.close()
+                    self._mutex.release()
+                    return False
+            self._handle = handle
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+        self._mutex.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def _fsync_directory(path):
+    """Make file creations and renames inside a directory durable"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def apply_updates(updates, stored):
+    """
+    Run read-modify-write changes against the stored registrations
+    Args:
+        updates (list): (application_id, change) pairs, see RegistrationStore.update_many
+        stored (callable): application_id -> currently stored record or None
+    Returns: tuple: (changed records in order of first change, list of (application_id, error) pairs)
+    """
+    changed = {}
+    errors = []
+    for application_id, change in updates:
+        current = changed.get(application_id) or stored(application_id)
+        if current is None:
+            errors.append((application_id, LookupError(f"Application {application_id} not found")))
+            continue
+        # Changes work on a copy so a refused one leaves no partial edits behind
+        record = copy.deepcopy(current)
+        try:
+            change(record)
+        except ValueError as e:
+            errors.append((application_id, e))
+            continue
+        changed[application_id] = record
+    return list(changed.values()), errors
+
+
+class RegistrationStore:
+    """
+    Base class for registration storage backends
+    Records are the registration_data dicts built by the registration endpoints
+    and are keyed by their application_id. Every save stamps the record with a
+    'version' one higher than the stored one, for conditional requests.
+
+    Derived views (statistics, indexes) subscribe to the store and receive an
+    (old, new) pair for every change, including changes made by other workers
+    that the store picks up when it refreshes.
+
+    With a cold archive attached (see registration_archive), claims the
+    tiering job moved there are still found by get() and still count towards
+    statistics() and version(), duplicates(), overlapping_claims(), the map
+    and village_counts(); listings, search, facets and aggregates cover the
+    active claims only.
+    """
+
+    def __init__(self, archive=None):
+        self._mutex = threading.RLock()
+        # Cross-process write lock, for backends that need one
+        self._lock = None
+        self._listeners = []
+        self._indexes = None
+        self._search = None
+        self._columns = None
+        self._order = None
+        self._duplicates = None
+        self._map = None
+        self._parcels = None
+        self._villages = None
+        self._archive = archive
+
+    def subscribe(self, listener, replay=True):
+        """
+        Keep a derived view in sync with the store
+        Args:
+            listener: Object with reset() and apply(old, new) methods
+            replay (bool): Replay the existing registrations into it before it is
+                attached; False for listeners that only follow new changes
+        """
+        with self._mutex:
+            if replay:
+                listener.reset()
+                for record in self.iter_records():
+                    listener.apply(None, record)
+            self._listeners.append(listener)
+
+    def _notify(self, old, new):
+        for listener in self._listeners:
+            listener.apply(old, new)
+
+    def _reset_listeners(self, skip=()):
+        for listener in self._listeners:
+            if listener not in skip:
+                listener.reset()
+
+    def save(self, record):
+        """
+        Insert a registration or replace the stored version of it
+        Args: record (dict): Registration data containing an application_id;
+            its 'version' is set to the version being written
+        """
+        raise NotImplementedError
+
+    def save_many(self, records, keep_versions=False):
+        """
+        Insert or replace several registrations as one durable commit
+        Args:
+            records (list): Registration dicts, applied in order
+            keep_versions (bool): Write the records' own 'version' instead of
+                stamping the next one (bulk loads of records copied from another store)
+        """
+        raise NotImplementedError
+
+    def update_many(self, updates):
+        """
+        Read, change and write back registrations as one durable commit
+        Other writers, in this and other workers, are held off from the reads to
+        the write, so concurrent changes to an application cannot be lost.
+        Args: updates (list): (application_id, change) pairs applied in order;
+            change(record) edits the registration in place, or raises ValueError
+            to refuse the update
+        Returns: tuple: (list of updated registrations, list of (application_id, error)
+            pairs for refused updates; a missing application gives a LookupError)
+        """
+        with self._mutex, (self._lock or nullcontext()):
+            updated, errors = apply_updates(updates, self.get)
+            if updated:
+                self.save_many(updated)
+        return updated, errors
+
+    def save_claims(self, records, policy=None):
+        """
+        Check new claims for duplicates and parcel overlaps and save them as one durable commit
+        The checks run under the write lock, so a claim committed by another
+        thread or worker between the check and the save cannot slip past them,
+        and each claim is also checked against the claims before it in the list.
+        Args:
+            records (list): New registration dicts; duplicate_of, parcel_overlaps
+                and parcel_area are recorded in them
+            policy (str): Duplicate policy (default: VANMITRA_DUPLICATE_POLICY)
+        Returns: dict: application_id -> DuplicateClaimError for the claims refused
+            under the reject policy; every other claim is saved
+        """
+        with self._mutex, (self._lock or nullcontext()):
+            accepted, refused = check_new_claims(self, records, policy)
+            if accepted:
+                self.save_many(accepted)
+        return refused
+
+    def remove_many(self, records):
+        """
+        Drop registrations from the store as one durable commit
+        Used by the tiering job once their archived copies are durable
+        Args: records (list): Registrations as last read; one whose stored version
+            has changed since is left in place
+        Returns: list: application IDs removed
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _stamp_versions(records, stored):
+        """
+        Set each record's version to one past the version it replaces
+        Must be called while holding the store's write lock
+        Args:
+            records (list): Records about to be written, in order
+            stored (callable): application_id -> currently stored record or None
+        """
+        latest = {}
+        for record in records:
+            application_id = record['application_id']
+            if application_id not in latest:
+                latest[application_id] = record_version(stored(application_id))
+            latest[application_id] += 1
+            record['version'] = latest[application_id]
+
+    def get(self, application_id):
+        """
+        Look up a single registration
+        Returns: dict or None: The latest stored version of the registration,
+            or its archived copy once it has been moved to the cold archive
+        """
+        raise NotImplementedError
+
+    def _archived(self, application_id):
+        """Look up a registration in the cold archive, if one is attached"""
+        return self._archive.get(application_id) if self._archive is not None else None
+
+    def _archive_version(self):
+        return self._archive.version() if self._archive is not None else 0
+
+    def _format_statistics(self, totals):
+        """Shape the active claims' aggregates for the dashboard, adding the archived claims"""
+        if self._archive is not None:
+            totals = Counter(totals)
+            totals.update(self._archive.totals())
+        return format_statistics(totals)
+
+    def iter_records(self):
+        """Yield the latest version of every registration in submission order"""
+        raise NotImplementedError
+
+    def list_all(self):
+        """Return all registrations as a list"""
+        return list(self.iter_records())
+
+    def count(self):
+        """Return the number of stored registrations"""
+        return sum(1 for _ in self.iter_records())
+
+    def _sync(self):
+        """Bring listeners up to date with changes made by other workers"""
+
+    def _views_archive(self):
+        """The attached archive when it holds claims its views must be merged with"""
+        if self._archive is None or not self._archive.manifest()['partitions']:
+            return None
+        return self._archive
+
+    def duplicates(self, record):
+        """
+        Find stored claims with the same Aadhaar number or land parcel as a registration
+        Args: record (dict): Registration data, stored or about to be
+        Returns: dict: 'aadhaar' and/or 'land_parcel' -> application IDs of other
+            claims that are not rejected, archived ones included; empty when
+            there are none
+        """
+        matches = self._active_duplicates(record)
+        archive = self._views_archive()
+        if archive is None:
+            return matches
+        return merge_duplicates(matches, archive.duplicates(record))
+
+    def _active_duplicates(self, record):
+        """duplicates() among the active claims; empty when the store was built without a duplicate key"""
+        if self._duplicates is None:
+            return {}
+        with self._mutex:
+            self._sync()
+            return self._duplicates.find(record)
+
+    def map_clusters(self, bbox, zoom):
+        """
+        Claims with coordinates inside a bounding box, clustered for a map zoom level
+        Args:
+            bbox (tuple): (west, south, east, north) in decimal degrees
+            zoom (int): Map zoom level
+        Returns: dict: clusters, points and totals (see registration_map.map_response)
+        """
+        cells, points = self.map_cells(bbox, zoom)
+        return map_response(zoom, cells.values(), points)
+
+    def map_cells(self, bbox, zoom):
+        """
+        Grid cells and claims behind map_clusters, archived claims included
+        Returns: tuple: (cells, points), see registration_map.ClaimMap.cells
+        """
+        cells = self._active_map_cells(bbox, zoom)
+        archive = self._views_archive()
+        if archive is None:
+            return cells
+        return merge_cells([cells, archive.map_cells(bbox, zoom)], zoom)
+
+    def _active_map_cells(self, bbox, zoom):
+        """map_cells() of the active claims"""
+        if self._map is None:
+            claim_map = ClaimMap()
+            for record in self.iter_records():
+                claim_map.apply(None, record)
+            return claim_map.cells(bbox, zoom)
+        with self._mutex:
+            self._sync()
+            return self._map.cells(bbox, zoom)
+
+    def overlapping_claims(self, record):
+        """
+        Find stored claims whose parcel boundaries overlap a registration's
+        Args: record (dict): Registration data with land_details['parcel'], stored or about to be
+        Returns: list: {'application_id', 'overlap_hectares', 'overlap_percent'} per
+            overlapping claim that is not rejected, archived ones included,
+            largest first (see registration_parcels.find_overlaps); empty
+            without a parcel
+        """
+        overlaps = self._active_overlaps(record)
+        archive = self._views_archive()
+        if archive is None:
+            return overlaps
+        return merge_overlaps(overlaps, archive.overlapping_claims(record))
+
+    def _active_overlaps(self, record):
+        """overlapping_claims() among the active claims"""
+        if self._parcels is None:
+            parcels = ParcelIndex()
+            for stored in self.iter_records():
+                parcels.apply(None, stored)
+            return parcels.overlaps(record)
+        with self._mutex:
+            self._sync()
+            return self._parcels.overlaps(record)
+
+    def village_counts(self):
+        """
+        Claims per village and status group, archived claims included
+        Returns: dict: Per-village columns (see registration_anomalies.village_table)
+        """
+        table = self._active_village_counts()
+        archive = self._views_archive()
+        if archive is None:
+            return table
+        return merge_village_tables([table, archive.village_counts()])
+
+    def _active_village_counts(self):
+        """village_counts() of the active claims"""
+        if self._villages is None:
+            return count_villages(self.iter_records())
+        with self._mutex:
+            self._sync()
+            return self._villages.table()
+
+    def _candidate_ids(self, query, selective=True):
+        """
+        Resolve a query's field filters and search terms through the in-memory indexes
+        Args:
+            query (RegistrationQuery): Query whose field_filters and terms are looked up
+            selective (bool): Give up (return None) when the candidates are too
+                large a share of the store for point reads to beat a scan
+        Returns: list or None: Candidate application IDs, or None to scan instead
+        """
+        use_fields = self._indexes is not None and query.field_filters
+        use_search = self._search is not None and query.terms
+        if not use_fields and not use_search:
+            return None
+        with self._mutex:
+            self._sync()
+            ids = self._indexes.candidates(query.field_filters) if use_fields else None
+            if use_search:
+                found = self._search.scores(query.terms).keys()
+                ids = set(found) if ids is None else ids & found
+            total = len(self._indexes if self._indexes is not None else self._search)
+            if ids is None or (selective and len(ids) > INDEX_SELECTIVITY * total):
+                return None
+            return list(ids)
+
+    def _iter_candidates(self, query):
+        """Yield registrations that may match a query, narrowed by the indexes when possible"""
+        ids = self._candidate_ids(query)
+        if ids is None:
+            yield from self.iter_records()
+            return
+        for application_id in ids:
+            record = self.get(application_id)
+            if record is not None:
+                yield record
+
+    def iter_matching(self, query):
+        """
+        Stream every registration that passes a query's filters
+        Sorting and pagination are ignored so exports never buffer the result set
+        """
+        return (record for record in self._iter_candidates(query) if query.matches(record))
+
+    def query(self, query):
+        """
+        Return one page of registrations matching a query
+        In the default order, the page is read off the sort index and the
+        columns' filter mask, so only the registrations returned are loaded.
+        Args: query (RegistrationQuery): Filters, sort order and cursor
+        Returns: dict: Page of registrations with pagination details
+        """
+        if self._order is None or self._columns is None or query.sort_field != self._order.field or query.terms:
+            return run_query(self._iter_candidates(query), query)
+        with self._mutex:
+            self._sync()
+            accept = mask = saved_rows = None
+            if query.field_filters:
+                mask = self._columns.mask(query)
+                row = self._columns.row
+                accept = lambda application_id: mask[row(application_id)]
+                saved_rows = self._columns.saved_rows(mask)
+            ids, in_range = self._order.page(query, accept, saved_rows)
+            records = [record for record in map(self.get, ids) if record is not None]
+        total_matching = int(mask.sum()) if mask is not None else in_range
+        return build_page(records, query, total_matching)
+
+    def facets(self, query, fields):
+        """
+        Count registrations matching a query per value of each requested field
+        Args:
+            query (RegistrationQuery): Filters restricting the counted registrations
+            fields (list): Indexed fields to facet on
+        Returns: tuple: (dict of field -> {value: count}, number of matching registrations)
+        """
+        if self._indexes is None:
+            # No maintained indexes: build throwaway postings over the matches
+            indexes = SecondaryIndexes()
+            total_matching = 0
+            for record in self.iter_matching(query):
+                indexes.apply(None, record)
+                total_matching += 1
+            return indexes.facet_counts(fields), total_matching
+
+        ids = self._candidate_ids(query, selective=False)
+        if query.has_residual_filters:
+            ids = [record['application_id'] for record in self.iter_matching(query)]
+        with self._mutex:
+            if ids is None:
+                self._sync()
+                return self._indexes.facet_counts(fields), len(self._indexes)
+            return self._indexes.facet_counts(fields, ids), len(ids)
+
+    def aggregate(self, query, group_by, metrics):
+        """
+        Group registrations matching a query and compute aggregates per group
+        Args:
+            query (RegistrationQuery): Filters restricting the aggregated registrations
+            group_by (list): (field, bucket width) pairs from parse_group_by
+            metrics (list): (aggregate, field) pairs from parse_metrics
+        Returns: tuple: (list of groups with their metrics, number of matching registrations)
+        """
+        if self._columns is None:
+            # No maintained columns: load the matches into throwaway ones
+            columns = RegistrationColumns()
+            for record in self.iter_matching(query):
+                columns.apply(None, record)
+            return columns.aggregate(group_by, metrics)
+
+        ids = self._candidate_ids(query, selective=False) if query.terms else None
+        with self._mutex:
+            self._sync()
+            return self._columns.aggregate(group_by, metrics, self._columns.mask(query, ids))
+
+    def search(self, query):
+        """
+        Rank the registrations matching a query's search terms by relevance
+        Args: query (RegistrationQuery): Query with text; its other filters also apply
+        Returns: list: (registration, score) pairs, best first, at most query.limit
+        """
+        if not query.terms:
+            raise ValueError("A search needs some text in 'q'")
+        if self._search is None:
+            # No maintained index: rank within a throwaway index over the matches
+            index = SearchIndex()
+            records = {}
+            for record in self.iter_matching(query):
+                index.apply(None, record)
+                records[record['application_id']] = record
+            return [(records[i], score) for i, score in index.search(query.terms, query.limit)]
+
+        with self._mutex:
+            self._sync()
+            scores = self._search.scores(query.terms)
+            if query.field_filters and self._indexes is not None:
+                allowed = self._indexes.candidates(query.field_filters)
+                scores = {i: score for i, score in scores.items() if i in allowed}
+        results = []
+        for application_id, score in iter_ranked(scores):
+            record = self.get(application_id)
+            if record is not None and query.matches(record):
+                results.append((record, score))
+                if len(results) >= query.limit:
+                    break
+        return results
+
+    def statistics(self):
+        """Return the admin dashboard statistics over all registrations"""
+        statistics = RegistrationStatistics()
+        for record in self.iter_records():
+            statistics.apply(None, record)
+        return self._format_statistics(statistics.totals)
+
+    def version(self):
+        """
+        Return the store-wide version, which grows with every write
+        Returns: int: Sum of the versions of all stored registrations, plus the
+            archive's version
+        """
+        return sum(record_version(record) for record in self.iter_records()) + self._archive_version()
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class JSONFileStore(RegistrationStore):
+    """
+    Legacy backend keeping every registration in a single JSON array file
+    Each save rewrites the whole file, so it is only suitable for small deployments
+
+    The file stays the source of truth, but each worker keeps the registrations
+    (as compact RegistrationRecords) and an application_id index in memory.
+    They are reloaded only when the file's inode, size or mtime changes, so
+    lookups are dict hits.
+    """
+
+    def __init__(self, path, duplicate_key=None, archive=None):
+        """
+        Args:
+            path (str): JSON array file
+            duplicate_key (bytes): Secret for the duplicate-claim index (None disables it)
+            archive (ColdArchive): Cold archive of decided claims (None disables it)
+        """
+        super().__init__(archive)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = FileLock(path + '.lock')
+        self._signature = None
+        self._registrations = None
+        self._by_id = {}
+        self._statistics = RegistrationStatistics()
+        self._indexes = SecondaryIndexes()
+        self._search = SearchIndex()
+        self._columns = RegistrationColumns()
+        self._order = SortIndex()
+        self._map = ClaimMap()
+        self._parcels = ParcelIndex()
+        self._villages = VillageCounts()
+        self._listeners.extend([self._statistics, self._indexes, self._search, self._columns, self._order,
+                                self._map, self._parcels, self._villages])
+        if duplicate_key:
+            self._duplicates = DuplicateIndex(duplicate_key)
+            self._listeners.append(self._duplicates)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _cache(self, registrations, signature):
+        self._registrations = registrations
+        self._by_id = {r.application_id: r for r in registrations}
+        self._signature = signature
+
+    def _snapshot(self):
+        """
+        Return the cached registrations, re-parsing the file only if it changed
+        Returns: tuple: (list of RegistrationRecords, dict of application_id -> RegistrationRecord)
+        """
+        signature = self._file_signature()
+        with self._mutex:
+            if self._registrations is None or signature != self._signature:
+                loaded = self._load()
+                self._cache([RegistrationRecord.from_dict(r) for r in loaded], signature)
+                # Another worker rewrote the file; derived views start over
+                self._reset_listeners()
+                for record in loaded:
+                    self._notify(None, record)
+            return self._registrations, self._by_id
+
+    def _write(self, registrations):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump([r.to_dict() for r in registrations], f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def save(self, record):
+        self.save_many([record])
+
+    def save_many(self, records, keep_versions=False):
+        with self._mutex, self._lock:
+            cached, by_id = self._snapshot()
+            registrations = list(cached)
+            positions = {r.application_id: i for i, r in enumerate(registrations)}
+            if not keep_versions:
+                self._stamp_versions(records, lambda application_id: self._stored(by_id, application_id))
+            changes = []
+            for record in records:
+                application_id = record['application_id']
+                compact = RegistrationRecord.from_dict(record)
+                if application_id in positions:
+                    changes.append((registrations[positions[application_id]].to_dict(), record))
+                    registrations[positions[application_id]] = compact
+                else:
+                    changes.append((None, record))
+                    positions[application_id] = len(registrations)
+                    registrations.append(compact)
+            self._write(registrations)
+            self._cache(registrations, self._file_signature())
+            for old, new in changes:
+                self._notify(old, new)
+
+    def remove_many(self, records):
+        with self._mutex, self._lock:
+            cached, by_id = self._snapshot()
+            removed = {}
+            for record in records:
+                stored = expand_record(by_id.get(record['application_id']))
+                if stored is not None and record_version(stored) == record_version(record):
+                    removed[record['application_id']] = stored
+            if removed:
+                registrations = [r for r in cached if r.application_id not in removed]
+                self._write(registrations)
+                self._cache(registrations, self._file_signature())
+                for old in removed.values():
+                    self._notify(old, None)
+            return list(removed)
+
+    def _stored(self, by_id, application_id):
+        record = expand_record(by_id.get(application_id))
+        return record if record is not None else self._archived(application_id)
+
+    def get(self, application_id):
+        _, by_id = self._snapshot()
+        return self._stored(by_id, application_id)
+
+    def iter_records(self):
+        registrations, _ = self._snapshot()
+        return (r.to_dict() for r in registrations)
+
+    def count(self):
+        registrations, _ = self._snapshot()
+        return len(registrations)
+
+    def _sync(self):
+        self._snapshot()
+
+    def statistics(self):
+        with self._mutex:
+            self._snapshot()
+            return self._format_statistics(self._statistics.totals)
+
+    def version(self):
+        with self._mutex:
+            self._snapshot()
+            return self._statistics.version() + self._archive_version()
+
+
+class SegmentedLogStore(RegistrationStore):
+    """
+    Append-only registration log split into rolling JSON-lines segment files
+
+    Every save appends one line to the active segment and fsyncs it, so the cost
+    of a submission does not depend on how many registrations already exist.
+    Updates append a new version of the record; the latest line wins. Sealed
+    segments are merged in the background to drop superseded versions.
+
+    Each worker process keeps an index of application_id -> (segment, offset)
+    and tails the segments to pick up records appended by other workers.
+    Recently read records are kept parsed in a bounded LRU cache that is
+    validated against the index, so repeated status checks skip the disk.
+
+    Dashboard statistics are maintained incrementally as lines are applied and
+    checkpointed next to the segments; they are only rebuilt from the log when
+    the checkpoint no longer matches the segment files after a crash.
+
+    Every so often a background builder writes an immutable binary snapshot of
+    all registrations that workers mmap (see registration_snapshot). Once a
+    snapshot is mapped, the per-process index only covers lines appended after
+    it; lookups that miss the index fall through to the shared mapping. The
+    snapshot also carries the derived views (indexes, search, columns, map,
+    parcels, villages, duplicates) built from the same records, as arrays
+    that workers read straight from the shared mapping: each worker keeps only
+    the changes logged after the snapshot, and moves onto every new snapshot's
+    views when it maps it. Record
+    versions decide between a snapshot copy and a log line for the same
+    application, so compaction can rewrite segments under a live snapshot.
+
+    Claims moved to the cold archive are removed by appending a tombstone
+    line, {"application_id", "version", "removed": true}, that outranks the
+    claim's last version wherever that lives; compaction drops a tombstone
+    once no older copy is left for it to hide.
+    """
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 compaction_threshold=COMPACTION_THRESHOLD, legacy_file=None,
+                 cache_size=RECORD_CACHE_SIZE, snapshot_interval=SNAPSHOT_INTERVAL, duplicate_key=None,
+                 archive=None):
+        """
+        Args:
+            directory (str): Folder holding the segment files
+            segment_max_bytes (int): Size at which the active segment is sealed
+            compaction_threshold (int): Sealed segments that trigger a background compaction
+            legacy_file (str): JSON array file imported when the log is empty
+            cache_size (int): Parsed records kept in memory for point lookups
+            snapshot_interval (int): Records indexed past the snapshot that trigger
+                a new one in the background (0 disables snapshots)
+            duplicate_key (bytes): Secret for the duplicate-claim index (None disables it)
+            archive (ColdArchive): Cold archive of decided claims (None disables it)
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.compaction_threshold = compaction_threshold
+        self.legacy_file = legacy_file
+        self.cache_size = cache_size
+        self.snapshot_interval = snapshot_interval
+        self._record_cache = OrderedDict()
+
+        super().__init__(archive)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = FileLock(os.path.join(directory, '.lock'))
+        self._compaction_lock = FileLock(os.path.join(directory, '.compaction.lock'))
+        self._compaction_thread = None
+        self._snapshot_thread = None
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_FILENAME)
+        self._statistics = RegistrationStatistics()
+        self._indexes = SecondaryIndexes()
+        self._search = SearchIndex()
+        self._columns = RegistrationColumns()
+        self._order = SortIndex()
+        self._map = ClaimMap()
+        self._parcels = ParcelIndex()
+        self._villages = VillageCounts()
+        self._listeners.extend([self._statistics, self._indexes, self._search, self._columns, self._order,
+                                self._map, self._parcels, self._villages])
+        if duplicate_key:
+            self._duplicates = DuplicateIndex(duplicate_key)
+            self._listeners.append(self._duplicates)
+
+        self._index = {}
+        self._positions = {}
+        self._inodes = {}
+        self._directory_mtime = None
+        self._active_handle = None
+        self._active_segment = None
+        self._snapshot = None
+        self._snapshot_checked_mtime = None
+        self._tail_start = {}
+        self._covered = 0
+        # Application IDs whose latest indexed line is a tombstone
+        self._removed = set()
+
+        self._recover()
+
+    # ------------------------------------------------------------------
+    # Segment files
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _list_segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _segment_inode(self, segment):
+        try:
+            return os.stat(self._segment_path(segment)).st_ino
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _encode(record):
+        return (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+    @staticmethod
+    def _iter_lines(handle, start=0):
+        """
+        Stream complete lines from an open segment, one at a time
+        A trailing line without a newline is still being written (or torn) and is not returned
+        Yields: tuple: (line offset, offset after the line, record or None if the line is corrupt)
+        """
+        handle.seek(start)
+        offset = start
+        for line in handle:
+            if not line.endswith(b'\n'):
+                return
+            end = offset + len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping corrupt registration line in {handle.name} at offset {offset}")
+                record = None
+            yield offset, end, record
+            offset = end
+
+    # ------------------------------------------------------------------
+    # Recovery and index maintenance
+    # ------------------------------------------------------------------
+
+    def _recover(self):
+        """Clean up after a crash and build the in-memory index"""
+        with self._mutex, self._lock:
+            # Leftover temp files are only stale if no compaction is running elsewhere
+            if self._compaction_lock.acquire(blocking=False):
+                try:
+                    for name in os.listdir(self.directory):
+                        if name.endswith('.tmp'):
+                            os.remove(os.path.join(self.directory, name))
+                finally:
+                    self._compaction_lock.release()
+
+            segments = self._list_segments()
+            if not segments and self.legacy_file and os.path.exists(self.legacy_file):
+                self._import_legacy()
+                segments = self._list_segments()
+
+            if segments:
+                self._truncate_torn_tail(segments[-1])
+
+            checkpoint = self._read_checkpoint()
+            if checkpoint is not None and (checkpoint.get('format') != CHECKPOINT_FORMAT or
+                                           checkpoint.get('segments') != self._segment_fingerprint()):
+                logger.info("Registration statistics checkpoint is stale; rebuilding from the log")
+                checkpoint = None
+            self._rebuild(checkpoint)
+
+    def _segment_fingerprint(self):
+        """Describe the segment files as {segment: [inode, size]} for checkpoint validation"""
+        fingerprint = {}
+        for segment in self._list_segments():
+            stat = os.stat(self._segment_path(segment))
+            fingerprint[str(segment)] = [stat.st_ino, stat.st_size]
+        return fingerprint
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILENAME), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_checkpoint(self):
+        """Persist the statistics together with the log position they cover"""
+        with self._mutex, self._lock:
+            self._refresh()
+            checkpoint = {
+                'format': CHECKPOINT_FORMAT,
+                'segments': {
+                    str(segment): [self._inodes[segment], self._positions[segment]]
+                    for segment in sorted(self._inodes)
+                },
+                'statistics': self._statistics.get_state(),
+            }
+            path = os.path.join(self.directory, CHECKPOINT_FILENAME)
+            temp_path = path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self._directory_mtime = os.stat(self.directory).st_mtime_ns
+
+    def _import_legacy(self):
+        with open(self.legacy_file, 'r') as f:
+            registrations = json.load(f)
+        path = self._segment_path(1)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            for record in registrations:
+                f.write(self._encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(self.directory)
+        logger.info(f"Imported {len(registrations)} registrations from {self.legacy_file}")
+
+    def _truncate_torn_tail(self, segment):
+        """Drop a partially written final line left behind by a crash"""
+        path = self._segment_path(segment)
+        size = os.path.getsize(path)
+        if size == 0:
+            return
+        with open(path, 'rb+') as f:
+            block = min(size, 64 * 1024)
+            end = size
+            while end > 0:
+                f.seek(end - block)
+                chunk = f.read(block)
+                newline = chunk.rfind(b'\n')
+                if newline != -1:
+                    valid = end - block + newline + 1
+                    break
+                end -= block
+                block = min(end, 64 * 1024)
+            else:
+                valid = 0
+            if valid < size:
+                logger.warning(f"Truncating {size - valid} torn bytes from {path}")
+                f.truncate(valid)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rebuild(self, checkpoint=None):
+        """
+        Rebuild the index from scratch from the snapshot (if any) and the log after it
+        Args: checkpoint (dict): Validated statistics checkpoint; when given the
+            statistics are restored from it instead of being replayed
+        """
+        with self._mutex:
+            self._close_active_handle()
+            self._directory_mtime = os.stat(self.directory).st_mtime_ns
+            self._snapshot_checked_mtime = self._directory_mtime
+            self._snapshot = open_snapshot(self._snapshot_path) if self.snapshot_interval else None
+
+            listeners = self._listeners
+            try:
+                self._reset_listeners()
+                if self._snapshot is not None:
+                    # The snapshot carries its own statistics and usually the other views;
+                    # any it does not carry replay from its records
+                    self._statistics.load_state(self._snapshot.statistics)
+                    restored = self._load_views(self._snapshot)
+                    self._listeners = [l for l in listeners if l is not self._statistics and l not in restored]
+                    if self._listeners:
+                        for record in self._snapshot.iter_records():
+                            self._notify(None, record)
+                if checkpoint is not None:
+                    self._listeners = [l for l in listeners if l is not self._statistics]
+                else:
+                    self._listeners = listeners
+                self._index_tail(notify=True)
+            finally:
+                self._listeners = listeners
+            if checkpoint is not None:
+                self._statistics.load_state(checkpoint['statistics'])
+
+    def _index_tail(self, notify):
+        """
+        Index every log line the mapped snapshot does not cover
+        Args: notify (bool): Pass the lines on to listeners (False when they are already current)
+        """
+        self._index = {}
+        self._positions = {}
+        self._inodes = {}
+        self._tail_start = {}
+        self._covered = 0
+        self._removed = set()
+        # Compaction reuses segment numbers, so cached locations cannot be trusted
+        self._record_cache.clear()
+        covered = self._snapshot.positions if self._snapshot is not None else {}
+        for segment in self._list_segments():
+            inode = self._segment_inode(segment)
+            if inode is None:
+                # Removed by a concurrent compaction; its records live on in a later segment
+                continue
+            # Segments rewritten by compaction since the snapshot are read from the start
+            start = covered[segment][1] if covered.get(segment, (None,))[0] == inode else 0
+            self._inodes[segment] = inode
+            self._positions[segment] = start
+            self._tail_start[segment] = start
+            try:
+                self._tail_segment(segment, notify)
+            except FileNotFoundError:
+                for state in (self._inodes, self._positions, self._tail_start):
+                    del state[segment]
+
+    def _tail_segment(self, segment, notify=True):
+        position = self._positions.get(segment, 0)
+        with open(self._segment_path(segment), 'rb') as f:
+            for offset, end, record in self._iter_lines(f, position):
+                if record is not None:
+                    self._apply(segment, offset, record, notify)
+                position = end
+        self._positions[segment] = position
+
+    def _apply(self, segment, offset, record, notify=True):
+        application_id = record.get('application_id')
+        if not application_id:
+            return
+        previous = self._index.get(application_id)
+        old = None
+        if previous is None and self._snapshot is not None:
+            covered_version = self._snapshot.version_of(application_id)
+            if covered_version is not None:
+                # Already in the snapshot, or an older copy rewritten by compaction
+                if record_version(record) <= covered_version:
+                    return
+                self._covered += 1
+                if notify and self._listeners:
+                    old = self._snapshot.get(application_id)
+        self._index[application_id] = (segment, offset)
+        new = record
+        if record.get('removed'):
+            self._removed.add(application_id)
+            new = None
+        else:
+            self._removed.discard(application_id)
+        if notify and self._listeners:
+            if previous is not None:
+                try:
+                    old = self._read_at(*previous)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not read previous version of {application_id}: {str(e)}")
+                if old is not None and old.get('removed'):
+                    old = None
+            if old is not None or new is not None:
+                self._notify(old, new)
+
+    def _refresh(self):
+        """Pick up records appended or compacted by other worker processes, and new snapshots"""
+        with self._mutex:
+            if self._refresh_segments():
+                return
+            if self.snapshot_interval and self._snapshot_changed():
+                # Catch up and re-index against the new snapshot with writers held
+                # off, so no line slips in between without reaching the listeners
+                with self._lock:
+                    if not self._refresh_segments():
+                        self._adopt_snapshot()
+
+    def _refresh_segments(self):
+        """
+        Tail segments that grew and notice new or rewritten ones
+        Returns: bool: True if the index had to be rebuilt from scratch
+        """
+        directory_mtime = os.stat(self.directory).st_mtime_ns
+        newest = max(self._inodes) if self._inodes else 0
+        # Directory mtimes can be too coarse to reveal a segment created in the same tick
+        if directory_mtime != self._directory_mtime or os.path.exists(self._segment_path(newest + 1)):
+            segments = self._list_segments()
+            for segment in self._inodes:
+                if segment not in segments or self._segment_inode(segment) != self._inodes[segment]:
+                    self._rebuild()
+                    return True
+            for segment in segments:
+                if segment not in self._inodes:
+                    inode = self._segment_inode(segment)
+                    if inode is None:
+                        self._rebuild()
+                        return True
+                    self._inodes[segment] = inode
+                    self._positions[segment] = 0
+                    self._tail_start[segment] = 0
+            self._directory_mtime = directory_mtime
+            check = segments
+        else:
+            check = sorted(self._inodes)[-1:]
+
+        for segment in check:
+            try:
+                size = os.path.getsize(self._segment_path(segment))
+            except FileNotFoundError:
+                self._rebuild()
+                return True
+            if size > self._positions.get(segment, 0):
+                self._tail_segment(segment)
+        return False
+
+    def _snapshot_changed(self):
+        """Check whether another process replaced the snapshot since it was mapped"""
+        if self._directory_mtime == self._snapshot_checked_mtime:
+            return False
+        self._snapshot_checked_mtime = self._directory_mtime
+        try:
+            inode = os.stat(self._snapshot_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        return inode != (self._snapshot.inode if self._snapshot is not None else None)
+
+    def _adopt_snapshot(self):
+        """
+        Map a newly written snapshot and shrink the index to the lines after it
+        Views saved with it replace the ones built on the previous snapshot and
+        catch up on the lines after it, so no worker's changes pile up between
+        restarts; other listeners have seen every line already.
+        """
+        self._close_active_handle()
+        self._directory_mtime = os.stat(self.directory).st_mtime_ns
+        self._snapshot_checked_mtime = self._directory_mtime
+        self._snapshot = open_snapshot(self._snapshot_path)
+        restored = self._load_views(self._snapshot) if self._snapshot is not None else []
+        if restored and len(restored) < len([name for name in SNAPSHOT_VIEWS if getattr(self, name) is not None]):
+            # A view that could not be loaded was dropped; rebuild it from the records
+            self._rebuild()
+            return
+        listeners = self._listeners
+        try:
+            self._listeners = restored
+            self._index_tail(notify=bool(restored))
+        finally:
+            self._listeners = listeners
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _close_active_handle(self):
+        if self._active_handle is not None:
+            self._active_handle.close()
+            self._active_handle = None
+            self._active_segment = None
+
+    def _writable_segment(self, incoming_bytes):
+        """Return the segment to append to, sealing the active one when it is full"""
+        segments = sorted(self._inodes)
+        segment = segments[-1] if segments else 1
+        if segments and self._positions[segment] > 0 and \
+                self._positions[segment] + incoming_bytes > self.segment_max_bytes:
+            segment += 1
+
+        if segment != self._active_segment:
+            if self._active_handle is not None:
+                # Lines written to the sealed segment in this batch must be durable too
+                self._active_handle.flush()
+                os.fsync(self._active_handle.fileno())
+            self._close_active_handle()
+            created = not os.path.exists(self._segment_path(segment))
+            self._active_handle = open(self._segment_path(segment), 'ab')
+            self._active_segment = segment
+            if created:
+                _fsync_directory(self.directory)
+            if segment not in self._inodes:
+                self._inodes[segment] = os.fstat(self._active_handle.fileno()).st_ino
+                self._positions[segment] = 0
+                self._directory_mtime = os.stat(self.directory).st_mtime_ns
+                if len(self._inodes) - 1 >= self.compaction_threshold:
+                    self._schedule_compaction()
+        return segment
+
+    def save(self, record):
+        self.save_many([record])
+
+    def save_many(self, records, keep_versions=False):
+        for record in records:
+            if not record.get('application_id'):
+                raise ValueError('Registration record requires an application_id')
+        with self._mutex, self._lock:
+            self._refresh()
+            if not keep_versions:
+                self._stamp_versions(records, self.get)
+            self._append(records)
+
+    def remove_many(self, records):
+        with self._mutex, self._lock:
+            self._refresh()
+            tombstones = []
+            for record in records:
+                application_id = record['application_id']
+                stored = self._read_latest(application_id)
+                if stored is not None and not stored.get('removed') and \
+                        record_version(stored) == record_version(record):
+                    tombstones.append({'application_id': application_id, 'version': record_version(stored) + 1,
+                                       'removed': True})
+            if tombstones:
+                self._append(tombstones)
+            return [tombstone['application_id'] for tombstone in tombstones]
+
+    def _append(self, records):
+        """Write lines to the log, fsync them and index them (caller holds the write lock)"""
+        lines = [self._encode(record) for record in records]
+        written = []
+        try:
+            for record, line in zip(records, lines):
+                segment = self._writable_segment(len(line))
+                offset = self._positions[segment]
+                self._active_handle.write(line)
+                self._positions[segment] = offset + len(line)
+                written.append((segment, offset, record))
+            self._active_handle.flush()
+            os.fsync(self._active_handle.fileno())
+        except Exception:
+            # Re-read the log so the index reflects whatever actually reached disk
+            self._rebuild()
+            raise
+        for segment, offset, record in written:
+            self._apply(segment, offset, record)
+        if self.snapshot_interval and len(self._index) >= self.snapshot_interval:
+            self._schedule_snapshot()
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _read_at(self, segment, offset):
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def _cache_record(self, application_id, location, record):
+        if self.cache_size <= 0:
+            return
+        with self._mutex:
+            self._record_cache[application_id] = (location, RegistrationRecord.from_dict(record))
+            self._record_cache.move_to_end(application_id)
+            while len(self._record_cache) > self.cache_size:
+                self._record_cache.popitem(last=False)
+
+    def get(self, application_id):
+        record = self._read_latest(application_id)
+        if record is None or record.get('removed'):
+            return self._archived(application_id)
+        return record
+
+    def _read_latest(self, application_id):
+        """Return the latest line for an application: a registration, a tombstone or None"""
+        for attempt in range(2):
+            with self._mutex:
+                self._refresh()
+                location = self._index.get(application_id)
+                snapshot = self._snapshot
+                if location is None and snapshot is not None:
+                    # Segment 0 never exists, so snapshot entries cannot collide with log locations
+                    location = (0, snapshot.inode)
+                cached = self._record_cache.get(application_id)
+                if location is not None and cached is not None and cached[0] == location:
+                    self._record_cache.move_to_end(application_id)
+                    return cached[1].to_dict()
+            if location is None:
+                return None
+            if location[0] == 0:
+                record = snapshot.get(application_id)
+                if record is not None:
+                    self._cache_record(application_id, location, record)
+                return record
+            try:
+                record = self._read_at(*location)
+                if record.get('application_id') == application_id:
+                    if not record.get('removed'):
+                        self._cache_record(application_id, location, record)
+                    return record
+            except (OSError, ValueError):
+                pass
+            # The segment was compacted underneath us; re-index and retry once
+            with self._mutex:
+                self._rebuild()
+        return None
+
+    def iter_records(self):
+        with self._mutex:
+            self._refresh()
+            position = self._read_position()
+        yield from self._iter_position(*position)
+
+    def _read_position(self):
+        """
+        Pin the registrations as of the lines indexed so far, for _iter_position
+        Caller holds self._mutex
+        Returns: tuple: (segments to read, copy of the index, mapped snapshot)
+        """
+        segments = [
+            (segment, self._inodes[segment], self._tail_start.get(segment, 0))
+            for segment in sorted(self._inodes)
+        ]
+        return segments, dict(self._index), self._snapshot
+
+    def _iter_position(self, segments, index, snapshot):
+        """Yield the latest version of every registration as of a position from _read_position"""
+        # Records are streamed a line at a time, so memory does not grow with the log.
+        # The index is a copy, so appends made while streaming cannot yield a record
+        # twice; with a snapshot mapped it only holds the lines written since.
+        if snapshot is not None:
+            for application_id, data in snapshot.iter_entries():
+                if application_id not in index:
+                    yield json.loads(data)
+        for segment, inode, start in segments:
+            try:
+                handle = open(self._segment_path(segment), 'rb')
+            except FileNotFoundError:
+                handle = None
+            if handle is None or os.fstat(handle.fileno()).st_ino != inode:
+                if handle is not None:
+                    handle.close()
+                # Compacted while iterating; fall back to point reads
+                for application_id, location in list(index.items()):
+                    if location[0] == segment:
+                        record = self._read_latest(application_id)
+                        if record is not None and not record.get('removed'):
+                            yield record
+                continue
+            with handle:
+                for offset, end, record in self._iter_lines(handle, start):
+                    if record is not None and index.get(record.get('application_id')) == (segment, offset) \
+                            and not record.get('removed'):
+                        yield record
+
+    def count(self):
+        with self._mutex:
+            self._refresh()
+            if self._snapshot is None:
+                return len(self._index) - len(self._removed)
+            return self._snapshot.count + len(self._index) - self._covered - len(self._removed)
+
+    def _sync(self):
+        self._refresh()
+
+    def statistics(self):
+        with self._mutex:
+            self._refresh()
+            return self._format_statistics(self._statistics.totals)
+
+    def version(self):
+        with self._mutex:
+            self._refresh()
+            return self._statistics.version() + self._archive_version()
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _schedule_compaction(self):
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self.compact, name='registration-compaction', daemon=True
+        )
+        self._compaction_thread.start()
+
+    def compact(self):
+        """
+        Merge all sealed segments into one, keeping only the latest version of each record
+        The merged output replaces the newest sealed segment so a crash part-way
+        through never lets an older version shadow a newer one
+        """
+        if not self._compaction_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._mutex, self._lock:
+                self._refresh()
+                sealed = sorted(self._inodes)[:-1]
+                if len(sealed) < 2:
+                    return False
+                index = dict(self._index)
+                snapshot = self._snapshot
+
+            sealed_set = set(sealed)
+            latest = {}
+            for segment in sealed:
+                with open(self._segment_path(segment), 'rb') as f:
+                    for _, _, record in self._iter_lines(f):
+                        application_id = (record or {}).get('application_id')
+                        if not application_id:
+                            continue
+                        latest.pop(application_id, None)
+                        # Versions superseded by a newer segment can be dropped outright;
+                        # records only the snapshot knows about are kept
+                        location = index.get(application_id)
+                        if location is None or location[0] in sealed_set:
+                            latest[application_id] = record
+
+            # Claims moved to the archive: a tombstone is only needed while the snapshot still
+            # holds a copy, and lines the snapshot covers for a claim it no longer holds are dead
+            for application_id, record in list(latest.items()):
+                if (snapshot is None or snapshot.version_of(application_id) is None) and \
+                        (record.get('removed') or application_id not in index):
+                    del latest[application_id]
+
+            target = sealed[-1]
+            temp_path = self._segment_path(target) + '.compact.tmp'
+            with open(temp_path, 'wb') as f:
+                for record in latest.values():
+                    f.write(self._encode(record))
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._mutex, self._lock:
+                os.replace(temp_path, self._segment_path(target))
+                _fsync_directory(self.directory)
+                for segment in sealed[:-1]:
+                    os.remove(self._segment_path(segment))
+                _fsync_directory(self.directory)
+                self._rebuild()
+                self._write_checkpoint()
+
+            logger.info(f"Compacted {len(sealed)} registration segments into {len(latest)} records")
+            if self.snapshot_interval:
+                # Re-anchor the snapshot on the rewritten segments so workers stop re-reading them
+                self._write_snapshot()
+            return True
+        except Exception as e:
+            logger.error(f"Registration log compaction failed: {str(e)}")
+            return False
+        finally:
+            self._compaction_lock.release()
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def _schedule_snapshot(self):
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._snapshot_thread = threading.Thread(
+            target=self.build_snapshot, name='registration-snapshot', daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def build_snapshot(self):
+        """
+        Write a fresh snapshot of every registration for all workers to map
+        Returns: bool: False if compaction or another builder was already running
+        """
+        if not self._compaction_lock.acquire(blocking=False):
+            return False
+        try:
+            self._write_snapshot()
+            return True
+        except Exception as e:
+            logger.error(f"Registration snapshot build failed: {str(e)}")
+            return False
+        finally:
+            self._compaction_lock.release()
+
+    def _write_snapshot(self):
+        """Caller holds the compaction lock, so no segment is rewritten mid-build"""
+        with self._mutex:
+            with self._lock:
+                self._refresh()
+                positions = {
+                    str(segment): [self._inodes[segment], self._positions[segment]]
+                    for segment in sorted(self._inodes)
+                }
+                position = self._read_position()
+        # The views are rebuilt from exactly the pinned records, outside the locks
+        count = write_snapshot(self._snapshot_path, self._iter_position(*position), positions,
+                               views=self._empty_views(), views_meta={'format': VIEWS_FORMAT})
+        _fsync_directory(self.directory)
+        logger.info(f"Wrote registration snapshot of {count} records")
+
+    def _empty_views(self):
+        """Fresh instances of the derived views this store keeps, for a snapshot builder to fill"""
+        views = {}
+        for name in SNAPSHOT_VIEWS:
+            view = getattr(self, name)
+            if view is not None:
+                views[name] = DuplicateIndex(view.key) if name == '_duplicates' else type(view)()
+        return views
+
+    def _load_views(self, snapshot):
+        """
+        Build the derived views on the ones saved with a snapshot
+        Returns: list: Views restored; the others still need the snapshot's records
+        """
+        saved = snapshot.views()
+        if saved is None or saved.meta.get('format') != VIEWS_FORMAT:
+            return []
+        restored = []
+        for name in SNAPSHOT_VIEWS:
+            view = getattr(self, name)
+            if view is None or name not in saved:
+                continue
+            try:
+                view.attach(saved.view(name))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Rebuilding {name.lstrip('_')} instead of loading it from the snapshot: {str(e)}")
+                view.reset()
+                continue
+            restored.append(view)
+        return restored
+
+    def close(self):
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+        with self._mutex:
+            self._write_checkpoint()
+            self._close_active_handle()
+
+
+def create_registration_store(backend=None, data_folder=None, shards=None):
+    """
+    Build a registration store for the configured backend
+    Args:
+        backend (str): 'log' (segmented append-only log), 'sqlite' (indexed database)
+            or 'json' (legacy single file)
+        data_folder (str): Folder holding registration data
+        shards (int): Number of shards, each a store of the same backend in its own
+            folder under data_folder/shards (default: VANMITRA_SHARDS; 1 disables sharding)
+    Returns: RegistrationStore
+    """
+    from registration_archive import ColdArchive, ARCHIVE_DIRNAME
+    from registration_shards import (
+        ShardedRegistrationStore, SHARD_COUNT, SHARD_KEY, SHARD_STATES, SHARDS_DIRNAME, CLAIMS_LOCK_FILENAME,
+        shard_names, parse_state_pins
+    )
+
+    backend = (backend or STORE_BACKEND).lower()
+    data_folder = data_folder or DATA_FOLDER
+    if backend not in ('json', 'log', 'sqlite'):
+        raise ValueError(f"Unknown registration store backend: {backend}")
+    shards = SHARD_COUNT if shards is None else shards
+    duplicate_key = load_duplicate_key(data_folder)
+    archive = ColdArchive(os.path.join(data_folder, ARCHIVE_DIRNAME))
+
+    if shards <= 1:
+        return _open_store(backend, data_folder, duplicate_key, archive)
+    names = shard_names(shards)
+    # Shards share the duplicate key, so digests match whichever shard holds a claim, and the archive
+    return ShardedRegistrationStore(
+        {name: _open_store(backend, os.path.join(data_folder, SHARDS_DIRNAME, name), duplicate_key)
+         for name in names},
+        shard_key=SHARD_KEY, state_pins=parse_state_pins(SHARD_STATES, names), archive=archive,
+        claims_lock=FileLock(os.path.join(data_folder, SHARDS_DIRNAME, CLAIMS_LOCK_FILENAME)),
+    )
+
+
+def _open_store(backend, data_folder, duplicate_key, archive=None):
+    legacy_file = os.path.join(data_folder, LEGACY_FILENAME)
+    if backend == 'json':
+        return JSONFileStore(legacy_file, duplicate_key=duplicate_key, archive=archive)
+    if backend == 'log':
+        return SegmentedLogStore(os.path.join(data_folder, LOG_DIRNAME), legacy_file=legacy_file,
+                                 duplicate_key=duplicate_key, archive=archive)
+    if backend == 'sqlite':
+        from registration_sqlite import SQLiteRegistrationStore
+        return SQLiteRegistrationStore(os.path.join(data_folder, SQLITE_FILENAME), legacy_file=legacy_file,
+                                       duplicate_key=duplicate_key, archive=archive)
+
+
+_default_store = None
+_default_store_pid = None
+_default_store_lock = threading.Lock()
+
+
+def get_registration_store():
+    """Return this worker process's shared registration store"""
+    global _default_store, _default_store_pid
+    with _default_store_lock:
+        if _default_store is None or _default_store_pid != os.getpid():
+            _default_store = create_registration_store()
+            _default_store_pid = os.getpid()
+            atexit.register(_default_store.close)
+        return _default_store
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Streaming Multipart Uploads
+A Flask request class whose file parts are written straight to disk in the
+folder they will finally live in, hashed and size-checked as each chunk
+arrives, so an in-flight upload holds at most a small buffer in memory and
+oversized files are refused before they are fully received
+"""
+
+import os
+import io
+import uuid
+import hashlib
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Uploads stay in memory up to this size, then continue in a file on disk
+SPOOL_THRESHOLD = 64 * 1024
+# Largest non-file form field kept in memory
+MAX_FORM_MEMORY_SIZE = 1024 * 1024
+PART_SUFFIX = '.part'
+
+
+def format_size(size):
+    """
+    Human-readable byte count for error messages
+    Args: size (int): Size in bytes
+    Returns: str: e.g. '512 bytes', '250.0 KB' or '10.0 MB'
+    """
+    if size < 1024:
+        return f"{size} bytes"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class UploadSpool:
+    """
+    Destination for one uploaded file while the request body is parsed
+
+    Small files stay in a BytesIO; past the threshold the data moves to a
+    .part file in the upload's destination folder, so committing it later is
+    a rename rather than a copy. The SHA-256 and size are computed in the
+    same pass. Rejected uploads (disallowed file types) are read and dropped
+    without being buffered.
+    """
+
+    def __init__(self, directory, max_size=None, filename=None, rejected=False, threshold=SPOOL_THRESHOLD):
+        """
+        Args:
+            directory (str): Folder on the same filesystem as the final location
+            max_size (int): Largest accepted file, in bytes (None for no limit)
+            filename (str): Client-supplied file name, for error messages
+            rejected (bool): Discard the content as it arrives
+            threshold (int): Bytes held in memory before spooling to disk
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.filename = filename
+        self.rejected = rejected
+        self.threshold = threshold
+        self.size = 0
+        self.path = None
+        self._hash = hashlib.sha256()
+        self._stream = io.BytesIO()
+        self._moved = False
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of everything written so far"""
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.rejected:
+            return len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(
+                f"'{self.filename or 'upload'}' is larger than the {format_size(self.max_size)} limit"
+            )
+        self._hash.update(data)
+        if self.path is None and self.size > self.threshold:
+            self._roll_over()
+        return self._stream.write(data)
+
+    def _roll_over(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, uuid.uuid4().hex + PART_SUFFIX)
+        spooled = open(self.path, 'w+b')
+        spooled.write(self._stream.getvalue())
+        self._stream = spooled
+
+    def move_to(self, path):
+        """
+        Make the upload durable at path, by rename when it was spooled to disk
+        Args: path (str): Final location; its folder must exist
+        """
+        if self.path is not None:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+            self._stream.close()
+            os.replace(self.path, path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(self._stream.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+        self._moved = True
+
+    # File protocol used by werkzeug's FileStorage and the form parser
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def readline(self, size=-1):
+        return self._stream.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def __iter__(self):
+        return iter(self._stream)
+
+    @property
+    def closed(self):
+        return self._stream.closed
+
+    def close(self):
+        """Release the buffer; a spool file that was never moved is deleted"""
+        if not self._stream.closed:
+            self._stream.close()
+        if self.path is not None and not self._moved:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self._moved = True
+
+
+class UploadPolicy:
+    """Which files a view accepts, how large they may be and where they are spooled"""
+
+    def __init__(self, allowed, max_file_size, directory):
+        """
+        Args:
+            allowed (callable): File name -> whether the file type is accepted
+            max_file_size (int): Largest accepted file in bytes
+            directory (callable): Returns the spool folder, on the same
+                filesystem as where accepted files end up
+        """
+        self.allowed = allowed
+        self.max_file_size = max_file_size
+        self.directory = directory
+
+    def open_spool(self, filename):
+        return UploadSpool(
+            self.directory(),
+            max_size=self.max_file_size,
+            filename=filename,
+            rejected=not (filename and self.allowed(filename)),
+        )
+
+
+def streaming_uploads(policy):
+    """Decorator attaching an UploadPolicy to a view; its file parts are then streamed to disk"""
+    def decorate(view):
+        view.upload_policy = policy
+        return view
+    return decorate
+
+
+class StreamingUploadRequest(Request):
+    """
+    Request class streaming file parts into UploadSpools
+
+    Install with app.request_class. Views without an upload policy keep
+    werkzeug's default temporary-file handling.
+    """
+
+    max_form_memory_size = MAX_FORM_MEMORY_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every spool handed to the parser, so a request that fails mid-parse still cleans up
+        self._upload_spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        policy = getattr(view, 'upload_policy', None)
+        if policy is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        if content_length and content_length > policy.max_file_size:
+            raise RequestEntityTooLarge(
+                f"'{filename or 'upload'}' is larger than the {format_size(policy.max_file_size)} limit"
+            )
+        spool = policy.open_spool(filename)
+        self._upload_spools.append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        for spool in self._upload_spools:
+            spool.close()
+
+
+def save_upload(upload, path):
+    """
+    Save an uploaded file, moving a streamed spool into place instead of copying it
+    Args:
+        upload (FileStorage): File from request.files
+        path (str): Destination path
+    """
+    if isinstance(upload.stream, UploadSpool):
+        upload.stream.move_to(path)
+    else:
+        upload.save(path)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+FRA Claim Status Workflow
+The statuses a land claim moves through under the Forest Rights Act (Gram Sabha
+verification, then the Sub-Divisional and District Level Committees), the
+transitions allowed between them, and status changes that append an event to
+the registration's history
+"""
+
+from datetime import datetime
+
+# Claim statuses in workflow order
+SUBMITTED = 'submitted'
+GRAM_SABHA_REVIEW = 'gram_sabha_review'
+SDLC_REVIEW = 'sdlc_review'
+DLC_REVIEW = 'dlc_review'
+APPROVED = 'approved'
+REJECTED = 'rejected'
+# Generic review status used before the committee stages were tracked
+UNDER_REVIEW = 'under_review'
+
+STATUS_LABELS = {
+    SUBMITTED: 'Submitted',
+    GRAM_SABHA_REVIEW: 'Gram Sabha verification',
+    SDLC_REVIEW: 'Sub-Divisional Level Committee review',
+    DLC_REVIEW: 'District Level Committee review',
+    APPROVED: 'Approved',
+    REJECTED: 'Rejected',
+    UNDER_REVIEW: 'Under review',
+}
+
+# Status -> statuses it may move to. The Gram Sabha resolution goes to the SDLC,
+# whose recommendation goes to the DLC for the final decision; either committee
+# may remand a claim to the level below for reconsideration.
+TRANSITIONS = {
+    SUBMITTED: (GRAM_SABHA_REVIEW,),
+    GRAM_SABHA_REVIEW: (SDLC_REVIEW, REJECTED),
+    SDLC_REVIEW: (DLC_REVIEW, GRAM_SABHA_REVIEW, REJECTED),
+    DLC_REVIEW: (APPROVED, SDLC_REVIEW, REJECTED),
+    UNDER_REVIEW: (GRAM_SABHA_REVIEW, SDLC_REVIEW, DLC_REVIEW, APPROVED, REJECTED),
+    APPROVED: (),
+    REJECTED: (),
+}
+
+# Statuses counted as 'under_review' on the admin dashboard
+REVIEW_STATUSES = (UNDER_REVIEW, GRAM_SABHA_REVIEW, SDLC_REVIEW, DLC_REVIEW)
+
+# Largest number of status changes accepted in one bulk request
+MAX_BULK_TRANSITIONS = 5000
+
+
+def allowed_transitions(status):
+    """Return the statuses a claim in the given status may move to"""
+    return TRANSITIONS.get(status, ())
+
+
+def change_status(record, status, actor=None, remarks=None, at=None):
+    """
+    Move a registration to a new status and record the transition
+    Args:
+        record (dict): Registration data, modified in place
+        status (str): Target status
+        actor (str): Official or committee making the change
+        remarks (str): Reason recorded with the transition
+        at (str): ISO timestamp of the change (default: now)
+    Returns: dict: The event appended to record['status_history']
+    Raises: ValueError: The workflow does not allow this transition
+    """
+    current = record.get('status') or SUBMITTED
+    if status not in allowed_transitions(current):
+        allowed = ', '.join(allowed_transitions(current)) or 'none, the decision is final'
+        raise ValueError(f"Cannot move an application from '{current}' to '{status}'. Allowed: {allowed}")
+    event = {
+        'from': current,
+        'to': status,
+        'at': at or datetime.now().isoformat(),
+        'actor': actor,
+        'remarks': remarks,
+    }
+    record['status'] = status
+    record.setdefault('status_history', []).append(event)
+    return event
+
+
+def parse_transition(payload, defaults=None):
+    """
+    Validate one status change from an API request body
+    Args:
+        payload (dict): application_id, status and optional actor and remarks
+        defaults (dict): Values used for keys missing from payload
+    Returns: dict: Cleaned change with application_id, status, actor and remarks
+    Raises: ValueError: The change is malformed or names an unknown status
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Each status change must be a JSON object')
+    values = dict(defaults or {}, **payload)
+    application_id = values.get('application_id')
+    status = values.get('status')
+    if not isinstance(application_id, str) or not application_id.strip():
+        raise ValueError("'application_id' is required")
+    if status is None:
+        raise ValueError("'status' is required")
+    if status not in TRANSITIONS:
+        raise ValueError(f"Unknown status '{status}'. Choose from: {', '.join(TRANSITIONS)}")
+    change = {'application_id': application_id.strip(), 'status': status}
+    for key in ('actor', 'remarks'):
+        value = values.get(key)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"'{key}' must be a string")
+        change[key] = value.strip() if value else None
+    return change
+
+
+def parse_bulk_transitions(payload):
+    """
+    Validate the body of a bulk status change request
+    Args: payload (dict): Either 'transitions', a list of changes, or
+        'application_ids' with one shared 'status'; top-level 'actor' and
+        'remarks' apply to every change that does not set its own
+    Returns: list: Cleaned changes, see parse_transition
+    Raises: ValueError: The body or one of its changes is malformed
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Send a JSON object with transitions or application_ids')
+    defaults = {key: payload[key] for key in ('actor', 'remarks') if key in payload}
+    if 'transitions' in payload:
+        items = payload['transitions']
+    elif 'application_ids' in payload:
+        if not isinstance(payload['application_ids'], list):
+            raise ValueError("'application_ids' must be a list")
+        defaults['status'] = payload.get('status')
+        items = [{'application_id': application_id} for application_id in payload['application_ids']]
+    else:
+        raise ValueError("Send 'transitions' or 'application_ids' with a 'status'")
+    if not isinstance(items, list) or not items:
+        raise ValueError('No status changes given')
+    if len(items) > MAX_BULK_TRANSITIONS:
+        raise ValueError(f"At most {MAX_BULK_TRANSITIONS} status changes per request")
+    changes = []
+    for position, item in enumerate(items):
+        try:
+            changes.append(parse_transition(item, defaults))
+        except ValueError as e:
+            raise ValueError(f"Change {position + 1}: {str(e)}")
+    return changes
+
+
+def transition_registrations(store, changes):
+    """
+    Apply status changes as one commit
+    Each change is a lookup and a write of one registration; statistics,
+    indexes and columns are adjusted for it through the store's listeners
+    rather than rebuilt.
+    Args:
+        store (RegistrationStore): Destination store
+        changes (list): Cleaned changes from parse_transition, applied in order
+    Returns: dict: Report with updated/failed counts, the updated applications'
+        new status and version, and an error per refused change
+    """
+    at = datetime.now().isoformat()
+
+    def transition(change):
+        return lambda record: change_status(record, change['status'], change['actor'], change['remarks'], at)
+
+    updated, errors = store.update_many([(change['application_id'], transition(change)) for change in changes])
+    return {
+        'updated': len(updated),
+        'failed': len(errors),
+        'registrations': [
+            {'application_id': r['application_id'], 'status': r['status'], 'version': r['version']}
+            for r in updated
+        ],
+        'errors': [
+            {'application_id': application_id, 'error': str(error),
+             'not_found': isinstance(error, LookupError)}
+            for application_id, error in errors
+        ],
+    }
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Group-Commit Writer for Land Claim Submissions
+Funnels concurrent registration submissions in a worker through one writer
+thread that commits everything arriving within a few milliseconds as a single
+durable batch, serialized across gunicorn workers by the store's lock
+"""
+
+import os
+import queue
+import logging
+import threading
+import time
+
+from registration_store import get_registration_store
+
+logger = logging.getLogger(__name__)
+
+# Batching configuration (overridable through the environment)
+COMMIT_WINDOW_SECONDS = float(os.environ.get('VANMITRA_COMMIT_WINDOW_MS', 3)) / 1000.0
+MAX_BATCH_SIZE = int(os.environ.get('VANMITRA_MAX_BATCH_SIZE', 256))
+SUBMIT_TIMEOUT_SECONDS = 30.0
+
+
+class _PendingWrite:
+    """A submitted record waiting for its batch to commit"""
+
+    __slots__ = ('record', 'done', 'error')
+
+    def __init__(self, record):
+        self.record = record
+        self.done = threading.Event()
+        self.error = None
+
+
+class GroupCommitWriter:
+    """
+    Single writer that batches registration saves into group commits
+
+    Request threads call submit() and block until the batch containing their
+    record has been committed by store.save_claims(), which holds the store's
+    cross-process lock while it checks the batch for duplicates and parcel
+    overlaps and saves it, paying for one fsync (or one transaction) per batch
+    rather than one per submission.
+    """
+
+    def __init__(self, store, window=COMMIT_WINDOW_SECONDS, max_batch=MAX_BATCH_SIZE):
+        """
+        Args:
+            store (RegistrationStore): Store that commits each batch
+            window (float): Seconds to keep collecting after the first record arrives
+            max_batch (int): Records that force an immediate commit
+        """
+        self.store = store
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='registration-group-commit', daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, record, timeout=SUBMIT_TIMEOUT_SECONDS):
+        """
+        Save a registration and wait until it is durably committed
+        Args:
+            record (dict): Registration data containing an application_id
+            timeout (float): Seconds to wait for the commit
+        Raises: DuplicateClaimError if the duplicate policy refused the record, the
+            store's exception if the batch failed, TimeoutError if it never committed
+        """
+        pending = _PendingWrite(record)
+        self._ensure_started()
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError('Timed out waiting for registration to be committed')
+        if pending.error is not None:
+            raise pending.error
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Anything already queued rides along without extending the window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                refused = self.store.save_claims([pending.record for pending in batch])
+                # A refused duplicate fails its own submission, not the rest of the batch
+                for pending in batch:
+                    pending.error = refused.get(pending.record['application_id'])
+                if len(batch) > 1:
+                    logger.debug(f"Group-committed {len(batch) - len(refused)} registrations")
+            except Exception as e:
+                logger.error(f"Group commit of {len(batch)} registrations failed: {str(e)}")
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+_default_writer = None
+_default_writer_pid = None
+_default_writer_lock = threading.Lock()
+
+
+def get_registration_writer():
+    """Return this worker process's group-commit writer for the shared store"""
+    global _default_writer, _default_writer_pid
+    with _default_writer_lock:
+        if _default_writer is None or _default_writer_pid != os.getpid():
+            _default_writer = GroupCommitWriter(get_registration_store())
+            _default_writer_pid = os.getpid()
+        return _default_writer
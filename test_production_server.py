@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Import smoke test for the production server
+Loads the module gunicorn runs (see Procfile) and requests a few pages and
+API endpoints through Flask's test client, without starting a server
+"""
+
+import os
+import re
+import tempfile
+
+
+def load_app():
+    # Keep the registrations written by the test out of the real data folder
+    os.environ.setdefault('VANMITRA_DATA_DIR', tempfile.mkdtemp(prefix='vanmitra-test-'))
+    import production_server
+    return production_server.app
+
+
+def test_procfile_target():
+    app = load_app()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Procfile')) as procfile:
+        target = re.search(r'gunicorn\s+(\S+):(\w+)', procfile.read())
+    assert target, 'Procfile does not run gunicorn'
+    module = __import__(target.group(1))
+    assert getattr(module, target.group(2)) is app
+
+
+def test_routes():
+    client = load_app().test_client()
+    for path in ('/', '/registration', '/registration/status', '/registration/admin', '/map'):
+        response = client.get(path)
+        assert response.status_code == 200, f"{path}: {response.status_code}"
+    response = client.get('/api/registrations?limit=1')
+    assert response.status_code == 200 and response.get_json()['success']
+    response = client.get('/api/check-status/FRA00000000UNKNOWN')
+    assert response.status_code == 404
+
+
+if __name__ == '__main__':
+    test_procfile_target()
+    test_routes()
+    print("✅ production_server imports and serves its main routes")
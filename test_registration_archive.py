@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Cold archive tests
+Archives long-approved claims and checks that duplicate detection, parcel
+overlaps, the atlas and the delayed-village flags still count them, on every
+store backend and on a sharded store
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from registration_store import create_registration_store
+from registration_archive import archive_decided
+from registration_anomalies import flag_villages
+from registration_parcels import parse_parcel
+
+NOW = datetime(2026, 6, 1)
+
+
+def square(west, south, size=0.001):
+    return parse_parcel({'type': 'Polygon', 'coordinates': [[
+        [west, south], [west + size, south], [west + size, south + size], [west, south + size], [west, south]]]})
+
+
+def claim(i, status):
+    submitted = datetime(2024, 1, 1) + timedelta(days=i)
+    record = {
+        'application_id': f"FRA{submitted.strftime('%Y%m%d')}{i:012d}",
+        'status': status,
+        'submission_date': submitted.isoformat(),
+        'personal_details': {
+            'applicant_name': f'Applicant {i}',
+            'aadhaar': f'{234567890000 + i}',
+            'address': {'state': 'Odisha', 'district': 'Koraput', 'village': 'Semiliguda'},
+        },
+        'land_details': {
+            'survey_number': f'{100 + i}',
+            'location': {'latitude': 18.7 + i * 0.01, 'longitude': 82.7},
+            'parcel': square(82.7, 18.7 + i * 0.01),
+        },
+    }
+    if status == 'approved':
+        record['status_history'] = [{'from': 'dlc_review', 'to': 'approved',
+                                     'at': (submitted + timedelta(days=30)).isoformat()}]
+    return record
+
+
+def check_store(backend, shards):
+    folder = tempfile.mkdtemp(prefix='vanmitra-archive-')
+    store = create_registration_store(backend, folder, shards=shards)
+    # Ten claims approved in 2024 and two still pending in the same village
+    approved = [claim(i, 'approved') for i in range(10)]
+    pending = [claim(i, 'submitted') for i in range(10, 12)]
+    store.save_many([dict(record) for record in approved + pending])
+
+    newcomer = claim(50, 'submitted')
+    newcomer['personal_details']['aadhaar'] = approved[0]['personal_details']['aadhaar']
+    newcomer['land_details']['parcel'] = square(82.7005, 18.7005)
+    bbox = (82.0, 18.0, 83.0, 19.0)
+    before = (store.duplicates(newcomer), store.overlapping_claims(newcomer),
+              store.map_clusters(bbox, 8)['totals'])
+    assert not flag_villages(store.village_counts(), min_claims=5)['villages']
+
+    moved = archive_decided(store, store._archive, older_than_days=365, now=NOW)
+    assert sum(moved.values()) == 10 and store.count() == 2
+
+    # A fresh worker reads the archive's views from disk rather than from memory
+    for reader in (store, create_registration_store(backend, folder, shards=shards)):
+        assert reader.duplicates(newcomer) == before[0] == {'aadhaar': [approved[0]['application_id']]}
+        overlaps = reader.overlapping_claims(newcomer)
+        assert overlaps == before[1] and overlaps[0]['application_id'] == approved[0]['application_id']
+        assert reader.map_clusters(bbox, 8)['totals'] == before[2]
+        # Two pending out of twelve, not two out of two
+        assert not flag_villages(reader.village_counts(), min_claims=5)['villages']
+
+    # Re-archiving a partition replaces its copies rather than counting them twice
+    store.save_many([claim(0, 'approved')])
+    archive_decided(store, store._archive, older_than_days=365, now=NOW)
+    assert store.map_clusters(bbox, 8)['totals'] == before[2]
+    assert len(store.overlapping_claims(newcomer)) == len(before[1])
+
+
+def test_archived_claims_in_views():
+    for backend in ('log', 'sqlite', 'json'):
+        check_store(backend, shards=1)
+
+
+def test_archived_claims_in_sharded_views():
+    check_store('log', shards=2)
+
+
+if __name__ == '__main__':
+    test_archived_claims_in_views()
+    test_archived_claims_in_sharded_views()
+    print("✅ archived claims still count in duplicate, overlap, map and village views")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Duplicate claim tests
+Claims repeating an Aadhaar number or land parcel are flagged, or refused
+under the reject policy, whether the earlier claim is stored, in the same
+group commit, or submitted at the same moment through another worker's writer
+"""
+
+import tempfile
+import threading
+from datetime import datetime
+
+import registration_duplicates
+from registration_store import create_registration_store
+from registration_writer import GroupCommitWriter
+from registration_duplicates import DuplicateClaimError
+from registration_ids import new_application_id
+
+AADHAAR = '234567890123'
+
+
+def claim(village='Semiliguda', survey_number='12/3', aadhaar=AADHAAR):
+    return {
+        'application_id': new_application_id(),
+        'status': 'submitted',
+        'submission_date': datetime.now().isoformat(),
+        'personal_details': {
+            'applicant_name': 'Sukra Majhi',
+            'aadhaar': aadhaar,
+            'address': {'state': 'Odisha', 'district': 'Koraput', 'village': village},
+        },
+        'land_details': {'land_area': 1.5, 'survey_number': survey_number},
+    }
+
+
+def check_policies(backend, shards):
+    store = create_registration_store(backend, tempfile.mkdtemp(prefix='vanmitra-duplicates-'), shards=shards)
+    first = claim()
+    # Same Aadhaar number in one commit: only the later claim is refused
+    second = claim(village='Kundra', survey_number='7')
+    refused = store.save_claims([first, second], policy='reject')
+    assert list(refused) == [second['application_id']]
+    assert isinstance(refused[second['application_id']], DuplicateClaimError)
+    assert list(refused[second['application_id']].matches) == ['aadhaar']
+    assert store.get(first['application_id']) is not None and store.get(second['application_id']) is None
+
+    # Same parcel, written differently, against a stored claim: flagged and saved
+    third = claim(survey_number='12-3', aadhaar='345678901234')
+    assert store.save_claims([third], policy='flag') == {}
+    assert store.get(third['application_id'])['duplicate_of'] == {'land_parcel': [first['application_id']]}
+
+    # A different person on different land passes either way
+    assert store.save_claims([claim(village='Lamtaput', aadhaar='456789012345')], policy='reject') == {}
+    store.close()
+
+
+def check_concurrent_submissions(backend, shards):
+    folder = tempfile.mkdtemp(prefix='vanmitra-duplicates-')
+    # Two workers, each with its own store and group-commit writer
+    stores = [create_registration_store(backend, folder, shards=shards) for _ in range(2)]
+    writers = [GroupCommitWriter(store, window=0.02) for store in stores]
+    results = []
+    start = threading.Barrier(8)
+
+    def submit(writer, record):
+        start.wait()
+        try:
+            writer.submit(record)
+            results.append(record['application_id'])
+        except DuplicateClaimError:
+            results.append(None)
+
+    threads = [threading.Thread(target=submit, args=(writers[i % 2], claim(village=f'V{i}', survey_number=str(i))))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    saved = [application_id for application_id in results if application_id is not None]
+    assert len(results) == 8 and len(saved) == 1
+    assert stores[0].count() == stores[1].count() == 1
+    for store in stores:
+        store.close()
+
+
+def test_duplicate_policies():
+    for backend in ('log', 'sqlite', 'json'):
+        check_policies(backend, shards=1)
+    check_policies('log', shards=3)
+
+
+def test_concurrent_duplicates_rejected():
+    policy = registration_duplicates.DUPLICATE_POLICY
+    registration_duplicates.DUPLICATE_POLICY = 'reject'
+    try:
+        for backend in ('log', 'sqlite', 'json'):
+            check_concurrent_submissions(backend, shards=1)
+        check_concurrent_submissions('log', shards=3)
+    finally:
+        registration_duplicates.DUPLICATE_POLICY = policy
+
+
+if __name__ == '__main__':
+    test_duplicate_policies()
+    test_concurrent_duplicates_rejected()
+    print("✅ duplicate claims are flagged or refused, in one batch and across workers")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Conditional GET tests
+Status checks and listings carry an ETag; a client sending it back in
+If-None-Match gets a bodiless 304 until the claim or the registry changes
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from registration_ids import new_application_id
+from registration_store import get_registration_store
+
+
+def claim():
+    return {
+        'application_id': new_application_id(),
+        'status': 'submitted',
+        'submission_date': datetime.now().isoformat(),
+        'personal_details': {'applicant_name': 'Sukra Majhi',
+                             'address': {'state': 'Odisha', 'district': 'Koraput', 'village': 'Semiliguda'}},
+        'land_details': {'land_area': 1.5},
+    }
+
+
+def client():
+    os.environ.setdefault('VANMITRA_DATA_DIR', tempfile.mkdtemp(prefix='vanmitra-test-'))
+    import production_server
+    return production_server.app.test_client()
+
+
+def test_status_check_etag():
+    app = client()
+    record = claim()
+    get_registration_store().save(record)
+    url = f"/api/check-status/{record['application_id']}"
+
+    first = app.get(url)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+    unchanged = app.get(url, headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b'' and unchanged.headers['ETag'] == etag
+    # Weak comparison, as browsers and proxies may send the tag back weakened
+    assert app.get(url, headers={'If-None-Match': f"W/{etag}"}).status_code == 304
+
+    moved = app.post(f"/api/registrations/{record['application_id']}/status", json={'status': 'gram_sabha_review'})
+    assert moved.status_code == 200
+    changed = app.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert changed.get_json()['application']['status'] == 'gram_sabha_review'
+
+
+def test_listing_etag():
+    app = client()
+    get_registration_store().save(claim())
+    first = app.get('/api/registrations?limit=5')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert app.get('/api/registrations?limit=5', headers={'If-None-Match': etag}).status_code == 304
+    # The tag covers the query too, and any write to the registry
+    assert app.get('/api/registrations?limit=6', headers={'If-None-Match': etag}).status_code == 200
+    get_registration_store().save(claim())
+    changed = app.get('/api/registrations?limit=5', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+if __name__ == '__main__':
+    test_status_check_etag()
+    test_listing_etag()
+    print("✅ status checks and listings answer 304 until something changes")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Change feed tests
+Dashboards get inserts and status changes as Server-Sent Events, resume from
+their Last-Event-ID, and each worker keeps its live streams below its thread
+count
+"""
+
+import os
+import tempfile
+
+import registration_feed
+from registration_feed import ChangeFeed
+from registration_store import create_registration_store
+from registration_workflow import parse_transition, transition_registrations
+
+
+def claim(i):
+    return {'application_id': f'FRA{i:012d}', 'status': 'submitted',
+            'personal_details': {'applicant_name': f'Applicant {i}'}, 'land_details': {'land_area': 1.0}}
+
+
+def events(chunk):
+    """(event type, id) of each message in a chunk, skipping comments"""
+    found = []
+    for block in chunk.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            found.append((fields['event'], fields.get('id')))
+    return found
+
+
+def test_events_and_resume():
+    store = create_registration_store('log', tempfile.mkdtemp(prefix='vanmitra-feed-'), shards=1)
+    store.save_many([claim(i) for i in range(3)])
+    feed = ChangeFeed(store, buffer_size=5, poll_interval=0.05)
+    stream = feed.stream(max_seconds=2)
+    assert next(stream).startswith('retry:')
+    assert events(next(stream)) == [('ready', '3')]
+    store.save(claim(3))
+    assert events(next(stream)) == [('insert', '4'), ('statistics', None)]
+    transition_registrations(store, [parse_transition({'application_id': claim(0)['application_id'],
+                                                       'status': 'gram_sabha_review'})])
+    assert events(next(stream)) == [('status', '5'), ('statistics', None)]
+    stream.close()
+
+    # A reconnecting dashboard gets only what it missed; one too far behind is told to reload
+    resumed = feed.stream(last_event_id='4', max_seconds=1)
+    next(resumed)
+    assert events(next(resumed)) == [('status', '5'), ('statistics', None)]
+    resumed.close()
+    stale = feed.stream(last_event_id='1', max_seconds=1)
+    next(stale)
+    assert events(next(stale)) == [('reset', '5'), ('statistics', None)]
+    stale.close()
+    store.close()
+
+
+def test_stream_limit():
+    assert 0 < registration_feed.MAX_STREAMS < registration_feed.WORKER_THREADS
+    store = create_registration_store('log', tempfile.mkdtemp(prefix='vanmitra-feed-'), shards=1)
+    feed = ChangeFeed(store, poll_interval=0.05)
+    limit = registration_feed.MAX_STREAMS
+    registration_feed.MAX_STREAMS = 2
+    try:
+        # Slots are taken when a stream is opened, before the server starts sending it
+        first, second = feed.stream(max_seconds=1), feed.stream(max_seconds=1)
+        assert feed.stream(max_seconds=1) is None
+        second.close()
+        third = feed.stream(max_seconds=1)
+        assert third is not None and feed.stream(max_seconds=1) is None
+        first.close()
+        third.close()
+        third.close()
+        assert feed._streams == 0
+    finally:
+        registration_feed.MAX_STREAMS = limit
+    store.close()
+
+
+def test_stream_limit_response():
+    os.environ.setdefault('VANMITRA_DATA_DIR', tempfile.mkdtemp(prefix='vanmitra-test-'))
+    import production_server
+    client = production_server.app.test_client()
+    limit = registration_feed.MAX_STREAMS
+    registration_feed.MAX_STREAMS = 1
+    try:
+        opened = client.get('/api/registrations/stream', buffered=False)
+        assert opened.status_code == 200 and opened.mimetype == 'text/event-stream'
+        refused = client.get('/api/registrations/stream', buffered=False)
+        assert refused.status_code == 503 and refused.headers['Retry-After'] == '30'
+        opened.close()
+        reopened = client.get('/api/registrations/stream', buffered=False)
+        assert reopened.status_code == 200
+        reopened.close()
+    finally:
+        registration_feed.MAX_STREAMS = limit
+
+
+if __name__ == '__main__':
+    test_events_and_resume()
+    test_stream_limit()
+    test_stream_limit_response()
+    print("✅ change feed resumes from Last-Event-ID and keeps streams below the thread count")
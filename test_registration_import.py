@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Bulk import tests
+Valid rows of a CSV or NDJSON file are saved in one batch, invalid rows are
+reported by line with every problem found, and a dry run saves nothing
+"""
+
+import io
+import os
+import json
+import tempfile
+
+from registration_store import create_registration_store
+from registration_import import iter_rows, import_registrations
+
+HEADER = 'applicant_name,village,district,family_members,land_area,aadhaar,phone,latitude,longitude\n'
+
+
+def run(store, text, import_format='csv', dry_run=False):
+    return import_registrations(store, iter_rows(io.BytesIO(text.encode('utf-8')), import_format),
+                                workers=1, dry_run=dry_run)
+
+
+def test_csv_errors_by_line():
+    store = create_registration_store('log', tempfile.mkdtemp(prefix='vanmitra-import-'), shards=1)
+    text = HEADER + ''.join([
+        'Sukra Majhi,Semiliguda,Koraput,4,1.5,234567890123,+91 98765-43210,18.71,82.5\n',
+        ',Kundra,Koraput,4,1.5,,,,\n',
+        'Budhu Gond,Kundra,Koraput,0,250,12345,555,18.7,\n',
+        'Mangal Santal,Lamtaput,Koraput,3,abc,,,,\n',
+    ])
+
+    # A dry run reports the same rows but saves nothing
+    report = run(store, text, dry_run=True)
+    assert (report['valid'], report['imported'], report['failed']) == (1, 0, 3) and store.count() == 0
+
+    report = run(store, text)
+    assert (report['total_rows'], report['imported'], report['failed']) == (4, 1, 3)
+    assert store.get(report['registrations'][0]['application_id'])['personal_details']['phone'] == '9876543210'
+    errors = {entry['row']: entry['errors'] for entry in report['errors']}
+    assert list(errors) == [3, 4, 5]
+    assert errors[3] == ["'applicant_name' is required"]
+    assert errors[4] == [
+        "'family_members' must be between 1 and 100",
+        "'land_area' must be between 0.1 and 100.0",
+        "'aadhaar' must be 12 digits",
+        'Phone number must be a 10-digit mobile number',
+        'Give both latitude and longitude, or neither',
+    ]
+    assert errors[5] == ["'land_area' must be a number"]
+    store.close()
+
+
+def test_ndjson_errors_by_line():
+    store = create_registration_store('log', tempfile.mkdtemp(prefix='vanmitra-import-'), shards=1)
+    valid = {'personal_details': {'applicant_name': 'Sukra Majhi', 'family_members': 4,
+                                  'address': {'village': 'Semiliguda', 'district': 'Koraput'}},
+             'land_details': {'land_area': 1.5}}
+    text = '\n'.join([json.dumps(valid), '{not json', '', '[1, 2]', json.dumps(dict(valid, personal_details={})), ''])
+    report = run(store, text, 'ndjson')
+    assert (report['imported'], report['failed']) == (1, 3) and store.count() == 1
+    errors = {entry['row']: entry['errors'] for entry in report['errors']}
+    # Blank lines are skipped but still counted
+    assert list(errors) == [2, 4, 5]
+    assert errors[2][0].startswith('Invalid JSON')
+    assert errors[4] == ['Row must be a JSON object']
+    assert "'applicant_name' is required" in errors[5] and "'family_members' is required" in errors[5]
+    store.close()
+
+
+def test_import_endpoint_rejects_bad_files():
+    os.environ.setdefault('VANMITRA_DATA_DIR', tempfile.mkdtemp(prefix='vanmitra-test-'))
+    import production_server
+    client = production_server.app.test_client()
+    unknown = client.post('/api/registrations/import', data={'file': (io.BytesIO(b'x'), 'claims.xlsx')})
+    assert unknown.status_code == 400 and 'csv' in unknown.get_json()['error']
+    undecodable = client.post('/api/registrations/import?format=csv', data=HEADER.encode('utf-8') + b'\xff\xfe\n')
+    assert undecodable.status_code == 400 and 'UTF-8' in undecodable.get_json()['error']
+
+
+if __name__ == '__main__':
+    test_csv_errors_by_line()
+    test_ndjson_errors_by_line()
+    test_import_endpoint_rejects_bad_files()
+    print("✅ imports save valid rows and report every invalid row by line")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Registration listing tests
+Pages follow a cursor over (submission date, application_id) keys, so
+claims saved between two requests neither repeat nor push others off the
+pages still to come, on every store backend and across shards
+"""
+
+import tempfile
+from datetime import datetime, timedelta
+
+from registration_store import create_registration_store
+from registration_query import RegistrationQuery
+
+
+def claim(i, status='submitted'):
+    return {
+        'application_id': f'FRA{i:012d}',
+        'status': status,
+        'submission_date': (datetime(2024, 1, 1) + timedelta(hours=i)).isoformat(),
+        'personal_details': {'applicant_name': f'Applicant {i}',
+                             'address': {'state': 'Odisha', 'district': 'Koraput', 'village': f'V{i % 4}'}},
+        'land_details': {'land_area': 1.0},
+    }
+
+
+def walk(store, inserts, **filters):
+    """Application IDs page by page, saving inserts[n] after page n"""
+    pages = []
+    page = store.query(RegistrationQuery(limit=10, **filters))
+    while True:
+        pages.append([record['application_id'] for record in page['registrations']])
+        store.save_many(inserts.get(len(pages), []))
+        if not page['pagination']['has_more']:
+            return pages
+        page = store.query(RegistrationQuery(limit=10, cursor=page['pagination']['next_cursor'], **filters))
+
+
+def check_pagination(backend, shards):
+    store = create_registration_store(backend, tempfile.mkdtemp(prefix='vanmitra-query-'), shards=shards)
+    store.save_many([claim(i, 'approved' if i % 3 == 0 else 'submitted') for i in range(10, 50)])
+
+    # Newest first: a newer claim lands before the cursor and is not listed, an older one still is
+    pages = walk(store, {1: [claim(1000), claim(1001, 'approved')], 2: [claim(5, 'approved'), claim(6)]})
+    listed = [application_id for page in pages for application_id in page]
+    assert len(listed) == len(set(listed))
+    assert listed == [f'FRA{i:012d}' for i in range(49, 9, -1)] + [f'FRA{i:012d}' for i in (6, 5)]
+
+    # Oldest first with a filter: the other way round
+    pages = walk(store, {1: [claim(2, 'approved'), claim(1002, 'approved'), claim(1003)]},
+                 field_filters={'status': ['approved']}, sort='submission_date')
+    listed = [application_id for page in pages for application_id in page]
+    approved = [5] + [i for i in range(10, 50) if i % 3 == 0] + [1001, 1002]
+    assert listed == [f'FRA{i:012d}' for i in approved]
+    store.close()
+
+
+def test_cursor_pages_across_inserts():
+    for backend in ('log', 'sqlite', 'json'):
+        check_pagination(backend, shards=1)
+    check_pagination('log', shards=3)
+
+
+if __name__ == '__main__':
+    test_cursor_pages_across_inserts()
+    print("✅ cursor pages neither repeat nor skip claims saved between requests")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Shard tests
+Moves an unsharded store onto shards and checks that every claim keeps its
+version, so ETags clients already hold stay valid, on every store backend,
+and that the router asks a claim's owning shard before the others
+"""
+
+import tempfile
+from datetime import datetime, timedelta
+
+from registration_store import create_registration_store
+from registration_shards import ShardedRegistrationStore, migrate
+from registration_etag import record_etag, registry_etag
+
+
+def claim(i):
+    submitted = datetime(2025, 1, 1) + timedelta(hours=i)
+    return {
+        'application_id': f"FRA{submitted.strftime('%Y%m%d%H')}{i:010d}",
+        'status': 'submitted',
+        'submission_date': submitted.isoformat(),
+        'personal_details': {'applicant_name': f'Applicant {i}',
+                             'address': {'state': 'Odisha', 'district': 'Koraput', 'village': f'V{i % 7}'}},
+        'land_details': {'land_area': 1.5},
+    }
+
+
+def check_migration(backend):
+    folder = tempfile.mkdtemp(prefix='vanmitra-shards-')
+    source = create_registration_store(backend, folder, shards=1)
+    source.save_many([claim(i) for i in range(120)])
+    # Edit some claims a few times so versions differ between claims
+    edited = [record['application_id'] for record in source.iter_records()][::10]
+    for round_number in range(3):
+        source.save_many([dict(source.get(application_id), remarks=f'edit {round_number}')
+                          for application_id in edited])
+    etags = {record['application_id']: record_etag(record) for record in source.iter_records()}
+    version = source.version()
+
+    target = create_registration_store(backend, folder, shards=3)
+    assert migrate(source, target) == {'copied': 120, 'skipped': 0}
+    assert {record['application_id']: record_etag(record) for record in target.iter_records()} == etags
+    assert registry_etag(target.version(), {}) == registry_etag(version, {})
+    assert all(target.get(application_id)['version'] == 4 for application_id in edited)
+
+    # Rerunning copies nothing; a later edit moves past the migrated version
+    assert migrate(source, target) == {'copied': 0, 'skipped': 120}
+    target.save(dict(target.get(edited[0]), remarks='after migration'))
+    assert target.get(edited[0])['version'] == 5 and target.version() == version + 1
+    source.close()
+    target.close()
+
+
+def count_gets(store):
+    """Wrap each shard's get to count the lookups it answers"""
+    calls = {name: 0 for name in store.shards}
+    for name, shard in store.shards.items():
+        def get(application_id, name=name, get=shard.get):
+            calls[name] += 1
+            return get(application_id)
+        shard.get = get
+    return calls
+
+
+def test_lookups_start_at_owner():
+    folder = tempfile.mkdtemp(prefix='vanmitra-shards-')
+    store = create_registration_store('log', folder, shards=3)
+    store.save_many([claim(i) for i in range(30)])
+    calls = count_gets(store)
+    for i in range(30):
+        assert store.get(claim(i)['application_id']) is not None
+    assert sum(calls.values()) == 30
+
+    # A claim stored before the ring changed is still found, and then asked for first
+    stray = claim(99)
+    owner = store.shard_for(stray)
+    other = next(name for name in store.shards if name != owner)
+    store.shards[other].save(stray)
+    assert store.get(stray['application_id']) is not None
+    calls.update(dict.fromkeys(calls, 0))
+    store.update_many([(stray['application_id'], lambda record: record.update(remarks='checked'))])
+    assert calls[other] and not any(count for name, count in calls.items() if name != other)
+    assert store.shards[other].get(stray['application_id'])['remarks'] == 'checked'
+
+    # Placed by state: a router that saved the claim, or has found it once, asks its shard only
+    by_state = ShardedRegistrationStore(store.shards, shard_key='state')
+    placed = dict(claim(100), personal_details={'address': {'state': 'Jharkhand'}})
+    by_state.save(placed)
+    calls.update(dict.fromkeys(calls, 0))
+    assert by_state.get(placed['application_id']) is not None and sum(calls.values()) == 1
+    fresh = ShardedRegistrationStore(store.shards, shard_key='state')
+    assert fresh.get(placed['application_id']) is not None
+    calls.update(dict.fromkeys(calls, 0))
+    assert fresh.get(placed['application_id']) is not None and sum(calls.values()) == 1
+    store.close()
+
+
+def test_migration_keeps_etags():
+    for backend in ('log', 'sqlite', 'json'):
+        check_migration(backend)
+
+
+if __name__ == '__main__':
+    test_migration_keeps_etags()
+    test_lookups_start_at_owner()
+    print("✅ migrating onto shards keeps every claim's ETag; lookups start at the owning shard")
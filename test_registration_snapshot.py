@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Snapshot view tests
+A worker opening the log store maps the derived views saved with the
+snapshot as read-only arrays and replays only the log after it; its
+answers, and those of a worker adopting a newer snapshot, must match a
+worker that replays every registration
+"""
+
+import tempfile
+from datetime import datetime, timedelta
+
+import registration_store
+from registration_store import SegmentedLogStore
+from registration_query import RegistrationQuery
+from registration_columns import parse_group_by, parse_metrics
+
+KEY = b'k' * 32
+
+
+def square(longitude, latitude, size=0.002):
+    corners = [[longitude, latitude], [longitude + size, latitude], [longitude + size, latitude + size],
+               [longitude, latitude + size], [longitude, latitude]]
+    return {'type': 'Polygon', 'coordinates': [corners]}
+
+
+def claim(i):
+    record = {
+        'application_id': f'FRA{i:012d}',
+        'status': ('submitted', 'approved', 'rejected', 'dlc_review')[i % 4],
+        'submission_date': (datetime(2024, 1, 1) + timedelta(hours=7 * i)).isoformat(),
+        'personal_details': {
+            'applicant_name': f'Applicant {i % 40}',
+            'aadhaar': f'{234567890000 + i % 150}',
+            'address': {'state': 'Odisha', 'district': f'D{i % 5}', 'village': f'V{i % 30}'},
+        },
+        'land_details': {'land_area': i % 7, 'survey_number': str(i % 90),
+                         'location': {'latitude': 20 + i % 50 / 100, 'longitude': 84 + i % 70 / 100}},
+    }
+    if i % 3 == 0:
+        record['land_details']['parcel'] = square(84 + i % 20 / 1000, 20 + i % 15 / 1000)
+    return record
+
+
+def pages(store, **filters):
+    """Application IDs of the first three pages, following the cursors"""
+    found = []
+    page = store.query(RegistrationQuery(limit=20, **filters))
+    for _ in range(3):
+        found.append([record['application_id'] for record in page['registrations']])
+        cursor = page['pagination'].get('next_cursor')
+        if not cursor:
+            break
+        page = store.query(RegistrationQuery(limit=20, cursor=cursor, **filters))
+    return found, page['pagination']['total_matching']
+
+
+def answers(store):
+    probe = dict(store.get('FRA000000000003'), application_id='FRA-PROBE')
+    statistics = store.statistics()
+    statistics['by_status'] = sorted(statistics['by_status'].items())
+    return repr([
+        pages(store, field_filters={'district': ['d2']}),
+        pages(store, date_from='2024-02-01', date_to='2024-04-01'),
+        pages(store, sort='submission_date', field_filters={'status': ['approved']}),
+        store.facets(RegistrationQuery(), ['district', 'status']),
+        store.facets(RegistrationQuery(text='applicant'), ['district']),
+        store.aggregate(RegistrationQuery(), parse_group_by(['status']), parse_metrics(['count', 'sum:land_area'])),
+        [record['application_id'] for record, _ in store.search(RegistrationQuery(text='applicant 7', limit=10))],
+        store.map_clusters((84, 20, 85, 21), 10),
+        store.map_clusters((84.1, 20.1, 84.2, 20.2), 19),
+        store.duplicates(probe),
+        store.overlapping_claims(probe),
+        store.village_counts(),
+        statistics,
+    ])
+
+
+def replay(folder):
+    """Open the store ignoring its saved views, so every registration is replayed"""
+    registration_store.VIEWS_FORMAT += 1
+    try:
+        return SegmentedLogStore(folder, snapshot_interval=10 ** 9, duplicate_key=KEY)
+    finally:
+        registration_store.VIEWS_FORMAT -= 1
+
+
+def test_views_restored_from_snapshot():
+    folder = tempfile.mkdtemp(prefix='vanmitra-snapshot-')
+    store = SegmentedLogStore(folder, snapshot_interval=0, duplicate_key=KEY)
+    store.save_many([claim(i) for i in range(2000)])
+    store.snapshot_interval = 10 ** 9
+    assert store.build_snapshot()
+    # Changes after the snapshot are replayed on top of the saved views
+    store.save_many([dict(store.get(f'FRA{i:012d}'), status='approved') for i in range(0, 2000, 13)])
+    store.save_many([claim(i) for i in range(2000, 2100)])
+    store.remove_many([store.get(f'FRA{i:012d}') for i in range(1, 2000, 97)])
+    expected = answers(store)
+
+    restored = SegmentedLogStore(folder, snapshot_interval=10 ** 9, duplicate_key=KEY)
+    views = restored._snapshot.views()
+    # Plain arrays over the read-only mapping: nothing is unpickled or copied per worker
+    assert views is not None and views.arrays
+    assert all(array.dtype != object and not array.flags.writeable for array in views.arrays.values())
+    assert answers(restored) == expected
+
+    # Saved views of another format are ignored and every registration is replayed
+    assert answers(replay(folder)) == expected
+
+    # Another worker's newer snapshot replaces the views the restored store started from
+    store.save_many([claim(i) for i in range(2100, 2150)])
+    assert store.build_snapshot()
+    store.save_many([dict(store.get(f'FRA{i:012d}'), status='rejected') for i in range(0, 2000, 29)])
+    restored.count()
+    assert restored._snapshot.inode == store._snapshot.inode
+    assert answers(restored) == answers(store) == answers(replay(folder))
+
+
+if __name__ == '__main__':
+    test_views_restored_from_snapshot()
+    print("✅ views saved with the snapshot match a full replay")
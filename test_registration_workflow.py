@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Status workflow tests
+Claims move Gram Sabha -> SDLC -> DLC -> decision, may be remanded a level,
+and every move is kept in status_history; moves the workflow does not allow
+are refused per claim, leaving the others in a bulk change to go through
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from registration_ids import new_application_id
+from registration_store import create_registration_store, get_registration_store
+from registration_workflow import parse_bulk_transitions, parse_transition, transition_registrations
+
+
+def claim():
+    return {
+        'application_id': new_application_id(),
+        'status': 'submitted',
+        'submission_date': datetime.now().isoformat(),
+        'personal_details': {'applicant_name': 'Sukra Majhi',
+                             'address': {'state': 'Odisha', 'district': 'Koraput', 'village': 'Semiliguda'}},
+        'land_details': {'land_area': 1.5},
+    }
+
+
+def move(store, application_id, status, **details):
+    return transition_registrations(store, [parse_transition(dict(details, application_id=application_id,
+                                                                  status=status))])
+
+
+def check_workflow(backend):
+    store = create_registration_store(backend, tempfile.mkdtemp(prefix='vanmitra-workflow-'), shards=1)
+    record = claim()
+    store.save(record)
+    application_id = record['application_id']
+
+    # Straight to a decision is refused; the claim is left as it was
+    report = move(store, application_id, 'approved')
+    assert report['failed'] == 1 and not report['errors'][0]['not_found']
+    assert "Allowed: gram_sabha_review" in report['errors'][0]['error']
+    assert store.get(application_id)['status'] == 'submitted' and store.get(application_id)['version'] == 1
+
+    # Up the committees, one remand back to the SDLC, then the decision
+    path = ['gram_sabha_review', 'sdlc_review', 'dlc_review', 'sdlc_review', 'dlc_review', 'approved']
+    for version, status in enumerate(path, 2):
+        report = move(store, application_id, status, actor='DLC Koraput', remarks=f'to {status}')
+        assert report['registrations'] == [{'application_id': application_id, 'status': status, 'version': version}]
+    history = store.get(application_id)['status_history']
+    assert [(event['from'], event['to']) for event in history] == list(zip(['submitted'] + path, path))
+    assert history[-1]['actor'] == 'DLC Koraput' and history[-1]['remarks'] == 'to approved'
+    assert store.statistics()['approved'] == 1
+
+    # A decision is final
+    report = move(store, application_id, 'rejected')
+    assert report['failed'] == 1 and 'the decision is final' in report['errors'][0]['error']
+    store.close()
+
+
+def test_transitions():
+    for backend in ('log', 'sqlite', 'json'):
+        check_workflow(backend)
+
+
+def test_bulk_transitions_refused_per_claim():
+    store = create_registration_store('log', tempfile.mkdtemp(prefix='vanmitra-workflow-'), shards=3)
+    records = [claim() for _ in range(3)]
+    store.save_many(records)
+    ids = [record['application_id'] for record in records]
+    move(store, ids[0], 'gram_sabha_review')
+    changes = parse_bulk_transitions({'application_ids': ids + ['FRA-MISSING'], 'status': 'gram_sabha_review',
+                                      'actor': 'Gram Sabha Semiliguda'})
+    report = transition_registrations(store, changes)
+    assert report['updated'] == 2 and report['failed'] == 2
+    assert {error['application_id']: error['not_found'] for error in report['errors']} == {
+        ids[0]: False, 'FRA-MISSING': True}
+    assert [store.get(application_id)['status'] for application_id in ids] == ['gram_sabha_review'] * 3
+    assert store.get(ids[1])['status_history'][0]['actor'] == 'Gram Sabha Semiliguda'
+
+    try:
+        parse_bulk_transitions({'transitions': [{'application_id': ids[0], 'status': 'granted'}]})
+        assert False, 'an unknown status was accepted'
+    except ValueError as e:
+        assert str(e).startswith('Change 1: Unknown status')
+    store.close()
+
+
+def test_status_endpoint():
+    os.environ.setdefault('VANMITRA_DATA_DIR', tempfile.mkdtemp(prefix='vanmitra-test-'))
+    import production_server
+    client = production_server.app.test_client()
+    record = claim()
+    get_registration_store().save(record)
+    url = f"/api/registrations/{record['application_id']}/status"
+
+    moved = client.post(url, json={'status': 'gram_sabha_review', 'remarks': 'Resolution 12/2024'})
+    assert moved.status_code == 200
+    assert moved.get_json()['allowed_transitions'] == ['sdlc_review', 'rejected']
+    assert client.post(url, json={'status': 'approved'}).status_code == 409
+    assert client.post(url, json={'status': 'granted'}).status_code == 400
+    assert client.post('/api/registrations/FRA-MISSING/status', json={'status': 'approved'}).status_code == 404
+
+
+if __name__ == '__main__':
+    test_transitions()
+    test_bulk_transitions_refused_per_claim()
+    test_status_endpoint()
+    print("✅ status changes follow the FRA workflow and are kept in the history")
@@ -8,8 +8,8 @@ from datetime import datetime
 import logging
 import os
 import json
-import uuid
 import numpy as np
+from registration_ids import new_application_id
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +25,7 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 def generate_application_id():
-    return f"FRA{datetime.now().strftime('%Y%m%d')}{str(uuid.uuid4())[:8].upper()}"
+    return new_application_id()
 
 # ============================================================================
 # MAIN DASHBOARD ROUTE